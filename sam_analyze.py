@@ -1,20 +1,22 @@
-from typing import List
-from string import ascii_uppercase
-from Bio.SeqIO.FastaIO import SimpleFastaParser
-from json import load as json_load  # , dump as json_dump
-from copy import deepcopy
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+from typing import List, Optional
+from re import sub as re_sub
+import numpy as np
 import os
 
 import sys
 sys.path.append("src")
-from utils import mkpath, prtNum, distance2, linearApproxDots, linearApproxLines, YCoordOnLine, setSettings, removePythonCache
+from utils import mkpath, prtNum, setSettings, removePythonCache
 
-from Line import Line, shiftLines
-from Plot import Plot
-from Events import Rotation, Insertion, Deletion, Translocation, Duplication, Pass
+from Events import Pass
+from Pipeline import readContigs, pairGenomes, parseSegments, splitPairs, contigOffsets, overviewDots, makeDots, countLines, \
+    countShiftAndRotations, findEvents, historyActions, historyText, eventRecords, historyFrames, Genomes, Contig, ShiftResult
+from EventWriter import EventWriter, shortName, readEvents
+from Report import Report
+import Cache
 
-
-CIGAR_FLAGS_PATH = mkpath("src", "STORAGE", "CIGAR_FLAGS.json")
+# Plot and Frames (matplotlib) are imported only when results are drawn (render=True)
 
 
 # INT_MAX = int(1e9) + 7
@@ -36,7 +38,15 @@ CIGAR_FLAGS_PATH = mkpath("src", "STORAGE", "CIGAR_FLAGS.json")
 
 #     "min_event_size": 3,
 #     "lines_join_size": 5,
-#     "line_min_size": 10
+#     "line_min_size": 10,
+#     "lines_method": "dots",
+#     "processes": None,
+#     "plot_method": "scatter",
+#     "history_png": True,
+#     "history_gif": True,
+#     "cache": True,
+#     "profile": False,
+#     "trace_memory": False
 # }
 
 # Large
@@ -50,13 +60,17 @@ SETTINGS = {
 
     "min_event_size": int(5e3),
     "lines_join_size": "$min_event_size + 3",
-    "line_min_size": "$min_event_size"
+    "line_min_size": "$min_event_size",
+    "lines_method": "dots",  # "dots" - join sampled dots, "chain" - chain CIGAR match blocks (opt-in: tests/ outputs are made with "dots")
+    "processes": None,  # Processes for counting shift and rendering (None - all CPUs)
+    "plot_method": "scatter",  # "scatter" - marker for every dot, "density" - dots are binned into one image, opacity by dot count (for millions of dots)
+    "history_png": True,  # Save every history frame to history/
+    "history_gif": True,  # Save history frames to history.gif
+    "cache": True,  # Reuse results of SAM reading, lines and shift stages from cache/ (see Cache.py)
+    "profile": False,  # Save cProfile dump of every stage to profile/
+    "trace_memory": False  # Add peak of Python allocations (tracemalloc) of every stage to report.json (slows analysis down)
 }
 
-with open(CIGAR_FLAGS_PATH, 'r', encoding="utf-8") as file:
-    CIGAR_FLAGS = json_load(file, encoding="utf-8")
-
-
 # /-----TESTING SETTINGS-----\ #
 
 query_genome_path = "samples/large02/large_genome1.fasta"
@@ -74,344 +88,313 @@ output_folder = "tests/large02"
 # \-----TESTING SETTINGS-----/ #
 
 
-def analyze(query_genome_path: str, ref_genome_path: str, sam_file_path: str, show_plot: bool, output_folder: str, settings: dict):
+def analyze(query_genome_path: Optional[str], ref_genome_path: Optional[str], sam_file_path: str, show_plot: bool, output_folder: str, settings: dict,
+            render: bool = True):
+    """
+    Finds events of the ref genome relative to the query genome and writes history.txt, events.* (and report.json) to output_folder.
+    If render, draws sam_analyze.png and history frames (see settings). Returns rotations and large events in the order of history.
+    Genomes of several contigs: every pair of contigs is analyzed in its own subfolder, see analyzeContigs
+    """
     print("---| {} |---".format(output_folder))
 
     setSettings(settings, mkpath(output_folder, "settings.json"))
 
-    with open(query_genome_path, 'r', encoding="utf-8") as file:
-        for name, sequence in SimpleFastaParser(file):
-            query_genome_name = name
-            query_genome_length = len(sequence)
-            break
-
-    with open(ref_genome_path, 'r', encoding="utf-8") as file:
-        for name, sequence in SimpleFastaParser(file):
-            ref_genome_name = name
-            ref_genome_length = len(sequence)
-            break
-
-    print("Query: {} [{}]".format(query_genome_name, prtNum(query_genome_length)))
-    print("Reference: {} [{}]\n".format(ref_genome_name, prtNum(ref_genome_length)))
-
-    # return
-# ====================================================================================================================================================================
-    # Parse CIGAR and create a list of all actions
-    print("Reading SAM file...")
-
-    segments = []
-    with open(sam_file_path, 'r', encoding="utf-8") as sam_file:
-        for line in (line.strip().split() for line in sam_file if not line.strip().startswith("@")):
-            # Quality:
-            # mapQ = int(line[4])
-            # quality = round((10 ** (mapQ / -10)) * 100, 6)
-
-            # Flags:
-            flags_bit = int(line[1])
-            flags = set()
-            for i in range(len(CIGAR_FLAGS) - 1, -1, -1):
-                cur_flag, flags_bit = divmod(flags_bit, 2 ** i)
-                if cur_flag:
-                    flags.add(i)
-
-            # Rid:
-            rid_size = len(line[9])
-            if rid_size <= settings["min_rid_size"]:
-                continue
-
-            # CIGAR:
-            actions = []
-            buff = ""
-            for char in line[5]:
-                if char in ascii_uppercase:
-                    actions.append([int(buff), char])
-                    buff = ""
-                else:
-                    buff += char
-
-            rotated = lambda ref_pos: ref_genome_length - ref_pos if 4 in flags else ref_pos
-
-            # Start position:
-            cur_query_pos = int(line[3])
-            cur_ref_pos = 0
-
-            for length, action_type in actions:
-
-                if action_type in ('S', 'H'):
-                    cur_ref_pos += length
-
-                elif action_type == 'M':
-                    segments.append([cur_query_pos, cur_ref_pos, length, (4 in flags)])
-                    cur_query_pos += length
-                    cur_ref_pos += length
-
-                elif action_type == 'I':
-                    cur_ref_pos += length
-
-                elif action_type == 'D':
-                    cur_query_pos += length
-
-    # return
-# ====================================================================================================================================================================
-    # Creating plot
-    print("Creating plot...")
-
-    plot = Plot("Main plot", settings["fontsize"], settings["grid_size"], settings["figsize"], query_genome_name, ref_genome_name)
-    plot.legendLine({
-        "Insertion": "#0f0",
-        "Deletion": "#f00",
-        "Duplication": "#f0f",
-        "Translocation": "#0ff"
-    }, fontsize=settings["fontsize"], lw=2)
+    # Time, memory and item counts of every stage are saved to report.json (see Report.py)
+    report = Report(
+        mkpath(output_folder, "report.json"),
+        mkpath(output_folder, "profile") if settings["profile"] else None,
+        settings["trace_memory"]
+    )
+    report.stage("genomes")
 
-    # return
-# ====================================================================================================================================================================
-    # Creating dots
-    print("Creating dots...", end="")
+    query_contigs, ref_contigs = readContigs(query_genome_path, ref_genome_path, sam_file_path)
 
-    graph = [[] for _ in range(query_genome_length + 1)]
-    count = 0
+    # Results of stages are cached by the hash of everything they depend on (see Cache.py)
+    segments_key = Cache.stageKey("segments", Cache.fileHash(sam_file_path), settings["min_rid_size"]) if settings["cache"] else None
 
-    for cur_query_pos, cur_ref_pos, length, rotated in segments:
-        if rotated:
-            cur_ref_pos = ref_genome_length - cur_ref_pos
-        for _ in range(length):
-            graph[cur_query_pos].append(cur_ref_pos)
-            cur_query_pos += 1
-            cur_ref_pos += (-1 if rotated else 1)
+    if len(query_contigs) != 1 or len(ref_contigs) != 1:
+        return analyzeContigs(query_contigs, ref_contigs, sam_file_path, show_plot, output_folder, settings, render, report, segments_key)
 
-        count += length
+    genomes = pairGenomes(query_contigs[0], ref_contigs[0])
 
-    del segments
+    print("Query: {} [{}]".format(genomes.query_name, prtNum(genomes.query_length)))
+    print("Reference: {} [{}]\n".format(genomes.ref_name, prtNum(genomes.ref_length)))
 
-    print(" {}".format(prtNum(count)))  # Can be with optional compress: count // N
+    report.count(query_genome_length=genomes.query_length, ref_genome_length=genomes.ref_length)
 
-    # return
-# ====================================================================================================================================================================
-    # Counting lines
-    print("Counting lines...", end="")
+    # SAM file is read only if lines of the pair are not cached
+    return analyzePair(
+        genomes, lambda: readSegmentsStage(sam_file_path, settings, report, segments_key)[0],
+        output_folder, settings, show_plot, render, report, segments_key
+    )
 
-    lines_join_size2 = settings["lines_join_size"] ** 2
-    line_min_size2 = settings["line_min_size"] ** 2
 
-    lines = []
+def readSegmentsStage(sam_file_path: str, settings: dict, report: Report, segments_key: Optional[str]):
+    """Segments of SAM file and SAM names of their contigs (see Pipeline.parseSegments)"""
+    print("Reading SAM file...", end="")
+    report.stage("sam")
 
-    for x in range(0, len(graph), settings["dot_skip_rate"]):
-        for y in graph[x]:
-            for line in lines:
-                if distance2(x, y, *line.dots[-1]) <= lines_join_size2 and \
-                        (len(line.dots) == 1 or distance2(x, y, *line.dots[-2]) <= lines_join_size2):
-                    line.dots.append([x, y])
-                    break
-            else:
-                lines.append(Line(dots=[[x, y]]))
+    segments_cache = Cache.load(segments_key) if segments_key is not None else None
 
-    for line in lines:
-        line.dots.sort()
+    if segments_cache is None:
+        segments, query_names, ref_names = parseSegments(sam_file_path, settings)
+        if segments_key is not None:
+            Cache.save(segments_key, segments=segments, query_names=np.array(query_names, dtype=str), ref_names=np.array(ref_names, dtype=str))
+    else:
+        segments, query_names, ref_names = segments_cache["segments"], segments_cache["query_names"].tolist(), segments_cache["ref_names"].tolist()
 
-        line.start_x, line.start_y = line.dots[0]
-        line.end_x, line.end_y = line.dots[-1]
+    print(" {} segments{}".format(prtNum(len(segments)), "" if segments_cache is None else " (cached)"))
+    report.count(segments=len(segments), cached=segments_cache is not None)
 
-        if len(line.dots) >= 2:
-            k, b = linearApproxDots(line.dots)         # \
-            line.start_y = int(k * line.start_x + b)   # |--> Approximation  TODO: int
-            line.end_y = int(k * line.end_x + b)       # /
+    return segments, query_names, ref_names
 
-        # line[4] = line[4][::settings["dot_skip_rate"]]  # Optional compress
 
-    lines = [line for line in lines if distance2(line.start_x, line.start_y, line.end_x, line.end_y) >= line_min_size2]
+def analyzeContigs(query_contigs: List[Contig], ref_contigs: List[Contig], sam_file_path: str, show_plot: bool, output_folder: str, settings: dict,
+                   render: bool, report: Report, segments_key: Optional[str]):
+    """
+    Segments are split by pairs of query and ref contigs, every pair is analyzed in the subfolder "<query>_<ref>" of output_folder
+    (in parallel if settings["processes"] != 1). output_folder gets history.txt and events.* of all pairs, report.json and overview.png
+    """
+    print("Query: {} contigs [{}]".format(len(query_contigs), prtNum(sum(contig.length for contig in query_contigs))))
+    print("Reference: {} contigs [{}]\n".format(len(ref_contigs), prtNum(sum(contig.length for contig in ref_contigs))))
 
-    lines.sort(key=lambda line: (line.start_x, line.start_y))
-
-    print(" {} lines".format(len(lines)))
-    print("Lines:", *lines, sep='\n')
+    report.count(query_contigs=len(query_contigs), ref_contigs=len(ref_contigs),
+                 query_genome_length=sum(contig.length for contig in query_contigs), ref_genome_length=sum(contig.length for contig in ref_contigs))
 
     # return
 # ====================================================================================================================================================================
-    # Shift and rotations
-    print("Counting shift and rotations...")
-
-    def countMetric(lines):
-        result = 0
-
-        # First option:
-        # k, b = linearApproxLines(lines)
-        # main_line = Line(0, b, query_genome_length, query_genome_length * k + b)
+    # Splitting segments by pairs of contigs
+    segments, query_names, ref_names = readSegmentsStage(sam_file_path, settings, report, segments_key)
 
-        # Second option:
-        # main_line = Line(0, 0, query_genome_length, query_genome_length) -> Second "for" option
+    pairs = splitPairs(segments, query_names, ref_names, query_contigs, ref_contigs, settings)
+    del segments
 
-        # Third option: TODO - approx with k: 1, b: search
+    print("Contig pairs:", *("{} - {}".format(query_contigs[pair.query].name, ref_contigs[pair.ref].name) for pair in pairs), sep='\n')
+    print()
+    report.count(pairs=len(pairs))
 
-        # Fourth option: TODO - approx with k: search, b: 0
+    # return
+# ====================================================================================================================================================================
+    # Analyzing pairs
+    print("Analyzing contig pairs...")
+    report.stage("pairs")
+
+    processes = min(settings["processes"] or os.cpu_count(), len(pairs))
+    pair_settings = settings if processes <= 1 else dict(settings, processes=1)  # Pool workers can not start their own pools
+
+    folders = [pairFolder(output_folder, query_contigs[pair.query], ref_contigs[pair.ref]) for pair in pairs]
+    tasks = [
+        (
+            pairGenomes(query_contigs[pair.query], ref_contigs[pair.ref]), pair.segments, folder, pair_settings, render,
+            None if segments_key is None else Cache.stageKey("pair", segments_key, query_contigs[pair.query].name, ref_contigs[pair.ref].name)
+        )
+        for pair, folder in zip(pairs, folders)
+    ]
+
+    if processes <= 1:
+        histories = [analyzePairTask(task, log=False) for task in tasks]
+    else:
+        with Pool(processes) as pool:
+            histories = pool.map(analyzePairTask, tasks, chunksize=1)
+
+    print("\nAnalyzed {} pairs\n".format(len(pairs)))
+    report.count(events=sum(len(history) for history in histories))
 
-        # First "for" option:
-        # for line in lines:
-        #     result += int((line.start_y - YCoordOnLine(*main_line.coords, line.start_x)) ** 2)
-        #     result += int((line.end_y - YCoordOnLine(*main_line.coords, line.end_x)) ** 2)
+    # return
+# ====================================================================================================================================================================
+    # Overview: dots of all pairs, contigs are laid one after another
+    if render:
+        print("Plotting overview...")
+        report.stage("overview")
 
-        # Second "for" option:
-        for line in lines:
-            result += int((line.start_y - line.start_x) ** 2) + int((line.end_y - line.end_x) ** 2)
+        from Plot import Plot
 
-        return result
-
-    def countMetricWithRotation(lines, rotation, apply_rotation=False) -> int:
-        rotation_center = (
-            min(
-                lines[rotation.start_line].start_y, lines[rotation.start_line].end_y,
-                lines[rotation.end_line].start_y, lines[rotation.end_line].end_y
-            ) + max(
-                lines[rotation.start_line].start_y, lines[rotation.start_line].end_y,
-                lines[rotation.end_line].start_y, lines[rotation.end_line].end_y
-            )
-        ) // 2
+        plot = Plot("Overview", settings["fontsize"], settings["grid_size"], settings["figsize"],
+                    "Query: " + " | ".join(contig.name for contig in query_contigs), "Ref: " + " | ".join(contig.name for contig in ref_contigs),
+                    settings["plot_method"] == "density")
 
-        for line_index in range(rotation.start_line, rotation.end_line + 1):
-            lines[line_index].rotateY(rotation_center)
+        for x in contigOffsets(query_contigs).tolist():
+            plot.vline(x, color="#888", lw=0.5)
+        for y in contigOffsets(ref_contigs).tolist():
+            plot.hline(y, color="#888", lw=0.5)
 
-        result = countMetric(lines)
+        dots = overviewDots(pairs, query_contigs, ref_contigs, settings)
+        plot.scatter(dots, dotsize=settings["dotsize"], color="#00f")
 
-        if not apply_rotation:
-            for line_index in range(rotation.start_line, rotation.end_line + 1):
-                lines[line_index].rotateY(rotation_center)
+        report.count(plotted_dots=len(dots))
+        del dots
 
-        if apply_rotation:
-            rotation.rotation_center = rotation_center
-            for line_index in range(rotation.start_line, rotation.end_line + 1):
-                lines[line_index].rotateY(rotation_center, line=False, dots=True)
+        plot.save(mkpath(output_folder, "overview.png"))
 
-        return result
+        if show_plot:
+            print("Showing plot...")
+            plot.show()
 
-    def countBestRotations(rotated_lines) -> List[Line]:
-        possible_rotations = []
-        for start_line in range(len(rotated_lines)):
-            for end_line in range(start_line, len(rotated_lines)):
-                possible_rotations.append(Rotation(start_line, end_line))
+        plot.clear()
+        del plot
 
-        # print("\nPossible rotations:", *possible_rotations, sep='\n')
+    # return
+# ====================================================================================================================================================================
+    # History and events of all pairs
+    print("Making history...", end="")
+    report.stage("history")
 
-        cur_metric_value = countMetric(rotated_lines)
-        rotation_actions = []
+    with open(mkpath(output_folder, "history.txt"), 'w', encoding="utf-8") as history_file:
+        for pair, folder in zip(pairs, folders):
+            print("---| {} - {} |---\n".format(query_contigs[pair.query].name, ref_contigs[pair.ref].name), file=history_file)
+            with open(mkpath(folder, "history.txt"), 'r', encoding="utf-8") as pair_history_file:
+                history_file.write(pair_history_file.read())
 
-        # if draw:
-        #     for line in rotated_lines:
-        #         plot.plotLine(line)
-        #     plot.save(mkpath(output_folder, "history", "x0.png"))
-        #     plot.clear()
-        #     index = 1
+    # Events of one query contig are sorted by position (as in events.* of one pair)
+    query_order = {contig.name: index for index, contig in enumerate(query_contigs)}
+    ref_order = {contig.name: index for index, contig in enumerate(ref_contigs)}
 
-        while True:
-            best_metric_value = float('inf')
-            best_rotation_index = 0
+    records = [record for folder in folders for record in readEvents(mkpath(folder, "events.jsonl"))]
+    records.sort(key=lambda record: (query_order[record["query"]], record["query_start"], ref_order[record["ref"]], record["index"]))
 
-            for i, rotation in enumerate(possible_rotations):
+    with EventWriter(mkpath(output_folder, "events"), contigs=[(contig.name, contig.length) for contig in query_contigs]) as event_writer:
+        event_writer.writeAll(records)
 
-                # TODO: WORKAROUND #1
-                min_line_center, max_line_center = float('inf'), float("-inf")
-                for line_index in range(rotation.start_line, rotation.end_line + 1):
-                    min_line_center = min(min_line_center, rotated_lines[line_index].center_y)
-                    max_line_center = max(max_line_center, rotated_lines[line_index].center_y)
-                bad = False
-                for line_index in range(len(rotated_lines)):
-                    if not (rotation.start_line <= line_index <= rotation.end_line) and \
-                            min_line_center < rotated_lines[line_index].center_y < max_line_center:
-                        bad = True
-                if bad:
-                    continue
+    print(" {} events\n".format(len(records)))
 
-                # TODO: WORKAROUND-CONDITION #2
-                if rotated_lines[rotation.start_line].isTiltedCorrectly() or rotated_lines[rotation.end_line].isTiltedCorrectly():
-                    continue
+    report.save(pairs=[
+        {
+            "query": query_contigs[pair.query].name,
+            "ref": ref_contigs[pair.ref].name,
+            "folder": os.path.basename(folder),
+            "segments": len(pair.segments),
+            "events": len(history)
+        }
+        for pair, folder, history in zip(pairs, folders, histories)
+    ])
 
-                cur_metric = countMetricWithRotation(rotated_lines, rotation)
+    # Rotations and large events of all pairs
+    return [action for history in histories for action in history]
 
-                if cur_metric < best_metric_value:
-                    best_metric_value = cur_metric
-                    best_rotation_index = i
 
-            if best_metric_value >= cur_metric_value:
-                break
+def pairFolder(output_folder: str, query_contig: Contig, ref_contig: Contig) -> str:
+    return mkpath(output_folder, "{}_{}".format(*(re_sub(r"[^\w.-]", "_", contig.name) for contig in (query_contig, ref_contig))))
 
-            print("\n{} -> {}".format(possible_rotations[best_rotation_index], cur_metric_value))
 
-            cur_metric_value = countMetricWithRotation(rotated_lines, possible_rotations[best_rotation_index], apply_rotation=True)
+def analyzePairTask(task: tuple, log: bool = True):
+    """
+    Analyzes one pair of contigs in its folder with its own report.json (output goes to log.txt of the folder if log).
+    task - (genomes, segments, output_folder, settings, render, cache_key)
+    """
+    genomes, segments, output_folder, settings, render, cache_key = task
 
-            # print("best_metric_value = {}".format(best_metric_value))
-            # print("best_rotation_index = {}".format(best_rotation_index))
+    os.makedirs(output_folder, exist_ok=True)
 
-            rotation_actions.append(possible_rotations[best_rotation_index])
+    if log:
+        with open(mkpath(output_folder, "log.txt"), 'w', encoding="utf-8") as log_file, redirect_stdout(log_file):
+            return analyzePairTask(task, log=False)
 
-            # if draw:
-            #     for line in rotated_lines:
-            #         plot.plotLine(line)
-            #     plot.save(mkpath(output_folder, "history", "x{}.png".format(index)))
-            #     plot.clear()
-            #     index += 1
+    print("---| {} |---".format(output_folder))
 
-        # print("Final metric value: ", cur_metric_value, countMetric(rotated_lines))
-        print("\nRotation actions:", *rotation_actions, sep='\n')
-        # print("\nRotated lines:", *rotated_lines, sep='\n')
+    report = Report(
+        mkpath(output_folder, "report.json"),
+        mkpath(output_folder, "profile") if settings["profile"] else None,
+        settings["trace_memory"]
+    )
+    report.stage("genomes")
 
-        # plot.clear()
-        # for line in rotated_lines:
-        #     plot.plotLine(line)
-        # plot.show()
-        # plot.clear()
+    print("Query: {} [{}]".format(genomes.query_name, prtNum(genomes.query_length)))
+    print("Reference: {} [{}]\n".format(genomes.ref_name, prtNum(genomes.ref_length)))
 
-        return cur_metric_value, rotated_lines, rotation_actions
+    report.count(query_genome_length=genomes.query_length, ref_genome_length=genomes.ref_length)
 
-    def countShift(lines, start_line, apply_changes=False) -> int:
-        d_x = lines[start_line].start_x
+    return analyzePair(genomes, segments, output_folder, settings, False, render, report, cache_key)
 
-        for line_index in range(start_line, len(lines)):
-            lines[line_index].shift(dx=-d_x)
 
-        for line_index in range(0, start_line):
-            lines[line_index].shift(dx=query_genome_length - d_x)
+def analyzePair(genomes: Genomes, segments, output_folder: str, settings: dict, show_plot: bool, render: bool, report: Report, cache_key: Optional[str]):
+    """
+    Analysis of one pair of genomes (contigs) after reading SAM file, report is saved at the end.
+    segments - array or function returning it (called only if lines are not cached), cache_key - key of segments (None without cache)
+    """
+# ====================================================================================================================================================================
+    # A cached stage skips all stages before it
+    stage_keys = {}
+    if settings["cache"]:
+        stage_keys["lines"] = Cache.stageKey(
+            "lines", cache_key, genomes.ref_length,
+            settings["lines_method"], settings["lines_join_size"], settings["line_min_size"], settings["dot_skip_rate"]
+        )
+        stage_keys["shift"] = Cache.stageKey("shift", stage_keys["lines"], genomes.query_length)
 
-        # print("\nLines:", *lines, sep='\n')
+    def loadStage(stage):
+        return Cache.load(stage_keys[stage]) if settings["cache"] else None
 
-        rotated_lines = shiftLines(deepcopy(lines), start_line)
+    def saveStage(stage, **arrays):
+        if settings["cache"]:
+            Cache.save(stage_keys[stage], **arrays)
 
-        # print("\nLines:", *lines, sep='\n')
-        # print("\nRotated lines:", *rotated_lines, sep='\n')
+    shift_cache = loadStage("shift")
+    lines_cache = loadStage("lines") if shift_cache is None else None
 
-        metric_value, rotated_lines, rotation_actions = countBestRotations(rotated_lines)
+    # return
+# ====================================================================================================================================================================
+    # Parse CIGAR and create a list of all actions
+    if shift_cache is None and lines_cache is None and callable(segments):
+        segments = segments()
 
-        print("metric_value = {} or {}".format(metric_value, metric_value * len(rotation_actions)))
+    # return
+# ====================================================================================================================================================================
+    # Creating dots (only for "dots" lines method, "chain" works with segments directly)
+    dots = None
+    if settings["lines_method"] == "dots" and shift_cache is None and lines_cache is None:
+        print("Creating dots...", end="")
+        report.stage("dots")
 
-        if apply_changes:
-            return shiftLines(lines, start_line), rotated_lines, rotation_actions
+        dots = makeDots(segments, genomes, settings)
 
-        for line_index in range(start_line, len(lines)):
-            lines[line_index].shift(dx=d_x)
+        print(" {}".format(prtNum(int(segments["length"].sum()))))  # Dots are sampled: len(dots) ~ count // dot_skip_rate
+        report.count(dots=len(dots))
 
-        for line_index in range(0, start_line):
-            lines[line_index].shift(dx=d_x - query_genome_length)
+    # return
+# ====================================================================================================================================================================
+    # Counting lines
+    if shift_cache is None:
+        print("Counting lines...", end="")
+        report.stage("lines")
+
+        if lines_cache is None:
+            lines = countLines(segments, dots, genomes, settings)
+            del dots
+            saveStage("lines", **Cache.linesToArrays(lines))
+        else:
+            lines = Cache.arraysToLines(lines_cache)
 
-        return metric_value * len(rotation_actions)
+        print(" {} lines{}".format(len(lines), "" if lines_cache is None else " (cached)"))
+        report.count(lines=len(lines), line_dots=sum(len(line.dots) for line in lines), cached=lines_cache is not None)
+        print("Lines:", *lines, sep='\n')
 
-    best_metric_value = float("inf")
-    best_metric_value_start_line = 0
+        # Nothing to analyze (e.g. a pair of contigs with a few short alignments): empty history
+        if not lines:
+            print("\nNo lines\n")
+            open(mkpath(output_folder, "history.txt"), 'w', encoding="utf-8").close()
+            EventWriter(mkpath(output_folder, "events"), contigs=[(shortName(genomes.query_name), genomes.query_length)]).close()
+            report.save()
+            return []
 
-    for start_line in range(len(lines)):
-        print("\n-| Counting for start_line = {}...".format(start_line))
+    # return
+# ====================================================================================================================================================================
+    # Shift and rotations
+    print("Counting shift and rotations...")
+    report.stage("shift")
 
-        cur_metric_value = countShift(lines, start_line)
+    if shift_cache is None:
+        shift, start_line, rotation_candidates = countShiftAndRotations(lines, genomes, settings)
 
-        if cur_metric_value < best_metric_value:
-            best_metric_value = cur_metric_value
-            best_metric_value_start_line = start_line
+        saveStage("shift", **Cache.shiftToArrays(*shift))
+        # Candidates evaluated: every start line is a shift candidate, rotations are counted for all of them
+        report.count(shift_candidates=len(lines), rotation_candidates=rotation_candidates, start_line=start_line, d_x=shift.d_x)
+    else:
+        print("===| Cached")
+        shift = ShiftResult(*Cache.arraysToShift(shift_cache))
 
-    print("\n===| Counting end result with start_line = {}...".format(best_metric_value_start_line))
-    lines, rotated_lines, rotation_actions = countShift(lines, best_metric_value_start_line, apply_changes=True)
+    lines, rotated_lines, rotation_actions, _ = shift
 
-    # plot.clear()
-    # for line in lines:
-    #     plot.plotLine(line)
-    # plot.show()
-    # plot.clear()
+    report.count(rotations=len(rotation_actions), cached=shift_cache is not None)
 
     print("\nLines:", *lines, sep='\n')
     print("\nRotated lines:", *rotated_lines, sep='\n')
@@ -420,248 +403,121 @@ def analyze(query_genome_path: str, ref_genome_path: str, sam_file_path: str, sh
 # ====================================================================================================================================================================
     # Handle events
     print("\nHandling events...")
+    report.stage("events")
 
-    actions = []
-
-    last = rotated_lines[0]
-    for line_index in range(1, len(rotated_lines)):
-        cur = rotated_lines[line_index]
-
-        if cur.start_x >= last.end_x and cur.start_y >= last.end_y:  # top right
-            insertion_length = cur.start_y - last.end_y
-            deletion_length = cur.start_x - last.end_x
+    events = findEvents(rotated_lines, settings)
 
-            actions.append(Insertion(last.end_x, last.end_y, insertion_length))
-            plot.line(last.end_x, last.end_y, last.end_x, cur.start_y, color="#0f0")
-
-            actions.append(Deletion(last.end_x, last.end_y, deletion_length))
-            plot.line(last.end_x, cur.start_y, cur.start_x, cur.start_y, color="#f00")
-
-        elif cur.start_x < last.end_x and cur.start_y >= last.end_y:  # top left
-            tmp_dot_y = YCoordOnLine(*last.coords, cur.start_x)
-            insertion_length = cur.start_y - last.end_y
-            duplication_length = last.end_x - cur.start_x
-            duplication_height = last.end_y - tmp_dot_y
-
-            actions.append(Insertion(cur.start_x, last.end_y, insertion_length))
-            plot.line(cur.start_x, last.end_y, cur.start_x, cur.start_y, color="#0f0")
+    print("\nActions:", *events.actions, sep='\n')
+    print("\nLarge_actions:", *events.large_actions, sep='\n')
+    print()
 
-            actions.append(Duplication(cur.start_x, tmp_dot_y, duplication_length, duplication_height, line_index - 1))
-            plot.poligon([
-                (cur.start_x, tmp_dot_y),
-                (cur.start_x, last.end_y),
-                (last.end_x, last.end_y)
-            ], color="#f0f")
+    report.count(events=len(events.actions), large_events=len(events.large_actions))
 
-        elif cur.start_x >= last.end_x and cur.start_y < last.end_y:  # bottom right
-            deletion_length = cur.start_x - last.end_x
-            translocation_length = last.end_y - cur.start_y
+    # return
+# ====================================================================================================================================================================
+    # Plotting dots, lines and events
+    if render:
+        print("Plotting dots and lines...")
+        report.stage("main_plot")
+
+        from Plot import Plot
+
+        plot = Plot("Main plot", settings["fontsize"], settings["grid_size"], settings["figsize"], genomes.query_name, genomes.ref_name,
+                    settings["plot_method"] == "density")
+        plot.legendLine({
+            "Insertion": "#0f0",
+            "Deletion": "#f00",
+            "Duplication": "#f0f",
+            "Translocation": "#0ff"
+        }, fontsize=settings["fontsize"], lw=2)
+
+        for mark in events.marks:
+            if mark.kind == "line":
+                plot.line(*mark.coords, color=mark.color)
+            else:
+                plot.poligon(mark.coords, color=mark.color)
 
-            actions.append(Deletion(last.end_x, last.end_y, deletion_length))
-            plot.line(last.end_x, last.end_y, cur.start_x, last.end_y, color="#f00")
+        for line in lines:
+            plot.plotLine(line, color="#fa0")
+            plot.scatter(line.dots[::settings["dot_skip_rate"]], dotsize=settings["dotsize"], color="#00f")
 
-            actions.append(Translocation(last.end_x, last.end_y, translocation_length))
-            plot.line(cur.start_x, last.end_y, cur.start_x, cur.start_y, color="#0ff")
+        for line in rotated_lines:
+            plot.plotLine(line)
 
-        else:
-            # print([cur.start_x, last.end_x], [cur.start_y, last.end_y])
-            print("\nUnknown action!!!\n")
+        report.count(plotted_dots=sum(len(line.dots[::settings["dot_skip_rate"]]) for line in lines))
 
-        if cur.end_x >= last.end_x:
-            last = cur
+        print("Saving plot...")
+        # plot.tight()
+        plot.save(mkpath(output_folder, "sam_analyze.png"))
 
-    large_actions = sorted([action for action in actions if action.size >= settings["min_event_size"]], key=lambda action: -action.size)
+        if show_plot:
+            print("Showing plot...")
+            plot.show()
 
-    print("\nActions:", *actions, sep='\n')
-    print("\nLarge_actions:", *large_actions, sep='\n')
-    print()
+        # Data of the main plot is in the limits of the first frame
+        main_plot_limits = plot.dataLimits()
+        plot.clear()
+        del plot
 
     # return
 # ====================================================================================================================================================================
-    # Plotting dots and lines
-    print("Plotting dots and lines...")
-
-    for line in lines:
-        plot.plotLine(line, color="#fa0")
-        plot.scatter(line.dots[::settings["dot_skip_rate"]], dotsize=settings["dotsize"], color="#00f")
+    # Make and save history
+    print("Making history...", end="")
+    report.stage("history")
 
-    for line in rotated_lines:
-        plot.plotLine(line)
+    history = historyActions(shift, events)
 
-    # dots = []  # Optional compress
-    # for x in range(0, len(graph), settings["dot_skip_rate"]):
-    #     dots += ([x, y] for y in graph[x])
+    with open(mkpath(output_folder, "history.txt"), 'w', encoding="utf-8") as history_file:
+        for text in historyText(lines, history):
+            print(text + "\n", file=history_file)
 
-    # plot.scatter(dots, dotsize=settings["dotsize"], color="#00f")
+    # The same events for other tools: events.jsonl, events.bed and events.vcf (sorted by query position, see EventWriter.py)
+    with EventWriter(mkpath(output_folder, "events"), contigs=[(shortName(genomes.query_name), genomes.query_length)]) as event_writer:
+        event_writer.writeAll(sorted(eventRecords(lines, history, genomes, shift.d_x), key=lambda record: (record["query_start"], record["index"])))
 
-    print("Saving plot...")
-    # plot.tight()
-    plot.save(mkpath(output_folder, "sam_analyze.png"))
+    print(" {} images\n".format(len(history)))
 
-    if show_plot:
-        print("Showing plot...")
-        plot.show()
+    # print("Large actions:", *history, sep='\n')
 
-    plot.clear()
+    if render:
+        if not os.path.exists(mkpath(output_folder, "history")):
+            os.mkdir(mkpath(output_folder, "history"))
 
-    # return
-# ====================================================================================================================================================================
-    # Make and save history
-    print("Making history...", end="")
+        for filename in os.listdir(mkpath(output_folder, "history")):
+            os.remove(mkpath(output_folder, "history", filename))
 
-    if not os.path.exists(mkpath(output_folder, "history")):
-        os.mkdir(mkpath(output_folder, "history"))
+    render_frames = render and (settings["history_png"] or settings["history_gif"])
 
-    for filename in os.listdir(mkpath(output_folder, "history")):
-        os.remove(mkpath(output_folder, "history", filename))
+    if render_frames:
+        from Frames import renderFrames
 
-    large_actions = [Pass()] + rotation_actions + large_actions
+        def frames():
+            for action_index, (action, frame_dots) in enumerate(zip(history, historyFrames(lines, rotated_lines, history))):
+                name = "" if isinstance(action, Pass) else " ({})".format(action.type)
 
-    with open(mkpath(output_folder, "history.txt"), 'w', encoding="utf-8") as history_file:
-        for action in large_actions:
-
-            if isinstance(action, Rotation):
-                print("Rotation from {} (Query) to {} (Query)\n".format(
-                    prtNum(int(lines[action.start_line].start_x)),
-                    prtNum(int(lines[action.end_line].end_x))
-                ), file=history_file)
-
-            elif isinstance(action, Deletion):
-                print("Deletion of {}-{} (Query) from {} (Ref)\n".format(
-                    prtNum(int(action.start_x)),
-                    prtNum(int(action.start_x + action.length)),
-                    prtNum(int(action.start_y))
-                ), file=history_file)
-
-            elif isinstance(action, Insertion):
-                print("Insertion of {}-{} (Ref) to {} (Query)\n".format(
-                    prtNum(int(action.start_y)),
-                    prtNum(int(action.start_y + action.height)),
-                    prtNum(int(action.start_x))
-                ), file=history_file)
-
-            elif isinstance(action, Translocation):
-                print("Translocation of {}-END (Query) from {} (Ref) to {} (Ref)\n".format(
-                    prtNum(int(action.start_x)),
-                    prtNum(int(action.start_y - action.height)),
-                    prtNum(int(action.start_y))
-                ), file=history_file)
-
-            elif isinstance(action, Duplication):
-                print("Duplication of {}-{} (Query) {}-{} (Ref)\n".format(
-                    prtNum(int(action.start_x)),
-                    prtNum(int(action.start_x + action.length)),
-                    prtNum(int(action.start_y)),
-                    prtNum(int(action.start_y + action.height))
-                ), file=history_file)
-
-    print(" {} images\n".format(len(large_actions)))
-
-    # print("Large actions:", *large_actions, sep='\n')
-
-    for action_index, action in enumerate(large_actions):
-
-        if isinstance(action, Rotation):
-            for line_index in range(action.start_line, action.end_line + 1):
-                lines[line_index].rotateY(action.rotation_center, line=False, dots=True)
-
-        elif isinstance(action, Insertion):
-            for line in rotated_lines:
-                new_dots = []
-                for dot_x, dot_y in line.dots:
-                    if dot_x > action.start_x:
-                        dot_y -= action.height
-                    if dot_x != action.start_x:
-                        new_dots.append([dot_x, dot_y])
-
-                line.dots = new_dots
-
-            for i in range(action_index + 1, len(large_actions)):
-                if large_actions[i].start_x >= action.start_x:
-                    large_actions[i].start_y -= action.height
-
-        elif isinstance(action, Deletion):
-            for line in rotated_lines:
-                for i in range(len(line.dots)):
-                    if line.dots[i][0] >= action.start_x + action.length:
-                        line.dots[i][0] -= action.length
-
-            for i in range(action_index + 1, len(large_actions)):
-                if large_actions[i].start_x >= action.start_x + action.length:
-                    large_actions[i].start_x -= action.length
-
-        elif isinstance(action, Duplication):
-            new_dots = []
-            for dot in rotated_lines[action.line_index].dots:
-                if not (action.start_x <= dot[0] <= action.start_x + action.length):
-                    new_dots.append(dot)
-            rotated_lines[action.line_index].dots = new_dots
-
-            for line in rotated_lines:
-                for i in range(len(line.dots)):
-                    if line.dots[i][0] >= action.start_x:
-                        line.dots[i][1] -= action.height
-
-            for i in range(action_index + 1, len(large_actions)):
-                if large_actions[i].start_x >= action.start_x:
-                    large_actions[i].start_y -= action.height
-
-        elif isinstance(action, Translocation):
-            for line in rotated_lines:
-                new_dots = []
-                for dot_x, dot_y in line.dots:
-                    if dot_x > action.start_x:
-                        dot_y += action.height
-                    if dot_x != action.start_x:
-                        new_dots.append([dot_x, dot_y])
-
-                line.dots = new_dots
-
-            for i in range(action_index + 1, len(large_actions)):
-                if large_actions[i].start_x >= action.start_x:
-                    large_actions[i].start_y += action.height
-
-        elif isinstance(action, Pass):
-            pass
+                print("Saving large action #{}{}...\n".format(action_index, name))
+                yield (
+                    mkpath(output_folder, "history", "{}{}.png".format(str(action_index).zfill(3), name)),
+                    frame_dots,
+                    main_plot_limits if action_index == 0 else None
+                )
 
-        else:
-            raise ValueError("History: Unknown action type")
+        # Frames are rendered on a process pool (if settings["processes"] != 1) to PNG files and / or to history.gif
+        renderFrames(
+            frames(),
+            ("Main plot", settings["fontsize"], settings["grid_size"], settings["figsize"], genomes.query_name, genomes.ref_name,
+             settings["plot_method"] == "density"),
+            settings["dotsize"],
+            settings["processes"],
+            save_png=settings["history_png"],
+            gif_path=mkpath(output_folder, "history.gif") if settings["history_gif"] else None
+        )
 
-        if isinstance(action, (Pass, Rotation)):
-            # plot.scatter(dots, dotsize=settings["dotsize"], color="#00f")
-            for line in lines:
-                plot.scatter(line.dots, dotsize=settings["dotsize"], color="#00f")
-        else:
-            # Adjusting axes (bottom):
-            bottom = float("inf")
-            for line in rotated_lines:
-                for dot_x, dot_y in line.dots:
-                    bottom = min(bottom, dot_y)
-
-            for line in rotated_lines:
-                line.shift(dy=-bottom)
-
-            for i in range(action_index + 1, len(large_actions)):
-                if hasattr(large_actions[i], "start_x") and hasattr(large_actions[i], "start_y") and \
-                        large_actions[i].start_x >= action.start_x:
-                    large_actions[i].start_y += bottom
-
-            for line in rotated_lines:
-                plot.scatter(line.dots, dotsize=settings["dotsize"], color="#00f")
-
-        print("Saving large action #{}{}...\n".format(action_index, "" if isinstance(action, Pass) else " ({})".format(action.type)))
-        plot.tight()
-        plot.save(mkpath(
-            output_folder,
-            "history",
-            "{}{}.png".format(
-                str(action_index).zfill(3),
-                "" if isinstance(action, Pass) else " ({})".format(action.type)
-            )
-        ))
-        plot.clear()
+    report.count(frames=len(history), rendered=render_frames)
+    report.save()
 
-    del plot
+    # Rotations and large events in the order of history
+    return history[1:]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from struct import unpack_from
+from mmap import mmap, ACCESS_READ
+from os import cpu_count
+import zlib
+import gzip
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+FLAG_EXTRA = 0x4
+
+BLOCKS_PER_BATCH = 256  # ~16 MB of decompressed data per batch
+
+
+def isGzip(path):
+    with open(path, 'rb') as file:
+        return file.read(2) == GZIP_MAGIC
+
+
+def peek(path, size):
+    """Returns the first size bytes of decompressed data (the first BGZF block is at most 64 KB)"""
+    with open(path, 'rb') as file:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(file.read(1 << 16), size)
+
+
+def blockOffsets(data):
+    """
+    Yields (offset, size) of every BGZF block in data.
+    Raises ValueError if a gzip member has no BGZF "BC" extra subfield
+    """
+    offset = 0
+    while offset < len(data):
+        if data[offset:offset + 2] != GZIP_MAGIC:
+            raise ValueError("BGZF: Invalid gzip header at offset {}".format(offset))
+
+        # ID1 ID2 CM FLG MTIME XFL OS XLEN
+        if not data[offset + 3] & FLAG_EXTRA:
+            raise ValueError("BGZF: Not a BGZF block at offset {}".format(offset))
+        xlen, = unpack_from("<H", data, offset + 10)
+
+        block_size = None
+        extra_offset = offset + 12
+        while extra_offset < offset + 12 + xlen:
+            si1, si2, slen = unpack_from("<BBH", data, extra_offset)
+            if si1 == 66 and si2 == 67:
+                block_size, = unpack_from("<H", data, extra_offset + 4)
+                block_size += 1
+            extra_offset += 4 + slen
+
+        if block_size is None:
+            raise ValueError("BGZF: Not a BGZF block at offset {}".format(offset))
+
+        yield offset, block_size
+        offset += block_size
+
+
+def inflateBlock(block):
+    # 12 bytes of fixed header + XLEN (2 bytes) + extra subfields, 8 bytes of CRC32 and ISIZE at the end
+    xlen, = unpack_from("<H", block, 10)
+    return zlib.decompress(block[12 + xlen:-8], -15)
+
+
+def readChunks(path, threads=None):
+    """
+    Yields decompressed chunks of a BGZF (or plain gzip) file.
+    Independent BGZF blocks are decompressed on a thread pool (zlib releases the GIL)
+    """
+    with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+        try:
+            offsets = list(blockOffsets(data))
+        except ValueError:
+            offsets = None
+
+        if offsets is None:
+            with gzip.open(path, 'rb') as gzip_file:
+                while True:
+                    chunk = gzip_file.read(BLOCKS_PER_BATCH << 16)
+                    if not chunk:
+                        break
+                    yield chunk
+            return
+
+        with ThreadPoolExecutor(max_workers=threads or cpu_count()) as executor:
+            # The next batch is decompressed while the current one is being consumed
+            pending = []
+            for batch_start in range(0, len(offsets), BLOCKS_PER_BATCH):
+                futures = [
+                    executor.submit(inflateBlock, data[offset:offset + size])
+                    for offset, size in offsets[batch_start:batch_start + BLOCKS_PER_BATCH]
+                ]
+                if pending:
+                    yield b"".join(future.result() for future in pending)
+                pending = futures
+
+            if pending:
+                yield b"".join(future.result() for future in pending)
@@ -1,37 +1,144 @@
-from functools import cmp_to_key
+import numpy as np
 
 
-def comp(s_int, x, y):
-    n = len(s_int)
-    for i in range(n):
-        res = s_int[(x + i) % n] - s_int[(y + i) % n]
-        if res < 0:
-            return -1
-        if res > 0:
-            return 1
-    return 0
+# BWT of s + "$" by the suffix array ("$" must not be in s): rotations of a string with a unique character
+# are in the same order as its suffixes (every comparison ends at "$" at the latest)
+
+BLOCK_SIZE = 1 << 20  # characters decoded at once by ibwt
+
+
+def textCodes(s):
+    """Characters of str or bytes as an array of codes and a function converting such array back"""
+    if isinstance(s, (bytes, bytearray)):
+        return np.frombuffer(s, dtype=np.uint8), lambda codes: codes.astype(np.uint8).tobytes()
+    if s.isascii():
+        return np.frombuffer(s.encode("ascii"), dtype=np.uint8), lambda codes: codes.astype(np.uint8).tobytes().decode("ascii")
+    return np.frombuffer(s.encode("utf-32-le"), dtype="<u4"), lambda codes: codes.astype("<u4").tobytes().decode("utf-32-le")
+
+
+def suffixArray(s):
+    """
+    Starts of suffixes of s (str, bytes or array of codes) in sorted order.
+    Prefix doubling: suffixes sorted by the first k characters are sorted by the first 2k characters with pairs of ranks.
+    Rank of a suffix is the first index of its group (suffixes with equal first k characters) in the order,
+    only groups of more than one suffix are sorted again, so every round works only with not yet sorted suffixes
+    """
+    codes = textCodes(s)[0] if isinstance(s, (str, bytes, bytearray)) else np.asarray(s)
+    n = len(codes)
+
+    order = np.argsort(codes, kind="stable").astype(np.int64)
+    rank = np.empty(n, dtype=np.int64)
+
+    # Indexes of the order to sort (groups are contiguous) and keys of their suffixes
+    positions = np.arange(n, dtype=np.int64)
+    keys = (codes[order].astype(np.int64),)
+
+    k = 1
+    while len(positions):
+        suffixes = order[positions]
+
+        # Rank is the first key: sorted suffixes of every group take the same positions
+        sort = np.lexsort(keys[::-1])
+        suffixes = suffixes[sort]
+        order[positions] = suffixes
+
+        # New group starts where any key changes
+        starts = np.zeros(len(suffixes), dtype=bool)
+        starts[:1] = True
+        for key in keys:
+            sorted_key = key[sort]
+            starts[1:] |= sorted_key[1:] != sorted_key[:-1]
+
+        rank[suffixes] = np.maximum.accumulate(np.where(starts, positions, 0))
+
+        group = np.cumsum(starts) - 1
+        unsorted = np.bincount(group)[group] > 1
+        positions = positions[unsorted]
+
+        # Pair of ranks: of the suffix and of the suffix k characters later (a shorter suffix goes first, -1)
+        suffixes = order[positions]
+        second = np.full(len(suffixes), -1, dtype=np.int64)
+        inside = suffixes + k < n
+        second[inside] = rank[suffixes[inside] + k]
+        keys = (rank[suffixes], second)
+
+        k *= 2
+
+    return order
+
+
+def bwtFromSuffixArray(s, suffix_array):
+    """BWT of s (ending with a unique character) by its suffix array: the character before every suffix"""
+    codes, decode = textCodes(s)
+    return decode(codes[suffix_array - 1])  # Index -1 is the last character (before the suffix at 0)
 
 
 def bwt(s):
-    s = s + "$"
-    n = len(s)
+    """BWT of s + "$" (str -> str, bytes or bytearray -> bytes)"""
+    sentinel = b"$" if isinstance(s, (bytes, bytearray)) else "$"
+    if sentinel in s:
+        raise ValueError("BWT: \"$\" in text")
+
+    s = s + sentinel
+    return bwtFromSuffixArray(s, suffixArray(s))
+
+
+def _ibwtCodes(codes, block_size):
+    """
+    Yields codes of the text in blocks.
+    LF-mapping of a row is the count of smaller characters plus the rank of its character among equal ones.
+    Row of the next character is the inverse of LF: the k-th row of a character in the first column is its k-th row
+    in the last column, so rows of the last column in stable order of their characters are the inverse.
+    Characters are renumbered by their counts (bincount + cumsum) into uint8 or uint16 first, numpy sorts such keys
+    stably by radix sort: one O(n) pass for any alphabet.
+    The walk itself is sequential (every row is found from the previous one), numpy only fills the blocks
+    """
+    sentinel = np.flatnonzero(codes == ord("$"))
+    if len(sentinel) == 0:
+        raise ValueError("BWT: No \"$\" in text")
+
+    index_dtype = np.int32 if len(codes) < 1 << 31 else np.int64
+
+    # Dense number of every character: count of distinct smaller characters
+    present = np.bincount(codes) > 0
+    dense = (np.cumsum(present) - 1)[codes]
+    alphabet_size = int(np.count_nonzero(present))
+    if alphabet_size <= 1 << 8:
+        dense = dense.astype(np.uint8)
+    elif alphabet_size <= 1 << 16:
+        dense = dense.astype(np.uint16)
+
+    next_row = memoryview(np.argsort(dense, kind="stable").astype(index_dtype))
+
+    rows = np.empty(min(block_size, len(codes) - 1), dtype=index_dtype)
+    rows_view = memoryview(rows)
 
-    s_int = [ord(s[i]) for i in range(n)]
+    row = int(sentinel[0])
+    for start in range(0, len(codes) - 1, block_size):
+        count = min(block_size, len(codes) - 1 - start)
+        for i in range(count):
+            row = next_row[row]
+            rows_view[i] = row
+        yield codes[rows[:count]]
 
-    starts = sorted(list(range(n)), key=cmp_to_key(lambda x, y: comp(s_int, x, y)))
 
-    return "".join([s[(starts[i] + n - 1) % n] for i in range(n)])
+def ibwt(s, block_size=BLOCK_SIZE):
+    codes, decode = textCodes(s)
 
+    text = np.empty(max(len(codes) - 1, 0), dtype=codes.dtype)
+    position = 0
+    for block in _ibwtCodes(codes, block_size):
+        text[position:position + len(block)] = block
+        position += len(block)
 
-def ibwt(s):
+    return decode(text)
 
-    def gen(k):
-        permutation = sorted((t, i) for i, t in enumerate(s))
-        for _ in range(len(s) - 1):
-            t, k = permutation[k]
-            yield t
 
-    return ''.join(gen(s.find('$')))
+def ibwtBlocks(s, block_size=BLOCK_SIZE):
+    """Yields the text of ibwt(s) in blocks of block_size characters (the whole text is never kept)"""
+    codes, decode = textCodes(s)
+    for block in _ibwtCodes(codes, block_size):
+        yield decode(block)
 
 
 def compress(s):
@@ -55,7 +162,7 @@ if __name__ == "__main__":
 
     # text = input("Input: ")
     with open("src/BWT_test.txt", 'r', encoding="utf-8") as file:
-        text = file.read().strip().replace("\n", ' ')[:100000]
+        text = file.read().strip().replace("\n", ' ')
 
     print("Encrypting...")
 
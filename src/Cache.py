@@ -0,0 +1,139 @@
+from hashlib import blake2b
+from json import dumps as json_dumps
+from zipfile import BadZipFile
+import numpy as np
+import os
+
+from Line import Line
+from Events import Rotation
+
+
+# Results of stages are saved to CACHE_FOLDER as .npz files named by the hash of everything the stage depends on:
+# input files (by content), settings used by the stage and keys of previous stages.
+# Every hit updates the modification time of the file, the least recently used files are removed above CACHE_SIZE
+
+CACHE_FOLDER = "cache"
+CACHE_SIZE = 1 << 30  # bytes
+
+HASH_CHUNK_SIZE = 1 << 24  # bytes read at once while hashing files
+
+CACHE_VERSION = 5  # Changed with the format of saved arrays (e.g. SAM.SEGMENT_DTYPE), so old files are not loaded
+
+
+def fileHash(path):
+    file_hash = blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def stageKey(stage, *parts):
+    """Key of the stage result: parts are hashes of files, settings and keys of previous stages (anything JSON can dump)"""
+    return blake2b(json_dumps([CACHE_VERSION, stage, *parts], sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _path(key, cache_folder):
+    return os.path.join(cache_folder, key + ".npz")
+
+
+def load(key, cache_folder=CACHE_FOLDER):
+    """Returns {name: array} saved with key or None"""
+    path = _path(key, cache_folder)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        os.utime(path)
+    except (OSError, ValueError, EOFError, BadZipFile):  # Missing, removed by another process or broken (e.g. truncated) file
+        return None
+    return arrays
+
+
+def save(key, cache_folder=CACHE_FOLDER, cache_size=CACHE_SIZE, **arrays):
+    """Saves arrays with key (the file appears at once: it is written to a temporary file first) and evicts old files"""
+    os.makedirs(cache_folder, exist_ok=True)
+
+    temp_path = _path("{}.{}.tmp".format(key, os.getpid()), cache_folder)
+    with open(temp_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temp_path, _path(key, cache_folder))
+
+    evict(cache_folder, cache_size)
+
+
+def evict(cache_folder=CACHE_FOLDER, cache_size=CACHE_SIZE):
+    """Removes the least recently used files until the cache is not larger than cache_size"""
+    files = []
+    for entry in os.scandir(cache_folder):
+        if entry.name.endswith(".npz") and not entry.name.endswith(".tmp.npz"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in files)
+
+    for _, size, path in sorted(files):
+        if total_size <= cache_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+
+# --------------------------------------------------------------------------------> Lines
+
+
+def statsToArray(lines):
+    """Line.stats of lines as decimal strings (N, 5): sums of squares may not fit into int64"""
+    return np.array([[str(value) for value in line.stats] for line in lines], dtype=str).reshape(-1, 5)
+
+
+def arrayToLines(coords, dots, ends, stats):
+    """Lines with saved stats (stats of chained lines are counted on all dots of segments, not on the saved sampled dots)"""
+    lines = []
+    for line_coords, line_dots, line_stats in zip(coords.tolist(), np.split(dots, ends[:-1]), stats.tolist()):
+        line = Line(*line_coords, dots=line_dots)
+        line.stats = tuple(int(value) for value in line_stats)
+        lines.append(line)
+    return lines
+
+
+def linesToArrays(lines):
+    """Coordinates, dots and stats of lines as four arrays: coords (N, 4), dots of all lines one after another, their ends, stats (N, 5)"""
+    return {
+        "lines_coords": np.array([line.coords for line in lines]).reshape(-1, 4),
+        "lines_dots": np.concatenate([line.dots for line in lines]) if lines else np.empty((0, 2), dtype=np.int64),
+        "lines_ends": np.cumsum([len(line.dots) for line in lines], dtype=np.int64),
+        "lines_stats": statsToArray(lines)
+    }
+
+
+def arraysToLines(arrays):
+    return arrayToLines(arrays["lines_coords"], arrays["lines_dots"], arrays["lines_ends"], arrays["lines_stats"])
+
+
+def shiftToArrays(lines, rotated_lines, rotation_actions, d_x):
+    """Result of countShift with apply_changes: dots of rotated lines are rotated with them (their counts are the same as of lines)"""
+    return {
+        **linesToArrays(lines),
+        "rotated_coords": np.array([line.coords for line in rotated_lines]).reshape(-1, 4),
+        "rotated_dots": np.concatenate([line.dots for line in rotated_lines]) if rotated_lines else np.empty((0, 2), dtype=np.int64),
+        "rotated_stats": statsToArray(rotated_lines),
+        "rotation_lines": np.array([(action.start_line, action.end_line) for action in rotation_actions], dtype=np.int64).reshape(-1, 2),
+        "rotation_centers": np.array([action.rotation_center for action in rotation_actions]),
+        "shift_x": np.array(d_x, dtype=np.int64)
+    }
+
+
+def arraysToShift(arrays):
+    lines = arraysToLines(arrays)
+    rotated_lines = arrayToLines(arrays["rotated_coords"], arrays["rotated_dots"], arrays["lines_ends"], arrays["rotated_stats"])
+    rotation_actions = [
+        Rotation(start_line, end_line, rotation_center)
+        for (start_line, end_line), rotation_center in zip(arrays["rotation_lines"].tolist(), arrays["rotation_centers"].tolist())
+    ]
+    return lines, rotated_lines, rotation_actions, int(arrays["shift_x"])
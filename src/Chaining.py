@@ -0,0 +1,139 @@
+from typing import List
+from collections import defaultdict
+from heapq import heappush, heappop
+import numpy as np
+
+from Line import Line
+from Dots import segmentStarts, segmentDots
+
+
+# Every segment (CIGAR match block) is a perfect diagonal of dots:
+#   forward: (x0, y0) -> (x0 + length - 1, y0 + length - 1)
+#   reverse: (x0, y0) -> (x0 + length - 1, y0 - length + 1)
+# Colinear segments of the same strand are chained into lines without expanding them to dots
+
+
+def segmentsStats(start_x, start_y, lengths, signs):
+    """
+    Least squares statistics (n, sum x, sum y, sum x^2, sum xy) of all dots of the segments.
+    Sums over every segment are arithmetic progressions, so they are counted in closed form
+    """
+    count, sumx, sumy, sumx2, sumxy = 0, 0, 0, 0, 0
+    for x0, y0, n, sign in zip(start_x, start_y, lengths, signs):
+        sum_k = n * (n - 1) // 2                 # sum of k,   k = 0..n-1
+        sum_k2 = (n - 1) * n * (2 * n - 1) // 6  # sum of k^2
+
+        count += n
+        sumx += n * x0 + sum_k
+        sumy += n * y0 + sign * sum_k
+        sumx2 += n * x0 * x0 + 2 * x0 * sum_k + sum_k2
+        sumxy += n * x0 * y0 + (y0 + sign * x0) * sum_k + sign * sum_k2
+
+    return count, sumx, sumy, sumx2, sumxy
+
+
+def chainSegments(segments, ref_genome_length, lines_join_size, dot_skip_rate=1) -> List[Line]:
+    """
+    Chains colinear segments into lines (sparse dynamic programming over segments sorted by x).
+
+    Segment j can follow segment i of the same strand if it ends further along x and its first dot
+    is not further than lines_join_size from the closest dot of i. The gap (that distance) is the penalty,
+    the score of a chain is the number of its dots not covered by previous segments minus all penalties.
+    Chains are taken greedily by score, every segment belongs to exactly one line
+    (a chain that continues a segment of an already taken chain becomes a branch of that line).
+    Dots of the lines are sampled at dot_skip_rate (for plotting and history only)
+    """
+    segments = segments[np.argsort(segments["query_pos"], kind="stable")]
+
+    start_x = segments["query_pos"]
+    start_y = segmentStarts(segments, ref_genome_length)
+    lengths = segments["length"]
+    signs = np.where(segments["reverse"], -1, 1)
+    end_x = start_x + lengths - 1
+    diagonals = start_y - signs * start_x  # Y - sign * X is constant along a segment
+
+    x0s, y0s, x1s, ls, ss, ds = (array.tolist() for array in (start_x, start_y, end_x, lengths, signs, diagonals))
+
+    bucket_size = max(lines_join_size, 1)
+    lines_join_size2 = lines_join_size ** 2
+
+    scores = [0] * len(segments)
+    previous = [-1] * len(segments)
+
+    buckets = defaultdict(set)  # (sign, diagonal bucket) -> indexes of active segments
+    active = []                 # heap of (end_x, index)
+
+    for j in range(len(segments)):
+        x0, y0, x1, sign = x0s[j], y0s[j], x1s[j], ss[j]
+
+        while active and active[0][0] < x0 - lines_join_size:
+            _, i = heappop(active)
+            buckets[(ss[i], int(ds[i] // bucket_size))].discard(i)
+
+        best_score, best_previous = ls[j], -1
+
+        diagonal_bucket = int(ds[j] // bucket_size)
+        for bucket in range(diagonal_bucket - 2, diagonal_bucket + 3):
+            for i in buckets.get((sign, bucket), ()):
+                if x1s[i] >= x1:
+                    continue
+
+                closest_x = min(max(x0, x0s[i]), x1s[i])
+                closest_y = y0s[i] + sign * (closest_x - x0s[i])
+                gap2 = (x0 - closest_x) ** 2 + (y0 - closest_y) ** 2
+                if gap2 > lines_join_size2:
+                    continue
+
+                score = scores[i] + (x1 - max(x0 - 1, x1s[i])) - gap2 ** 0.5
+                if score > best_score or (score == best_score and i < best_previous):
+                    best_score, best_previous = score, i
+
+        scores[j], previous[j] = best_score, best_previous
+
+        buckets[(sign, diagonal_bucket)].add(j)
+        heappush(active, (x1, j))
+
+    # Chains are taken by score. A chain that reaches an already taken segment is a branch of its line
+    line_of = [-1] * len(segments)
+    groups = []
+
+    for end in sorted(range(len(segments)), key=lambda index: (-scores[index], index)):
+        if line_of[end] != -1:
+            continue
+
+        chain = []
+        index = end
+        while index != -1 and line_of[index] == -1:
+            chain.append(index)
+            index = previous[index]
+
+        if index == -1:
+            index = len(groups)
+            groups.append([])
+        else:
+            index = line_of[index]
+
+        for segment_index in chain:
+            line_of[segment_index] = index
+        groups[index] += chain
+
+    lines = []
+    for group in groups:
+        group.sort()
+
+        dots = segmentDots(segments[group], ref_genome_length, dot_skip_rate)
+        line = Line(int(start_x[group].min()), None, int(end_x[group].max()), None, dots=dots)
+        line.sortDots()
+
+        # The line is fitted on all dots of its segments, not only on the sampled ones
+        line.stats = segmentsStats(*(array[group].tolist() for array in (start_x, start_y, lengths, signs)))
+
+        if line.start_x != line.end_x:
+            line.fit()
+        else:
+            line.start_y = int(start_y[group].min())
+            line.end_y = int(start_y[group].max())
+
+        lines.append(line)
+
+    return lines
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+# Matches are kept as segments (see SAM.SEGMENT_DTYPE): run-length encoded diagonals of dots.
+# Dots are materialized only when needed and only at the sampling rate
+
+
+def segmentStarts(segments, ref_genome_length):
+    """Returns Y coordinate of the first dot of every segment (reverse segments go down from ref_genome_length - ref_pos)"""
+    return np.where(segments["reverse"], ref_genome_length - segments["ref_pos"], segments["ref_pos"])
+
+
+def segmentDots(segments, ref_genome_length, skip_rate=1):
+    """
+    Returns (N, 2) array of dots [x, y] of all segments, only with x divisible by skip_rate.
+    Dots are sorted by x, dots with equal x keep the order of segments
+    """
+    start_x = segments["query_pos"]
+    start_y = segmentStarts(segments, ref_genome_length)
+    step_y = np.where(segments["reverse"], -1, 1)
+
+    first_x = -(-start_x // skip_rate) * skip_rate
+    counts = np.maximum((start_x + segments["length"] - 1 - first_x) // skip_rate + 1, 0)
+
+    segment_index = np.repeat(np.arange(len(segments)), counts)
+    dot_index = np.arange(len(segment_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    dots = np.empty((len(segment_index), 2), dtype=np.int64)
+    dots[:, 0] = first_x[segment_index] + dot_index * skip_rate
+    dots[:, 1] = start_y[segment_index] + (dots[:, 0] - start_x[segment_index]) * step_y[segment_index]
+
+    return dots[np.argsort(dots[:, 0], kind="stable")]
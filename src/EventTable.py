@@ -0,0 +1,107 @@
+from Events import Insertion, Deletion, Translocation, Duplication
+
+
+class FenwickTree:
+    """Prefix sums with point updates in O(log n): add(i, value) adds value to all positions >= i"""
+    __slots__ = ("tree",)
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, index, value):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += value
+            index += index & -index
+
+    def get(self, index):
+        """Sum of all values added at positions <= index"""
+        result = 0
+        index += 1
+        while index > 0:
+            result += self.tree[index]
+            index -= index & -index
+        return result
+
+
+class EventTable:
+    """
+    Current coordinates of events (Insertion, Deletion, Translocation, Duplication) during the history.
+    Events are sorted by current X, so "all events with X >= from_x" is a suffix: moving it is one Fenwick tree update.
+    Coordinates of an event are resolved on demand: base + sum of offsets
+    """
+    __slots__ = ("indexes", "position", "base_x", "base_y", "offset_x", "offset_y")
+
+    def __init__(self, events):
+        self.indexes = [
+            index for index, event in enumerate(events)
+            if isinstance(event, (Insertion, Deletion, Translocation, Duplication))
+        ]
+        self.base_x = [events[index].start_x for index in self.indexes]
+        self.base_y = [events[index].start_y for index in self.indexes]
+        self._build()
+
+    def _build(self):
+        """Sorts events by X (equal ones keep their order)"""
+        order = sorted(range(len(self.indexes)), key=lambda position: self.base_x[position])
+
+        self.indexes = [self.indexes[position] for position in order]
+        self.base_x = [self.base_x[position] for position in order]
+        self.base_y = [self.base_y[position] for position in order]
+        self.position = {index: position for position, index in enumerate(self.indexes)}
+
+        self.offset_x = FenwickTree(len(self.indexes))
+        self.offset_y = FenwickTree(len(self.indexes))
+
+    def _sortWindow(self, start, end):
+        """Sorts events at positions [start, end) by current X (equal ones keep their order), offsets stay at their positions"""
+        window = sorted(
+            ((self._x(position), self._y(position), self.indexes[position]) for position in range(start, end)),
+            key=lambda event: event[0]
+        )
+        for position, (x, y, index) in enumerate(window, start):
+            self.base_x[position] = x - self.offset_x.get(position)
+            self.base_y[position] = y - self.offset_y.get(position)
+            self.indexes[position] = index
+            self.position[index] = position
+
+    def _x(self, position):
+        return self.base_x[position] + self.offset_x.get(position)
+
+    def _y(self, position):
+        return self.base_y[position] + self.offset_y.get(position)
+
+    def _firstPosition(self, from_x):
+        """Binary search of the first event with X >= from_x"""
+        low, high = 0, len(self.indexes)
+        while low < high:
+            middle = (low + high) // 2
+            if self._x(middle) >= from_x:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def coords(self, index):
+        """Returns current (start_x, start_y) of events[index]"""
+        position = self.position[index]
+        return self._x(position), self._y(position)
+
+    def moveX(self, from_x, dx):
+        """
+        Moves events with X >= from_x by dx.
+        If dx < 0, moved events can get before events with X in [from_x + dx, from_x). Only events with X in
+        [from_x + dx, from_x - dx) can change their order, so only they are sorted again: O(w log n) for w such events
+        """
+        position = self._firstPosition(from_x)
+        if dx < 0:
+            start, end = self._firstPosition(from_x + dx), self._firstPosition(from_x - dx)
+
+        self.offset_x.add(position, dx)
+
+        if dx < 0 and start < position < end:
+            self._sortWindow(start, end)
+
+    def moveY(self, from_x, dy):
+        """Moves events with X >= from_x by dy"""
+        self.offset_y.add(self._firstPosition(from_x), dy)
@@ -0,0 +1,123 @@
+from json import dumps as json_dumps, loads as json_loads
+
+
+# Events in machine-readable formats. Every event is a record (dict):
+#   index - number of the action in the history, type - "Rotation", "Insertion", "Deletion", "Duplication" or "Translocation",
+#   query, ref - genome names (first word of the title), size - length of the event,
+#   query_start, query_end - 1-based closed interval of the event on the query (X, as SAM POS),
+#   ref_start, ref_end - the same on the ref (Y, None for Rotation)
+# Insertion has query_start = query_end = the base after which it is inserted, Deletion has ref_start = ref_end = the same on the ref.
+# The query is circular: an event across its end is two records with the same index, up to the end and from position 1
+# Records are written as they come, so events of any number of analyses can go to the same files
+#
+# BED is 0-based half-open (chromStart = query_start - 1), an Insertion is an empty interval after its base.
+# Strand is "-" for Rotation (inverted part of the query) and "." for other events, which have no strand.
+# VCF uses symbolic ALT alleles. TRA is not one of the standard ones (VCF 4.2 describes translocations as pairs of BND records
+# with breakend notation), it is declared in the header and kept as one record, like the other events.
+
+FORMATS = ("jsonl", "bed", "vcf")
+
+VCF_TYPES = {"Rotation": "INV", "Insertion": "INS", "Deletion": "DEL", "Duplication": "DUP", "Translocation": "TRA"}
+
+VCF_HEADER = """##fileformat=VCFv4.2
+##source=BIOCAD_BWA sam_analyze
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant on the query">
+##INFO=<ID=SVLEN,Number=1,Type=Integer,Description="Difference in length between REF and ALT alleles">
+##INFO=<ID=REFNAME,Number=1,Type=String,Description="Name of the ref genome">
+##INFO=<ID=REFSTART,Number=1,Type=Integer,Description="Start of the event on the ref genome">
+##INFO=<ID=REFEND,Number=1,Type=Integer,Description="End of the event on the ref genome">
+##ALT=<ID=INV,Description="Inversion">
+##ALT=<ID=INS,Description="Insertion">
+##ALT=<ID=DEL,Description="Deletion">
+##ALT=<ID=DUP,Description="Duplication">
+##ALT=<ID=TRA,Description="Translocation (not a standard symbolic allele)">
+"""
+
+
+def shortName(title):
+    """First word of FASTA title (sequence name as in ".fai" index)"""
+    words = title.split(None, 1)
+    return words[0] if words else title
+
+
+class EventWriter:
+    """Writes records to <path_prefix>.jsonl, .bed and .vcf (formats). contigs - [(name, length)] for VCF header"""
+
+    def __init__(self, path_prefix, formats=FORMATS, contigs=()):
+        self.files = {file_format: open("{}.{}".format(path_prefix, file_format), 'w', encoding="utf-8") for file_format in formats}
+        self.count = 0
+
+        if "vcf" in self.files:
+            self.files["vcf"].write(VCF_HEADER)
+            for name, length in contigs:
+                self.files["vcf"].write("##contig=<ID={},length={}>\n".format(name, length))
+            self.files["vcf"].write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+    def write(self, record):
+        self.count += 1
+
+        if "jsonl" in self.files:
+            self.files["jsonl"].write(json_dumps(record, separators=(',', ':')) + "\n")
+
+        if "bed" in self.files:
+            # BED6: chrom, start, end, name, score, strand
+            if record["type"] == "Insertion":
+                start = end = record["query_start"]
+            else:
+                start, end = record["query_start"] - 1, record["query_end"]
+
+            self.files["bed"].write("{}\t{}\t{}\t{}\t0\t{}\n".format(
+                record["query"], start, end, record["type"], "-" if record["type"] == "Rotation" else "."
+            ))
+
+        if "vcf" in self.files:
+            self.files["vcf"].write(self._vcfLine(record))
+
+    def writeAll(self, records):
+        for record in records:
+            self.write(record)
+
+    def _vcfLine(self, record):
+        svtype = VCF_TYPES[record["type"]]
+
+        # POS is the base before the event (padding base), END is the last base of it.
+        # Insertion is after query_start already; an event at the first base has POS 1 (padding base after it, as in VCF 4.2)
+        if svtype == "INS":
+            position = end = record["query_start"]
+        else:
+            position, end = max(record["query_start"] - 1, 1), record["query_end"]
+
+        svlen = -record["size"] if svtype == "DEL" else record["size"]
+
+        info = "SVTYPE={};END={};SVLEN={};REFNAME={}".format(svtype, end, svlen, record["ref"])
+        if record["ref_start"] is not None:
+            info += ";REFSTART={};REFEND={}".format(record["ref_start"], record["ref_end"])
+
+        return "{}\t{}\t{}_{}\tN\t<{}>\t.\tPASS\t{}\n".format(record["query"], position, svtype, self.count, svtype, info)
+
+
+def readEvents(jsonl_path):
+    """Yields records of events.jsonl"""
+    with open(jsonl_path, 'r', encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json_loads(line)
+
+
+def aggregateEvents(jsonl_paths, path_prefix, formats=FORMATS):
+    """Writes events of many analyses (their events.jsonl) to one set of files, reading one record at a time"""
+    with EventWriter(path_prefix, formats) as writer:
+        for jsonl_path in jsonl_paths:
+            writer.writeAll(readEvents(jsonl_path))
+        return writer.count
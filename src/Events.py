@@ -1,5 +1,7 @@
 # --------------------------------------------------------------------------------> Rotation
 class Rotation:
+    __slots__ = ("type", "start_line", "end_line", "rotation_center")
+
     def __init__(self, start_line, end_line, rotation_center=None):
         self.type = "Rotation"
         self.start_line = start_line
@@ -14,6 +16,8 @@ class Rotation:
 
 # --------------------------------------------------------------------------------> Deletion
 class Deletion:
+    __slots__ = ("type", "start_x", "start_y", "length")
+
     def __init__(self, start_x, start_y, length):
         self.type = "Deletion"
         self.start_x = start_x
@@ -32,6 +36,8 @@ class Deletion:
 
 # --------------------------------------------------------------------------------> Insertion
 class Insertion:
+    __slots__ = ("type", "start_x", "start_y", "height")
+
     def __init__(self, start_x, start_y, height):
         self.type = "Insertion"
         self.start_x = start_x
@@ -50,6 +56,8 @@ class Insertion:
 
 # --------------------------------------------------------------------------------> Translocation
 class Translocation:
+    __slots__ = ("type", "start_x", "start_y", "height")
+
     def __init__(self, start_x, start_y, height):
         self.type = "Translocation"
         self.start_x = start_x
@@ -68,6 +76,8 @@ class Translocation:
 
 # --------------------------------------------------------------------------------> Duplication
 class Duplication:
+    __slots__ = ("type", "start_x", "start_y", "length", "height", "line_index")
+
     def __init__(self, start_x, start_y, length, height, line_index):
         self.type = "Duplication"
         self.start_x = start_x
@@ -88,5 +98,7 @@ class Duplication:
 
 # --------------------------------------------------------------------------------> Pass (Nothing)
 class Pass:
+    __slots__ = ()
+
     def __init__(self):
         pass
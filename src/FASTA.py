@@ -0,0 +1,125 @@
+from collections import namedtuple
+from mmap import mmap, ACCESS_READ
+import os
+
+
+# Same columns as in samtools ".fai" files
+FastaRecord = namedtuple("FastaRecord", ["name", "length", "offset", "line_bases", "line_width"])
+
+
+def indexPath(fasta_path):
+    return fasta_path + ".fai"
+
+
+def _openMmap(fasta_path):
+    with open(fasta_path, 'rb') as file:
+        return mmap(file.fileno(), 0, access=ACCESS_READ)
+
+
+def buildIndex(fasta_path):
+    """
+    Scans FASTA file line by line and returns a list of FastaRecord (one per sequence).
+    Random access needs all lines (except the last one) to have the same width, other records get line_bases = line_width = 0
+    """
+    records = []
+
+    with _openMmap(fasta_path) as data:
+        size = len(data)
+        header_start = data.find(b'>')
+        while header_start != -1:
+            header_end = data.find(b'\n', header_start)
+            if header_end == -1:
+                header_end = size
+
+            name = data[header_start + 1:header_end].split(None, 1)[0].decode("utf-8")
+            sequence_start = line_start = min(header_end + 1, size)
+
+            length = line_bases = line_width = 0
+            regular, last_line = True, False
+
+            while line_start < size and data[line_start:line_start + 1] != b'>':
+                line_end = data.find(b'\n', line_start)
+                next_line = size if line_end == -1 else line_end + 1
+
+                bases = (size if line_end == -1 else line_end) - line_start
+                if bases and data[line_start + bases - 1:line_start + bases] == b'\r':
+                    bases -= 1
+
+                if bases:
+                    if last_line or bases > line_bases > 0:
+                        regular = False
+                    elif not line_bases:
+                        line_bases, line_width = bases, next_line - line_start
+                    elif bases != line_bases or next_line - line_start != line_width:
+                        last_line = True
+                    length += bases
+                else:  # Empty lines only at the end
+                    last_line = True
+
+                line_start = next_line
+
+            if not regular:
+                line_bases = line_width = 0
+
+            records.append(FastaRecord(name, length, sequence_start, line_bases, line_width))
+
+            header_start = line_start if line_start < size else -1
+
+    return records
+
+
+def writeIndex(records, index_path):
+    with open(index_path, 'w', encoding="utf-8") as index_file:
+        for record in records:
+            print(*record, sep='\t', file=index_file)
+
+
+def readIndex(fasta_path):
+    """
+    Returns a list of FastaRecord of FASTA file.
+    Reuses "<fasta_path>.fai" if it is up to date, otherwise builds and (if possible) saves it
+    """
+    index_path = indexPath(fasta_path)
+
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(fasta_path):
+        with open(index_path, 'r', encoding="utf-8") as index_file:
+            return [
+                FastaRecord(name, *map(int, values))
+                for name, *values in (line.rstrip('\n').split('\t')[:5] for line in index_file if line.strip())
+            ]
+
+    records = buildIndex(fasta_path)
+
+    # Records with irregular lines have no random access: such ".fai" would not be valid for other tools
+    if all(record.line_bases or not record.length for record in records):
+        try:
+            writeIndex(records, index_path)
+        except OSError:
+            pass
+
+    return records
+
+
+def readTitle(fasta_path, record):
+    """Returns full header line (without '>') of the record"""
+    with _openMmap(fasta_path) as data:
+        header_start = data.rfind(b'>', 0, record.offset)
+        return data[header_start + 1:record.offset].strip().decode("utf-8")
+
+
+def fetch(fasta_path, record, start=0, end=None):
+    """Returns sequence[start:end] (0-based) of the record without loading the whole file"""
+    end = record.length if end is None else min(end, record.length)
+    if start >= end:
+        return ""
+
+    def fileOffset(pos):
+        return record.offset + (pos // record.line_bases) * record.line_width + pos % record.line_bases
+
+    with _openMmap(fasta_path) as data:
+        if record.line_bases == 0:  # Irregular line widths: no random access
+            sequence_end = data.find(b"\n>", record.offset)
+            sequence = data[record.offset:len(data) if sequence_end == -1 else sequence_end]
+            return sequence.replace(b'\n', b'').replace(b'\r', b'').decode("utf-8")[start:end]
+
+        return data[fileOffset(start):fileOffset(end - 1) + 1].decode("utf-8").replace('\n', '').replace('\r', '')
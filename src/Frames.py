@@ -0,0 +1,112 @@
+from multiprocessing import Pool
+from collections import deque
+from itertools import chain
+from os import cpu_count
+from io import BytesIO
+
+from PIL import GifImagePlugin, Image
+import numpy as np
+
+from Plot import Plot, DPI
+
+
+# Frames of the history are independent pictures: (path, dots of every line, extra data limits or None).
+# They are rendered by headless plots, one per process
+
+FRAMES_PER_PROCESS = 2  # Frames waiting for every renderer (every frame holds its dots)
+
+GIF_SCALE = 0.3       # GIF frames are rendered at DPI * GIF_SCALE
+GIF_DURATION = 500    # ms per frame
+
+_plot: Plot = None
+_dotsize = None
+_save_png = True
+_gif = False
+
+
+def _initRenderer(plot_args, dotsize, save_png, gif):
+    global _plot, _dotsize, _save_png, _gif
+    _plot = Plot(*plot_args, headless=True)
+    _dotsize = dotsize
+    _save_png = save_png
+    _gif = gif
+
+
+def _renderFrame(path, frame_dots, data_limits=None):
+    """Saves the frame to path (if PNG frames are saved) and returns it as RGB array of GIF resolution (if GIF is made)"""
+    for dots in frame_dots:
+        _plot.scatter(dots, dotsize=_dotsize, color="#00f")
+
+    if data_limits is not None:
+        _plot.addDataLimits(data_limits)
+
+    _plot.tight()
+
+    if _save_png:
+        _plot.save(path)
+
+    gif_frame = None
+    if _gif:
+        # Raw pixels (as Agg draws them): int(size * dpi) of the figure
+        width, height = (int(size * DPI * GIF_SCALE) for size in _plot.fig.get_size_inches())
+        with BytesIO() as buffer:
+            _plot.save(buffer, dpi=DPI * GIF_SCALE, format="rgba")
+            gif_frame = np.frombuffer(buffer.getvalue(), dtype=np.uint8).reshape(height, width, 4)[:, :, :3].copy()
+
+    _plot.clear()
+    return gif_frame
+
+
+def saveGif(path, images, duration=GIF_DURATION):
+    """
+    Saves images (iterable of PIL images of the same size) as an endless GIF.
+    Every frame is written to the file as it comes (Image.save keeps all frames), all of them share the palette of the first one
+    """
+    images = iter(images)
+    first = next(images, None)
+    if first is None:
+        return
+
+    palette = first.convert("RGB").quantize(colors=256, dither=Image.Dither.NONE)
+
+    with open(path, 'wb') as gif_file:
+        header, _ = GifImagePlugin.getheader(palette.copy(), info={"loop": 0, "duration": duration})
+        gif_file.write(b"".join(header))
+
+        frames = (image.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE) for image in images)
+        for frame in chain((palette,), frames):
+            gif_file.write(b"".join(GifImagePlugin.getdata(frame, duration=duration)))
+
+        gif_file.write(b";")  # Trailer
+
+
+def renderFrames(frames, plot_args, dotsize, processes=None, save_png=True, gif_path=None):
+    """
+    Saves frames (iterable of (path, frame_dots, data_limits)) with Plot(*plot_args) as PNG files (if save_png)
+    and as one GIF (if gif_path is not None) on a process pool (if processes != 1, None - all CPUs).
+    Frames are taken from the iterable only when a renderer is free
+    """
+    processes = processes or cpu_count()
+    renderer_args = (plot_args, dotsize, save_png, gif_path is not None)
+
+    def renderedFrames():
+        if processes == 1:
+            _initRenderer(*renderer_args)
+            for frame in frames:
+                yield _renderFrame(*frame)
+            return
+
+        with Pool(processes, initializer=_initRenderer, initargs=renderer_args) as pool:
+            pending = deque()
+            for frame in frames:
+                if len(pending) >= processes * FRAMES_PER_PROCESS:
+                    yield pending.popleft().get()
+                pending.append(pool.apply_async(_renderFrame, frame))
+
+            while pending:
+                yield pending.popleft().get()
+
+    if gif_path is None:
+        deque(renderedFrames(), maxlen=0)
+    else:
+        saveGif(gif_path, (Image.fromarray(gif_frame) for gif_frame in renderedFrames()))
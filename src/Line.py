@@ -1,5 +1,8 @@
 from typing import List
-from collections import deque
+from collections import deque, defaultdict
+import numpy as np
+
+from utils import distance2, dotsStats, linearApproxStats
 
 
 class Line:
@@ -9,16 +12,20 @@ class Line:
         start_y  {1}
         end_x    {2}
         end_y    {3}
-        dots = [dot1, ..., dotN] {4}
+        dots = [[x1, y1], ..., [xN, yN]] {4} - (N, 2) int64 array
         coords = (start_x, start_y, end_x, end_y)
+        stats = (n, sum x, sum y, sum x^2, sum xy) - least squares statistics of dots,
+                kept up to date by shift and rotateY (and recounted when dots are reassigned)
     """
 
-    def __init__(self, start_x=None, start_y=None, end_x=None, end_y=None, dots=[]):
+    __slots__ = ("start_x", "start_y", "end_x", "end_y", "_dots", "stats")
+
+    def __init__(self, start_x=None, start_y=None, end_x=None, end_y=None, dots=None):
         self.start_x = start_x
         self.start_y = start_y
         self.end_x = end_x
         self.end_y = end_y
-        self.dots = dots
+        self.dots = np.empty((0, 2), dtype=np.int64) if dots is None else dots
 
     def __repr__(self):
         return "Line(start_x={}, start_y={}, end_x={}, end_y={}, dots=[{}])".format(
@@ -64,17 +71,52 @@ class Line:
     def b(self):
         return self.end_y - self.end_x * self.k
 
+    @property
+    def dots(self):
+        return self._dots
+
+    @dots.setter
+    def dots(self, dots):
+        self._dots = np.asarray(dots, dtype=np.int64).reshape(-1, 2)
+        self.stats = dotsStats(self._dots) if len(self._dots) else (0, 0, 0, 0, 0)
+
+    def sortDots(self):
+        """Sorts dots by x, then by y"""
+        self._dots = self._dots[np.lexsort((self._dots[:, 1], self._dots[:, 0]))]
+
+    def linearApprox(self):
+        return linearApproxStats(*self.stats)
+
+    def fit(self):
+        """Sets start_y and end_y on the least squares approximation of dots"""
+        k, b = self.linearApprox()
+        self.start_y = int(k * self.start_x + b)  # TODO: int
+        self.end_y = int(k * self.end_x + b)
+
     def copyCoords(self):
-        return Line(self.start_x, self.start_y, self.end_x, self.end_y, dots=[])
+        return Line(self.start_x, self.start_y, self.end_x, self.end_y)
+
+    def copy(self):
+        line = self.copyCoords()
+        line._dots = self._dots.copy()
+        line.stats = self.stats
+        return line
 
     def shift(self, dx=0, dy=0):
         self.start_x += dx
         self.start_y += dy
         self.end_x += dx
         self.end_y += dy
-        for i in range(len(self.dots)):
-            self.dots[i][0] += dx
-            self.dots[i][1] += dy
+        self._dots += (dx, dy)
+
+        n, sumx, sumy, sumx2, sumxy = self.stats
+        self.stats = (
+            n,
+            sumx + n * dx,
+            sumy + n * dy,
+            sumx2 + 2 * dx * sumx + n * dx * dx,
+            sumxy + dy * sumx + dx * sumy + n * dx * dy
+        )
 
     def rotateY(self, rotation_center, line=True, dots=False):
         if line:
@@ -82,8 +124,11 @@ class Line:
             self.end_y -= (self.end_y - rotation_center) * 2
 
         if dots:
-            for i in range(len(self.dots)):
-                self.dots[i][1] -= (self.dots[i][1] - rotation_center) * 2
+            self._dots[:, 1] = 2 * rotation_center - self._dots[:, 1]
+
+            # y -> 2 * rotation_center - y
+            n, sumx, sumy, sumx2, sumxy = self.stats
+            self.stats = (n, sumx, 2 * rotation_center * n - sumy, sumx2, 2 * rotation_center * sumx - sumxy)
 
 
 def shiftLines(lines, count) -> List[Line]:
@@ -91,3 +136,70 @@ def shiftLines(lines, count) -> List[Line]:
     for _ in range(count):
         result.append(result.popleft())
     return list(result)
+
+
+def finalizeLine(line, dots):
+    line.dots = dots
+    line.sortDots()
+
+    line.start_x, line.start_y = map(int, line.dots[0])
+    line.end_x, line.end_y = map(int, line.dots[-1])
+
+    if len(line.dots) >= 2:
+        line.fit()
+
+
+def buildLines(dots, lines_join_size) -> List[Line]:
+    """
+    Joins dots (sorted by x) into lines: every dot is added to the first created line
+    whose last two dots are not further than lines_join_size, otherwise it starts a new line.
+
+    Sweep along x: only lines whose last dot is within lines_join_size from the current x are active.
+    Active lines are indexed by Y of their last dot (buckets of lines_join_size),
+    lines that fall behind are finalized (sorted and approximated).
+    Dots of active lines are collected in lists and become arrays on finalizing
+    """
+    lines_join_size2 = lines_join_size ** 2
+    bucket_size = max(lines_join_size, 1)
+
+    lines = []
+    buckets = defaultdict(set)  # Y bucket of the last dot -> indexes of active lines
+    line_bucket = {}            # Index of active line -> its Y bucket
+    active_dots = {}            # Index of active line -> its dots
+    history = deque()           # (x, index) of every joined dot, x is non-decreasing
+
+    for x, y in dots:
+        # Retiring lines that can no longer be joined
+        while history and history[0][0] < x - lines_join_size:
+            _, line_index = history.popleft()
+            if line_index in line_bucket and active_dots[line_index][-1][0] < x - lines_join_size:
+                buckets[line_bucket.pop(line_index)].discard(line_index)
+                finalizeLine(lines[line_index], active_dots.pop(line_index))
+
+        best_index = None
+        for bucket in range(int((y - lines_join_size) // bucket_size), int((y + lines_join_size) // bucket_size) + 1):
+            for line_index in buckets.get(bucket, ()):
+                if best_index is not None and line_index > best_index:
+                    continue
+
+                line_dots = active_dots[line_index]
+                if distance2(x, y, *line_dots[-1]) <= lines_join_size2 and \
+                        (len(line_dots) == 1 or distance2(x, y, *line_dots[-2]) <= lines_join_size2):
+                    best_index = line_index
+
+        if best_index is None:
+            best_index = len(lines)
+            lines.append(Line())
+            active_dots[best_index] = [[x, y]]
+        else:
+            active_dots[best_index].append([x, y])
+            buckets[line_bucket[best_index]].discard(best_index)
+
+        line_bucket[best_index] = int(y // bucket_size)
+        buckets[line_bucket[best_index]].add(best_index)
+        history.append((x, best_index))
+
+    for line_index in line_bucket:
+        finalizeLine(lines[line_index], active_dots[line_index])
+
+    return lines
@@ -0,0 +1,434 @@
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from utils import prtNum, distance2, YCoordOnLine
+from Line import Line, buildLines
+from Events import Rotation, Insertion, Deletion, Translocation, Duplication, Pass
+from SAM import readSegments, readReferences, readReads, newContigs
+from Dots import segmentDots
+from Chaining import chainSegments
+from Shifts import countShift, countBestShift
+from FASTA import readIndex, readTitle
+from Transform import PiecewiseTransform
+from EventTable import EventTable
+from EventWriter import shortName
+
+
+# Stages of the analysis, without plotting (nothing here imports matplotlib):
+#   genomes -> segments -> (dots) -> lines -> shift and rotations -> events -> history
+# Genomes of several contigs: segments are split into pairs of contigs, every pair goes through the stages after segments.
+# sam_analyze.analyze puts them together with cache, report and pictures
+# !!! X - query, Y - ref !!!
+
+
+class Genomes(NamedTuple):
+    query_name: str
+    query_length: int
+    ref_name: str
+    ref_length: int
+
+
+class Contig(NamedTuple):
+    name: str    # First word of the title (sequence name in SAM and ".fai" index)
+    title: str
+    length: int
+
+
+class ContigPair(NamedTuple):
+    query: int             # Indexes of contigs (in the lists of readContigs)
+    ref: int
+    segments: np.ndarray
+
+
+class ShiftResult(NamedTuple):
+    lines: List[Line]                # Lines moved by the best shift (with dots)
+    rotated_lines: List[Line]        # The same lines after rotations (with rotated dots)
+    rotation_actions: List[Rotation]
+    d_x: int                         # Query position moved to 0 by the shift: x of the query is (x + d_x - 1) % query_length + 1
+
+
+class Mark(NamedTuple):
+    """Picture of an event on the main plot: "line" (x1, y1, x2, y2) or "poligon" ((x1, y1), (x2, y2), ...)"""
+    kind: str
+    coords: tuple
+    color: str
+
+
+class FoundEvents(NamedTuple):
+    actions: list        # Events between every two neighbouring rotated lines
+    large_actions: list  # Events not smaller than min_event_size, largest first
+    marks: List[Mark]
+
+
+# --------------------------------------------------------------------------------> Stages
+
+
+def readContigs(query_genome_path: Optional[str], ref_genome_path: Optional[str], sam_file_path: str) -> Tuple[List[Contig], List[Contig]]:
+    """Contigs of query and ref genomes: all records of FASTA file or, if genome path is None, sequences of SAM file"""
+    if query_genome_path is None:
+        query_contigs = [Contig(name, name, length) for name, length in readReferences(sam_file_path)]
+    else:
+        query_contigs = [Contig(record.name, readTitle(query_genome_path, record), record.length) for record in readIndex(query_genome_path)]
+
+    if ref_genome_path is None:
+        ref_contigs = [Contig(name, name, length) for name, length in readReads(sam_file_path)]
+    else:
+        ref_contigs = [Contig(record.name, readTitle(ref_genome_path, record), record.length) for record in readIndex(ref_genome_path)]
+
+    return query_contigs, ref_contigs
+
+
+def pairGenomes(query_contig: Contig, ref_contig: Contig) -> Genomes:
+    return Genomes(query_contig.title, query_contig.length, ref_contig.title, ref_contig.length)
+
+
+def parseSegments(sam_file_path: str, settings: dict) -> Tuple[np.ndarray, List[str], List[str]]:
+    """Matched blocks of CIGAR (SAM.SEGMENT_DTYPE) and SAM names of their query_contig and ref_contig indexes"""
+    query_indexes, ref_indexes = contigs = newContigs()
+    segments = readSegments(sam_file_path, settings["min_rid_size"], contigs=contigs)
+    return segments, list(query_indexes), list(ref_indexes)
+
+
+def splitPairs(segments: np.ndarray, query_names: List[str], ref_names: List[str],
+               query_contigs: List[Contig], ref_contigs: List[Contig], settings: dict) -> List[ContigPair]:
+    """
+    Segments of every pair of query and ref contigs, sorted by contigs (SAM indexes of segments are matched with contigs by names).
+    Contigs missing in genome files and pairs with less than line_min_size matched bases (they can not have lines) are skipped
+    """
+    def contigIndexes(names, contigs):
+        indexes = {contig.name: index for index, contig in enumerate(contigs)}
+        return np.array([indexes.get(name, -1) for name in names], dtype=np.int64)
+
+    query_index = contigIndexes(query_names, query_contigs)[segments["query_contig"]]
+    ref_index = contigIndexes(ref_names, ref_contigs)[segments["ref_contig"]]
+
+    known = (query_index >= 0) & (ref_index >= 0)
+    pair_keys = (query_index * len(ref_contigs) + ref_index)[known]
+    segments = segments[known]
+
+    # Segments of one pair keep their order
+    order = np.argsort(pair_keys, kind="stable")
+    keys, starts = np.unique(pair_keys[order], return_index=True)
+
+    pairs = []
+    for key, pair_order in zip(keys.tolist(), np.split(order, starts[1:])):
+        pair_segments = segments[pair_order]
+        if int(pair_segments["length"].sum()) >= settings["line_min_size"]:
+            pairs.append(ContigPair(key // len(ref_contigs), key % len(ref_contigs), pair_segments))
+
+    return pairs
+
+
+def contigOffsets(contigs: List[Contig]) -> np.ndarray:
+    """Starts of contigs laid one after another (and the total length at the end)"""
+    return np.cumsum([0] + [contig.length for contig in contigs], dtype=np.int64)
+
+
+def overviewDots(pairs: List[ContigPair], query_contigs: List[Contig], ref_contigs: List[Contig], settings: dict) -> np.ndarray:
+    """Sampled dots of all pairs on one plane: contigs of every genome are laid one after another (see contigOffsets)"""
+    query_offsets, ref_offsets = contigOffsets(query_contigs), contigOffsets(ref_contigs)
+
+    dots = [
+        segmentDots(pair.segments, ref_contigs[pair.ref].length, settings["dot_skip_rate"]) + (query_offsets[pair.query], ref_offsets[pair.ref])
+        for pair in pairs
+    ]
+    return np.concatenate(dots) if dots else np.empty((0, 2), dtype=np.int64)
+
+
+def makeDots(segments: np.ndarray, genomes: Genomes, settings: dict) -> Optional[np.ndarray]:
+    """Sampled dots of segments for "dots" lines method, None for "chain" (it works with segments directly)"""
+    if settings["lines_method"] != "dots":
+        return None
+    return segmentDots(segments, genomes.ref_length, settings["dot_skip_rate"])
+
+
+def countLines(segments: np.ndarray, dots: Optional[np.ndarray], genomes: Genomes, settings: dict) -> List[Line]:
+    """Lines not shorter than line_min_size, sorted by start"""
+    if settings["lines_method"] == "chain":
+        lines = chainSegments(segments, genomes.ref_length, settings["lines_join_size"], settings["dot_skip_rate"])
+
+    elif settings["lines_method"] == "dots":
+        lines = buildLines(dots.tolist(), settings["lines_join_size"])
+
+    else:
+        raise ValueError("Unknown lines method: {}".format(settings["lines_method"]))
+
+    line_min_size2 = settings["line_min_size"] ** 2
+
+    lines = [line for line in lines if distance2(line.start_x, line.start_y, line.end_x, line.end_y) >= line_min_size2]
+
+    lines.sort(key=lambda line: (line.start_x, line.start_y))
+
+    return lines
+
+
+def countShiftAndRotations(lines: List[Line], genomes: Genomes, settings: dict) -> Tuple[ShiftResult, int, int]:
+    """
+    Returns the result for the best start line (lines are changed), the start line
+    and the number of evaluated rotations (for all start lines and for the end result)
+    """
+    # Every start_line is evaluated on coordinates of lines only (in parallel if settings["processes"] != 1 and there are many lines)
+    start_line, candidates = countBestShift(lines, genomes.query_length, settings)
+    d_x = int(lines[start_line].start_x)  # Lines are moved in place
+
+    print("\n===| Counting end result with start_line = {}...".format(start_line))
+    shifted_lines, rotated_lines, rotation_actions, end_candidates = countShift(lines, start_line, genomes.query_length, apply_changes=True)
+    return ShiftResult(shifted_lines, rotated_lines, rotation_actions, d_x), start_line, candidates + end_candidates
+
+
+def findEvents(rotated_lines: List[Line], settings: dict) -> FoundEvents:
+    actions = []
+    marks = []
+
+    last = rotated_lines[0]
+    for line_index in range(1, len(rotated_lines)):
+        cur = rotated_lines[line_index]
+
+        if cur.start_x >= last.end_x and cur.start_y >= last.end_y:  # top right
+            insertion_length = cur.start_y - last.end_y
+            deletion_length = cur.start_x - last.end_x
+
+            actions.append(Insertion(last.end_x, last.end_y, insertion_length))
+            marks.append(Mark("line", (last.end_x, last.end_y, last.end_x, cur.start_y), "#0f0"))
+
+            actions.append(Deletion(last.end_x, last.end_y, deletion_length))
+            marks.append(Mark("line", (last.end_x, cur.start_y, cur.start_x, cur.start_y), "#f00"))
+
+        elif cur.start_x < last.end_x and cur.start_y >= last.end_y:  # top left
+            tmp_dot_y = YCoordOnLine(*last.coords, cur.start_x)
+            insertion_length = cur.start_y - last.end_y
+            duplication_length = last.end_x - cur.start_x
+            duplication_height = last.end_y - tmp_dot_y
+
+            actions.append(Insertion(cur.start_x, last.end_y, insertion_length))
+            marks.append(Mark("line", (cur.start_x, last.end_y, cur.start_x, cur.start_y), "#0f0"))
+
+            actions.append(Duplication(cur.start_x, tmp_dot_y, duplication_length, duplication_height, line_index - 1))
+            marks.append(Mark("poligon", (
+                (cur.start_x, tmp_dot_y),
+                (cur.start_x, last.end_y),
+                (last.end_x, last.end_y)
+            ), "#f0f"))
+
+        elif cur.start_x >= last.end_x and cur.start_y < last.end_y:  # bottom right
+            deletion_length = cur.start_x - last.end_x
+            translocation_length = last.end_y - cur.start_y
+
+            actions.append(Deletion(last.end_x, last.end_y, deletion_length))
+            marks.append(Mark("line", (last.end_x, last.end_y, cur.start_x, last.end_y), "#f00"))
+
+            actions.append(Translocation(last.end_x, last.end_y, translocation_length))
+            marks.append(Mark("line", (cur.start_x, last.end_y, cur.start_x, cur.start_y), "#0ff"))
+
+        else:
+            # print([cur.start_x, last.end_x], [cur.start_y, last.end_y])
+            print("\nUnknown action!!!\n")
+
+        if cur.end_x >= last.end_x:
+            last = cur
+
+    large_actions = sorted([action for action in actions if action.size >= settings["min_event_size"]], key=lambda action: -action.size)
+
+    return FoundEvents(actions, large_actions, marks)
+
+
+def historyActions(shift: ShiftResult, events: FoundEvents) -> list:
+    """Actions of the history: Pass (the start), rotations, then large events"""
+    return [Pass()] + shift.rotation_actions + events.large_actions
+
+
+def historyText(lines: List[Line], history: list):
+    """Yields a line of history.txt for every action (lines - shifted lines, rotations refer to them)"""
+    for action in history:
+
+        if isinstance(action, Rotation):
+            yield "Rotation from {} (Query) to {} (Query)".format(
+                prtNum(int(lines[action.start_line].start_x)),
+                prtNum(int(lines[action.end_line].end_x))
+            )
+
+        elif isinstance(action, Deletion):
+            yield "Deletion of {}-{} (Query) from {} (Ref)".format(
+                prtNum(int(action.start_x)),
+                prtNum(int(action.start_x + action.length)),
+                prtNum(int(action.start_y))
+            )
+
+        elif isinstance(action, Insertion):
+            yield "Insertion of {}-{} (Ref) to {} (Query)".format(
+                prtNum(int(action.start_y)),
+                prtNum(int(action.start_y + action.height)),
+                prtNum(int(action.start_x))
+            )
+
+        elif isinstance(action, Translocation):
+            yield "Translocation of {}-END (Query) from {} (Ref) to {} (Ref)".format(
+                prtNum(int(action.start_x)),
+                prtNum(int(action.start_y - action.height)),
+                prtNum(int(action.start_y))
+            )
+
+        elif isinstance(action, Duplication):
+            yield "Duplication of {}-{} (Query) {}-{} (Ref)".format(
+                prtNum(int(action.start_x)),
+                prtNum(int(action.start_x + action.length)),
+                prtNum(int(action.start_y)),
+                prtNum(int(action.start_y + action.height))
+            )
+
+
+def eventRecords(lines: List[Line], history: list, genomes: Genomes, d_x: int = 0):
+    """
+    Yields a record (see EventWriter.py) for every action of the history except Pass.
+    Lines end at their last dots. X of history.txt is the offset on the shifted query (see ShiftResult): X + d_x is the 1-based
+    query position of SAM POS (d_x is POS of the start line), Y is the 0-based offset on the ref (position in the read).
+    Records are 1-based closed intervals of the bases of the event on the query (X + d_x, around the query end) and on the ref (Y + 1).
+    The query is circular: an event across its end is split into two records with the same index (see splitAtQueryEnd)
+    """
+    query, ref = shortName(genomes.query_name), shortName(genomes.ref_name)
+
+    for index, action in enumerate(history):
+        # Shifted X (offset from d_x), Y (0-based)
+        if isinstance(action, Rotation):
+            query_start, query_end = int(lines[action.start_line].start_x), int(lines[action.end_line].end_x)
+            ref_start = ref_end = None
+            size = query_end - query_start + 1
+
+        elif isinstance(action, Deletion):
+            # Between the last base before it and the first base after it, on the ref - the base before it
+            query_start, query_end = int(action.start_x) + 1, int(action.start_x + action.length) - 1
+            ref_start = ref_end = int(action.start_y)
+            size = query_end - query_start + 1
+
+        elif isinstance(action, Insertion):
+            # After the query base query_start
+            query_start = query_end = int(action.start_x)
+            ref_start, ref_end = int(action.start_y) + 1, int(action.start_y + action.height) - 1
+            size = ref_end - ref_start + 1
+
+        elif isinstance(action, Translocation):
+            # The rest of the query (as in history.txt)
+            query_start, query_end = int(action.start_x) + 1, genomes.query_length - 1
+            ref_start, ref_end = int(action.start_y - action.height) + 1, int(action.start_y)
+            size = ref_end - ref_start + 1
+
+        elif isinstance(action, Duplication):
+            query_start, query_end = int(action.start_x), int(action.start_x + action.length)
+            ref_start, ref_end = int(action.start_y), int(action.start_y + action.height)
+            size = query_end - query_start + 1
+
+        else:
+            continue
+
+        # To 1-based positions of the query and the ref
+        length = query_end - query_start
+        query_start = (query_start + d_x - 1) % genomes.query_length + 1
+        query_end = query_start + length
+
+        if ref_start is not None:
+            ref_start, ref_end = ref_start + 1, ref_end + 1
+
+        yield from splitAtQueryEnd({
+            "index": index,
+            "type": action.type,
+            "query": query,
+            "ref": ref,
+            "query_start": query_start,
+            "query_end": query_end,
+            "ref_start": ref_start,
+            "ref_end": ref_end,
+            "size": size
+        }, genomes.query_length)
+
+
+def splitAtQueryEnd(record: dict, query_length: int):
+    """
+    Yields the record or, if its query interval goes past query_length, its part up to the query end and the rest from position 1
+    (the rest is cut before query_start: lines of the shifted query can reach further than one turn).
+    Size of Rotation, Deletion and Duplication is the length of the query interval, so every part gets the size of its interval
+    (the ref interval of Duplication is split at the same offset). Insertion and Translocation are measured on the ref:
+    both parts have the whole ref interval and its size
+    """
+    if record["query_end"] <= query_length:
+        yield record
+        return
+
+    head = dict(record, query_end=query_length)
+    tail = dict(record, query_start=1, query_end=min(record["query_end"] - query_length, record["query_start"] - 1))
+
+    if record["type"] in ("Rotation", "Deletion", "Duplication"):
+        head["size"], tail["size"] = query_length - record["query_start"] + 1, tail["query_end"]
+
+    if record["type"] == "Duplication":
+        head["ref_end"] = min(record["ref_start"] + head["size"] - 1, record["ref_end"])
+        tail["ref_start"] = min(head["ref_end"] + 1, record["ref_end"])
+
+    yield head
+    if tail["query_end"] >= 1:
+        yield tail
+
+
+def historyFrames(lines: List[Line], rotated_lines: List[Line], history: list):
+    """
+    Replays the history: yields dots of every line (list of (N, 2) arrays) after every action.
+    Coordinates of events and dots of lines (on rotations) are changed, so the history can be replayed only once
+    """
+    # Dots of rotated lines are not changed, all actions are collected in one transform of them
+    transform = PiecewiseTransform()
+
+    # Coordinates of events change with every previous action, they are kept in the table until their turn
+    event_table = EventTable(history)
+
+    for action_index, action in enumerate(history):
+        if isinstance(action, (Insertion, Deletion, Duplication, Translocation)):
+            action.start_x, action.start_y = event_table.coords(action_index)
+
+        if isinstance(action, Rotation):
+            for line_index in range(action.start_line, action.end_line + 1):
+                lines[line_index].rotateY(action.rotation_center, line=False, dots=True)
+
+        elif isinstance(action, Insertion):
+            transform.move(action.start_x + 1, dy=-round(action.height))  # X > start_x
+            transform.drop(action.start_x, action.start_x)
+
+            event_table.moveY(action.start_x, -action.height)
+
+        elif isinstance(action, Deletion):
+            transform.move(action.start_x + action.length, dx=-round(action.length))
+
+            event_table.moveX(action.start_x + action.length, -action.length)
+
+        elif isinstance(action, Duplication):
+            transform.drop(action.start_x, action.start_x + action.length, action.line_index)
+            transform.move(action.start_x, dy=-round(action.height))
+
+            event_table.moveY(action.start_x, -action.height)
+
+        elif isinstance(action, Translocation):
+            transform.move(action.start_x + 1, dy=round(action.height))  # X > start_x
+            transform.drop(action.start_x, action.start_x)
+
+            event_table.moveY(action.start_x, action.height)
+
+        elif isinstance(action, Pass):
+            pass
+
+        else:
+            raise ValueError("History: Unknown action type")
+
+        if isinstance(action, (Pass, Rotation)):
+            # Dots of lines are rotated in place by the next rotations
+            frame_dots = [line.dots.copy() for line in lines]
+        else:
+            frame_dots = [transform.apply(line.dots, line_index) for line_index, line in enumerate(rotated_lines)]
+
+            # Adjusting axes (bottom):
+            bottom = min((int(dots[:, 1].min()) for dots in frame_dots if len(dots)), default=0)
+
+            transform.shiftY(-bottom)
+            for dots in frame_dots:
+                dots[:, 1] -= bottom
+
+            event_table.moveY(action.start_x, bottom)
+
+        yield frame_dots
@@ -1,12 +1,33 @@
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.artist import Artist
+from matplotlib.colors import to_rgb
+from matplotlib.figure import Figure
 from matplotlib.lines import Line2D
 from matplotlib.patches import Polygon
 # from matplotlib.patches import ConnectionStyle
 
 
+DPI = 400
+DENSITY_MIN_ALPHA = 0.3  # Opacity of a density pixel with one dot, the densest pixel of a color is opaque (log scale between them)
+
+
 class Plot:
-    def __init__(self, title, fontsize, grid_size=None, figsize=None, nameX=None, nameY=None):
-        self.fig = plt.figure(title, figsize, tight_layout=True)
+    def __init__(self, title, fontsize, grid_size=None, figsize=None, nameX=None, nameY=None, density=False, headless=False):
+        # Density plot: dots are not markers, they are binned into one image (of the axes resolution) when it is drawn
+        self.density = density
+        self.density_dots = []
+        self.density_bins = None  # (view limits, width, height, [(pixels with dots, their dot counts, color)])
+        self.density_image = None
+
+        # Headless plot is not registered in pyplot and is drawn by Agg (can be used in worker processes)
+        self.headless = headless
+        if headless:
+            self.fig = Figure(figsize, tight_layout=True)
+            FigureCanvasAgg(self.fig)
+        else:
+            self.fig = plt.figure(title, figsize, tight_layout=True)
         self.ax = self.fig.add_subplot()
 
         self.legend = None
@@ -41,7 +62,16 @@ class Plot:
         self.close()
 
     def scatter(self, dots, dotsize=None, *args, **kwargs):
-        self.ax.scatter(*zip(*dots), s=dotsize, *args, **kwargs)
+        dots = np.asarray(dots).reshape(-1, 2)
+
+        if self.density:
+            if len(dots):
+                self.density_dots.append((dots, kwargs.get("color", "#00f")))
+                self.density_bins = None
+                self.ax.update_datalim((dots.min(axis=0), dots.max(axis=0)))
+            return
+
+        self.ax.scatter(dots[:, 0], dots[:, 1], s=dotsize, *args, **kwargs)
         # self.ax.plot(*zip(*dots), color='none')  # Walkaround for relim() to work
 
     def line(self, x1, y1, x2, y2, color="#000", *args, **kwargs):
@@ -67,16 +97,36 @@ class Plot:
     def vline(self, x, *args, **kwargs):
         self.ax.axvline(x=x, *args, **kwargs)
 
+    def dataLimits(self):
+        """Corners of all data plotted since the last tight()"""
+        return self.ax.dataLim.get_points()
+
+    def addDataLimits(self, points):
+        self.ax.update_datalim(points)
+
     def tight(self):
         self.ax.ignore_existing_data_limits = True
         # self.ax.update_datalim(self.scatter.get_datalim(self.ax.transData))
         # self.ax.relim()
         self.ax.autoscale_view()
 
-    def save(self, path, *args, **kwargs):
-        self.fig.savefig(path, dpi=400, *args, **kwargs)
+    def drawDensity(self):
+        """Adds the density image of dots (it is made when the figure is drawn, see DensityImage)"""
+        if self.density_image is None and self.density_dots:
+            self.density_image = DensityImage(self)
+            self.ax.add_artist(self.density_image)
+
+    def save(self, path, dpi=DPI, *args, **kwargs):
+        self.drawDensity()
+        self.fig.savefig(path, dpi=dpi, *args, **kwargs)
 
     def clear(self):
+        self.density_dots = []
+        self.density_bins = None
+        if self.density_image is not None:
+            self.density_image.remove()
+            self.density_image = None
+
         for artist in self.ax.lines + self.ax.collections + self.ax.patches:
             artist.remove()
 
@@ -84,7 +134,105 @@ class Plot:
             self.legend.remove()
 
     def show(self):
+        self.drawDensity()
         plt.show()
 
     def close(self):
-        plt.close(self.fig)
+        if not self.headless:
+            plt.close(self.fig)
+
+
+class DensityImage(Artist):
+    """
+    Dots of a density plot binned into pixels of the axes as they are drawn (so the image has the resolution of the output).
+    Pixels with dots get their color, opacity grows with the number of dots (log scale), later colors are drawn over earlier ones.
+    Dot counts are kept until dots or view limits change: an image of lower resolution (GIF after PNG) merges their pixels
+    """
+
+    def __init__(self, plot):
+        super().__init__()
+        self.plot = plot
+        self.set_zorder(1)  # As scatter
+
+    def bins(self, width, height):
+        """Dots of every color counted in pixels of width x height image over the view limits: [(sorted pixels, uint32 counts, color)]"""
+        limits = (self.axes.get_xlim(), self.axes.get_ylim())
+        cached = self.plot.density_bins
+        if cached is not None and cached[0] == limits and cached[1] >= width and cached[2] >= height:
+            if cached[1:3] == (width, height):
+                return cached[3]
+            return [self.mergeBins(pixels, counts, cached[1], cached[2], width, height) + (color,) for pixels, counts, color in cached[3]]
+
+        (x_min, x_max), (y_min, y_max) = limits
+        bins = []
+        for dots, color in self.plot.density_dots:
+            columns = np.floor((dots[:, 0] - x_min) * (width / (x_max - x_min))).astype(np.int64)
+            rows = np.floor((dots[:, 1] - y_min) * (height / (y_max - y_min))).astype(np.int64)
+            inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+
+            pixels, counts = np.unique(rows[inside] * width + columns[inside], return_counts=True)
+            bins.append((pixels, counts.astype(np.uint32), color))
+
+        self.plot.density_bins = (limits, width, height, bins)
+        return bins
+
+    @staticmethod
+    def mergeBins(pixels, counts, bins_width, bins_height, width, height):
+        """Bins of a finer image moved to pixels of width x height image, counts of the same pixel are added up"""
+        if not len(pixels):
+            return pixels, counts
+
+        pixels = pixels // bins_width * height // bins_height * width + pixels % bins_width * width // bins_width
+        order = np.argsort(pixels, kind="stable")
+        pixels = pixels[order]
+        starts = np.flatnonzero(np.diff(pixels, prepend=-1))
+        return pixels[starts], np.add.reduceat(counts[order], starts)
+
+    def image(self, width, height):
+        """uint8 RGBA image (rows from the bottom, as renderers take images)"""
+        image = np.zeros((height, width, 4), dtype=np.uint8)
+        image_pixels = image.reshape(-1, 4)
+
+        for pixels, counts, color in self.bins(width, height):
+            if not len(pixels):
+                continue
+
+            # Opacity levels 0..255 of pixels, RGBA of a level is looked up
+            top = np.log(counts.max())
+            if top:
+                levels = DENSITY_MIN_ALPHA + (1 - DENSITY_MIN_ALPHA) / top * np.log(counts, dtype=np.float32)
+            else:
+                levels = np.ones(len(counts), dtype=np.float32)
+
+            lookup = np.empty((256, 4), dtype=np.uint8)
+            lookup[:, :3] = np.rint(np.array(to_rgb(color)) * 255)
+            lookup[:, 3] = np.arange(256)
+            colors = lookup[np.rint(levels * 255).astype(np.uint8)]
+
+            # Over pixels of earlier colors: (color * alpha + under * under_alpha * (1 - alpha)) / out_alpha
+            under = image_pixels[pixels].astype(np.uint32)
+            covered = np.flatnonzero(under[:, 3])
+            if len(covered):
+                alpha = colors[covered, 3:].astype(np.uint32)
+                under_alpha = under[covered, 3:] * (255 - alpha) // 255
+                out_alpha = alpha + under_alpha
+                colors[covered, :3] = (colors[covered, :3] * alpha + under[covered, :3] * under_alpha) // out_alpha
+                colors[covered, 3:] = out_alpha
+
+            image_pixels[pixels] = colors
+
+        return image
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+
+        x0, y0, x1, y1 = (int(round(value)) for value in self.axes.bbox.extents)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(self.axes.bbox)
+        renderer.draw_image(gc, x0, y0, self.image(x1 - x0, y1 - y0))
+        gc.restore()
+        self.stale = False
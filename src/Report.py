@@ -0,0 +1,115 @@
+from json import dump as json_dump
+from time import perf_counter
+import cProfile
+import tracemalloc
+import sys
+import os
+
+try:
+    import resource  # Peak RSS (not available on Windows)
+except ImportError:
+    resource = None
+
+
+# Report of analyze: wall time, CPU time (with finished child processes), peak RSS and item counts of every stage.
+# Stages go one after another: starting a stage finishes the previous one.
+# Peak RSS is kept by the OS for the whole process, so a stage has:
+#   cumulative_peak_rss, cumulative_peak_rss_children - peaks since the start of the process at the end of the stage,
+#   peak_rss_increase - by how much the stage raised the peak of the process (0 if it stayed below an earlier peak).
+# Optional: peak of Python allocations of the stage (tracemalloc, slows allocations down) and cProfile dump of every stage
+
+
+def peakRSS():
+    """Peak RSS (MB) of the process and of the largest finished child process: (self, children)"""
+    if resource is None:
+        return None, None
+
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is in bytes on macOS, in KB on Linux
+    return tuple(resource.getrusage(who).ru_maxrss / scale for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def cpuTime():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Report:
+    def __init__(self, path, profile_folder=None, trace_memory=False):
+        self.path = path
+        self.profile_folder = profile_folder
+        self.trace_memory = trace_memory
+
+        self.stages = []
+        self.current = None
+        self._start = None
+        self._profiler = None
+
+        # Dumps of the previous run are removed: set of stages depends on settings and cache
+        if profile_folder is not None and os.path.isdir(profile_folder):
+            for filename in os.listdir(profile_folder):
+                if filename.endswith(".prof"):
+                    os.remove(os.path.join(profile_folder, filename))
+
+        # Tracing is stopped on saving only if it is started here
+        self._tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+    def stage(self, name):
+        """Finishes the current stage and starts the next one"""
+        self.finishStage()
+
+        self.current = {"stage": name, "counts": {}}
+        self.stages.append(self.current)
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        if self.profile_folder is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._start = (perf_counter(), cpuTime(), peakRSS()[0])
+
+    def count(self, **counts):
+        """Item counts (and other values) of the current stage"""
+        self.current["counts"].update(counts)
+
+    def finishStage(self):
+        if self.current is None:
+            return
+
+        wall_time, cpu_time = perf_counter() - self._start[0], cpuTime() - self._start[1]
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            os.makedirs(self.profile_folder, exist_ok=True)
+            self._profiler.dump_stats(os.path.join(self.profile_folder, "{:02}_{}.prof".format(len(self.stages) - 1, self.current["stage"])))
+            self._profiler = None
+
+        self.current["wall_time"] = round(wall_time, 6)
+        self.current["cpu_time"] = round(cpu_time, 6)
+        self.current["cumulative_peak_rss"], self.current["cumulative_peak_rss_children"] = peakRSS()
+        if self._start[2] is not None:
+            self.current["peak_rss_increase"] = self.current["cumulative_peak_rss"] - self._start[2]
+
+        if self.trace_memory:
+            self.current["peak_traced"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+        self.current = None
+
+    def save(self, **extra):
+        """Finishes the current stage and writes the report (JSON), extra - other values of the whole run"""
+        self.finishStage()
+
+        if self._tracing:
+            tracemalloc.stop()
+
+        with open(self.path, 'w', encoding="utf-8") as report_file:
+            json_dump({
+                "wall_time": round(sum(stage["wall_time"] for stage in self.stages), 6),
+                "cpu_time": round(sum(stage["cpu_time"] for stage in self.stages), 6),
+                "units": {"time": "s", "memory": "MB"},
+                "stages": self.stages,
+                **extra
+            }, report_file, indent=4)
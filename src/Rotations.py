@@ -0,0 +1,203 @@
+from typing import List, Tuple
+import numpy as np
+
+from Line import Line
+from Events import Rotation
+
+
+# Metric of lines ("Second option" of countMetric):
+#   sum of (start_y - start_x)^2 + (end_y - end_x)^2 - squared distance to the main diagonal.
+#
+# Rotation of lines[s..e] around rotation_center c maps y -> 2c - y, so a rotated line contributes
+#   (2c - (start_y + start_x))^2 + (2c - (end_y + end_x))^2 = 8c^2 - 4c * A + B,
+#   where A = u + v, B = u^2 + v^2, u = start_y + start_x, v = end_y + end_x.
+# With prefix sums of A, B and of current contributions the metric of every candidate costs O(1)
+
+
+def _prefixSums(values):
+    return np.concatenate((np.zeros(1, dtype=values.dtype), np.cumsum(values)))
+
+
+def _rangeExtremes(values, s, e):
+    """Min and max of values[s..e] for every pair of indexes s <= e: sparse tables of ranges of 2^k values, O(n log n) to build"""
+    minimums, maximums = [values], [values]
+    length = 1
+    while 2 * length <= len(values):
+        minimums.append(np.minimum(minimums[-1][:-length], minimums[-1][length:]))
+        maximums.append(np.maximum(maximums[-1][:-length], maximums[-1][length:]))
+        length *= 2
+
+    # Two ranges of 2^k values cover [s, e]
+    level = np.log2(e - s + 1).astype(np.int64)
+    other = e - (1 << level) + 1
+    range_min, range_max = np.empty(len(s), dtype=values.dtype), np.empty(len(s), dtype=values.dtype)
+    for k in np.unique(level):
+        selected = level == k
+        range_min[selected] = np.minimum(minimums[k][s[selected]], minimums[k][other[selected]])
+        range_max[selected] = np.maximum(maximums[k][s[selected]], maximums[k][other[selected]])
+    return range_min, range_max
+
+
+def _outsideOverlaps(centers, s, e, range_min, range_max):
+    """
+    bad[i] = there is a line outside [s[i], e[i]] with range_min[i] < center < range_max[i]
+    Lines strictly inside the range are counted by sorted centers, rotated ones among them are all rotated lines
+    except those equal to range_min or range_max (counted by sorted (center, index) keys). Both with searchsorted
+    """
+    n = len(centers)
+    sorted_centers = np.sort(centers)
+    inside_range = np.searchsorted(sorted_centers, range_max, side="left") - np.searchsorted(sorted_centers, range_min, side="right")
+
+    values, center_ranks = np.unique(centers, return_inverse=True)
+    keys = np.sort(center_ranks * n + np.arange(n))
+
+    def countEqual(value):
+        """Rotated lines with center equal to value (one of the centers)"""
+        key = np.searchsorted(values, value) * n
+        return np.searchsorted(keys, key + e, side="right") - np.searchsorted(keys, key + s, side="left")
+
+    rotated_inside = np.where(range_min < range_max, e - s + 1 - countEqual(range_min) - countEqual(range_max), 0)
+    return inside_range > rotated_inside
+
+
+def bestRotation(lines):
+    """
+    Evaluates all rotations (start_line, end_line), start_line <= end_line, without changing lines.
+    Returns ((metric, start_line, end_line) of the best allowed rotation (the first one on equal metrics) or None,
+    number of evaluated rotations).
+
+    Not allowed rotations:
+        WORKAROUND #1: centers of lines outside the rotation lie strictly between the min and max centers of rotated lines
+        WORKAROUND #2: the first or the last rotated line is already tilted correctly
+    """
+    n = len(lines)
+    if n == 0:
+        return None, 0
+
+    coords = [line.coords for line in lines]
+
+    # int64 is exact while the largest term fits, otherwise Python integers are used
+    max_coord = max(abs(int(value)) for line_coords in coords for value in line_coords)
+    dtype = np.int64 if 64 * (2 * max_coord + 1) ** 2 * n < 2 ** 62 else object
+
+    start_x, start_y, end_x, end_y = (np.array([int(value) for value in values], dtype=dtype) for values in zip(*coords))
+
+    contribution = (start_y - start_x) ** 2 + (end_y - end_x) ** 2
+    u, v = start_y + start_x, end_y + end_x
+
+    prefix_contribution = _prefixSums(contribution)
+    prefix_a = _prefixSums(u + v)
+    prefix_b = _prefixSums(u * u + v * v)
+
+    s, e = np.triu_indices(n)  # Row-major: the same order as candidates were always checked
+
+    ys = np.stack((start_y[s], end_y[s], start_y[e], end_y[e]))
+    rotation_center = (ys.min(axis=0) + ys.max(axis=0)) // 2
+    count = e - s + 1
+
+    metric = prefix_contribution[-1] - (prefix_contribution[e + 1] - prefix_contribution[s]) + \
+        8 * rotation_center * rotation_center * count - \
+        4 * rotation_center * (prefix_a[e + 1] - prefix_a[s]) + \
+        (prefix_b[e + 1] - prefix_b[s])
+
+    # WORKAROUND #1
+    centers = np.array([line.center_y for line in lines], dtype=np.int64)
+    allowed = ~_outsideOverlaps(centers, s, e, *_rangeExtremes(centers, s, e))
+
+    # WORKAROUND #2
+    tilted_correctly = (start_y <= end_y).astype(bool)
+    allowed &= ~(tilted_correctly[s] | tilted_correctly[e])
+
+    if not allowed.any():
+        return None, len(s)
+
+    candidates = np.flatnonzero(allowed)
+    best = candidates[np.argmin(metric[candidates])]
+    return (int(metric[best]), int(s[best]), int(e[best])), len(s)
+
+
+def countMetric(lines) -> int:
+    result = 0
+
+    # First option:
+    # k, b = linearApproxLines(lines)
+    # main_line = Line(0, b, query_genome_length, query_genome_length * k + b)
+
+    # Second option:
+    # main_line = Line(0, 0, query_genome_length, query_genome_length) -> Second "for" option
+
+    # Third option: TODO - approx with k: 1, b: search
+
+    # Fourth option: TODO - approx with k: search, b: 0
+
+    # First "for" option:
+    # for line in lines:
+    #     result += int((line.start_y - YCoordOnLine(*main_line.coords, line.start_x)) ** 2)
+    #     result += int((line.end_y - YCoordOnLine(*main_line.coords, line.end_x)) ** 2)
+
+    # Second "for" option (bestRotation counts the same metric):
+    for line in lines:
+        result += int((line.start_y - line.start_x) ** 2) + int((line.end_y - line.end_x) ** 2)
+
+    return result
+
+
+def countMetricWithRotation(lines, rotation, apply_rotation=False) -> int:
+    rotation_center = (
+        min(
+            lines[rotation.start_line].start_y, lines[rotation.start_line].end_y,
+            lines[rotation.end_line].start_y, lines[rotation.end_line].end_y
+        ) + max(
+            lines[rotation.start_line].start_y, lines[rotation.start_line].end_y,
+            lines[rotation.end_line].start_y, lines[rotation.end_line].end_y
+        )
+    ) // 2
+
+    for line_index in range(rotation.start_line, rotation.end_line + 1):
+        lines[line_index].rotateY(rotation_center)
+
+    result = countMetric(lines)
+
+    if not apply_rotation:
+        for line_index in range(rotation.start_line, rotation.end_line + 1):
+            lines[line_index].rotateY(rotation_center)
+
+    if apply_rotation:
+        rotation.rotation_center = rotation_center
+        for line_index in range(rotation.start_line, rotation.end_line + 1):
+            lines[line_index].rotateY(rotation_center, line=False, dots=True)
+
+    return result
+
+
+def countBestRotations(rotated_lines, verbose=True) -> Tuple[int, List[Line], List[Rotation], int]:
+    """
+    Greedily applies the best rotation while it decreases the metric.
+    Returns (metric, rotated lines, rotation actions, number of evaluated rotations)
+    """
+    cur_metric_value = countMetric(rotated_lines)
+    rotation_actions = []
+    candidates = 0
+
+    while True:
+        # All possible rotations are evaluated at once, lines are not changed
+        best_rotation, evaluated = bestRotation(rotated_lines)
+        candidates += evaluated
+
+        if best_rotation is None or best_rotation[0] >= cur_metric_value:
+            break
+
+        _, start_line, end_line = best_rotation
+        rotation = Rotation(start_line, end_line)
+
+        if verbose:
+            print("\n{} -> {}".format(rotation, cur_metric_value))
+
+        cur_metric_value = countMetricWithRotation(rotated_lines, rotation, apply_rotation=True)
+
+        rotation_actions.append(rotation)
+
+    if verbose:
+        print("\nRotation actions:", *rotation_actions, sep='\n')
+
+    return cur_metric_value, rotated_lines, rotation_actions, candidates
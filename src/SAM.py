@@ -0,0 +1,447 @@
+from contextlib import closing
+from struct import unpack_from
+import numpy as np
+
+from BGZF import isGzip, peek, readChunks
+
+
+# !!! X - query, Y - ref !!!
+# In SAM terms "query" is the reference sequence (RNAME, POS) and "ref" is the aligned read (SEQ)
+
+# query_contig - index of RNAME in the header (@SQ order, BAM refID), ref_contig - index of QNAME in order of first appearance
+SEGMENT_DTYPE = np.dtype([
+    ("query_pos", np.int64),
+    ("ref_pos", np.int64),
+    ("length", np.int64),
+    ("reverse", np.bool_),
+    ("query_contig", np.int32),
+    ("ref_contig", np.int32)
+])
+
+# CIGAR operations in BAM order: code = CIGAR_OPS.index(char)
+CIGAR_OPS = b"MIDNSHP=X"
+
+CIGAR_MATCH = np.array([True, False, False, False, False, False, False, True, True])
+CIGAR_CONSUMES_QUERY = np.array([True, False, True, True, False, False, False, True, True])
+CIGAR_CONSUMES_REF = np.array([True, True, False, False, True, True, False, True, True])
+
+FLAG_UNMAPPED = 0x4  # CIGAR_FLAGS[2]
+FLAG_REVERSE = 0x10  # CIGAR_FLAGS[4]
+
+CHUNK_SIZE = 1 << 26  # bytes per chunk of SAM lines
+
+BAM_MAGIC = b"BAM\x01"
+BAM_TAG_SIZES = {b'A': 1, b'c': 1, b'C': 1, b's': 2, b'S': 2, b'i': 4, b'I': 4, b'f': 4}
+
+_CIGAR_CODES = np.full(256, -1, dtype=np.int8)
+_CIGAR_CODES[np.frombuffer(CIGAR_OPS, dtype=np.uint8)] = np.arange(len(CIGAR_OPS), dtype=np.int8)
+
+
+def emptySegments():
+    return np.empty(0, dtype=SEGMENT_DTYPE)
+
+
+def parseCigars(cigars):
+    """
+    Parses a list of CIGAR strings (bytes) at once.
+    Returns (op_counts, op_lengths, op_codes): number of operations per CIGAR and flat arrays of all operations
+    """
+    raw = np.frombuffer(b"".join(cigars), dtype=np.uint8)
+
+    codes = _CIGAR_CODES[raw]
+    is_op = codes >= 0
+    op_index = np.flatnonzero(is_op)
+
+    # Every CIGAR ends with an operation, so concatenated CIGARs split unambiguously.
+    # A digit belongs to the first operation after it, its weight depends on the distance to that operation
+    digit_index = np.flatnonzero(~is_op)
+    digit_op = np.searchsorted(op_index, digit_index)
+    digit_value = (raw[digit_index] - ord('0')).astype(np.int64) * 10 ** (op_index[digit_op] - digit_index - 1)
+
+    op_lengths = np.bincount(digit_op, weights=digit_value, minlength=len(op_index)).astype(np.int64)
+    op_codes = codes[op_index]
+
+    cigar_ends = np.cumsum([len(cigar) for cigar in cigars], dtype=np.int64)
+    op_counts = np.diff(np.searchsorted(op_index, cigar_ends), prepend=0)
+
+    return op_counts, op_lengths, op_codes
+
+
+def newContigs():
+    """Contig names of segments: ({RNAME: query_contig}, {QNAME: ref_contig}), filled while reading"""
+    return {}, {}
+
+
+def cigarSegments(positions, flags, op_counts, op_lengths, op_codes, query_contigs=0, ref_contigs=0):
+    """
+    Converts parsed alignments into a table of matched blocks (SEGMENT_DTYPE).
+    positions - 1-based leftmost query positions (POS), query_contigs, ref_contigs - contig indexes, one per alignment
+    """
+    op_record = np.repeat(np.arange(len(op_counts)), op_counts)
+    record_first_op = np.cumsum(op_counts) - op_counts
+
+    query_shift = np.where(CIGAR_CONSUMES_QUERY[op_codes], op_lengths, 0)
+    ref_shift = np.where(CIGAR_CONSUMES_REF[op_codes], op_lengths, 0)
+
+    # Exclusive prefix sums inside each alignment
+    query_offset = np.cumsum(query_shift) - query_shift
+    ref_offset = np.cumsum(ref_shift) - ref_shift
+    query_offset -= np.repeat(query_offset[record_first_op[op_counts > 0]], op_counts[op_counts > 0])
+    ref_offset -= np.repeat(ref_offset[record_first_op[op_counts > 0]], op_counts[op_counts > 0])
+
+    match = CIGAR_MATCH[op_codes]
+    match_record = op_record[match]
+
+    segments = np.empty(np.count_nonzero(match), dtype=SEGMENT_DTYPE)
+    segments["query_pos"] = np.asarray(positions, dtype=np.int64)[match_record] + query_offset[match]
+    segments["ref_pos"] = ref_offset[match]
+    segments["length"] = op_lengths[match]
+    segments["reverse"] = (np.asarray(flags, dtype=np.int64)[match_record] & FLAG_REVERSE) != 0
+    segments["query_contig"] = np.broadcast_to(np.asarray(query_contigs, dtype=np.int32), len(op_counts))[match_record]
+    segments["ref_contig"] = np.broadcast_to(np.asarray(ref_contigs, dtype=np.int32), len(op_counts))[match_record]
+    return segments
+
+
+def parseSAMLines(lines, min_rid_size=0, contigs=None):
+    """
+    Converts SAM text lines (bytes) into matched blocks.
+    Alignments with SEQ length <= min_rid_size and unmapped alignments are skipped.
+    contigs - see newContigs, shared by all chunks of one file (header lines come first)
+    """
+    query_indexes, ref_indexes = newContigs() if contigs is None else contigs
+
+    positions, flags, cigars, query_contigs, ref_contigs = [], [], [], [], []
+    for line in lines:
+        if line.startswith(b'@'):
+            if line.startswith(b"@SQ"):
+                tags = dict(field.split(b':', 1) for field in line.rstrip().split(b'\t')[1:])
+                query_indexes.setdefault(tags[b"SN"].decode("utf-8"), len(query_indexes))
+            continue
+        if not line.strip():
+            continue
+
+        # QNAME FLAG RNAME POS MAPQ CIGAR RNEXT PNEXT TLEN SEQ ...
+        fields = line.split(b'\t', 10)
+
+        # Reads are numbered before filtering: the same order as in readReads
+        ref_contig = ref_indexes.setdefault(fields[0].decode("utf-8"), len(ref_indexes))
+
+        if len(fields[9].rstrip()) <= min_rid_size or fields[5] == b'*':
+            continue
+
+        flag = int(fields[1])
+        if flag & FLAG_UNMAPPED:
+            continue
+
+        positions.append(int(fields[3]))
+        flags.append(flag)
+        cigars.append(fields[5])
+        query_contigs.append(query_indexes.setdefault(fields[2].decode("utf-8"), len(query_indexes)))  # RNAME without @SQ goes last
+        ref_contigs.append(ref_contig)
+
+    if not cigars:
+        return emptySegments()
+    return cigarSegments(positions, flags, *parseCigars(cigars), query_contigs, ref_contigs)
+
+
+def readSAM(sam_file_path, min_rid_size=0, chunk_size=CHUNK_SIZE, contigs=None):
+    """Reads matched blocks from a plain-text SAM file"""
+    contigs = newContigs() if contigs is None else contigs
+    chunks = []
+
+    with open(sam_file_path, 'rb') as sam_file:
+        while True:
+            lines = sam_file.readlines(chunk_size)
+            if not lines:
+                break
+            chunks.append(parseSAMLines(lines, min_rid_size, contigs))
+
+    return np.concatenate(chunks) if chunks else emptySegments()
+
+
+def readBgzipSAM(sam_file_path, min_rid_size=0, threads=None, contigs=None):
+    """Reads matched blocks from a bgzipped SAM file"""
+    contigs = newContigs() if contigs is None else contigs
+    chunks = []
+
+    tail = b""
+    for data in readChunks(sam_file_path, threads):
+        data = tail + data
+        last_line_end = data.rfind(b'\n') + 1
+        tail = data[last_line_end:]
+        chunks.append(parseSAMLines(data[:last_line_end].splitlines(), min_rid_size, contigs))
+
+    chunks.append(parseSAMLines([tail], min_rid_size, contigs))
+
+    return np.concatenate(chunks)
+
+
+def _bamTagsCigar(buffer, offset, end):
+    """Returns the "CG:B,I" tag value (CIGAR of alignments with more than 65535 operations) or None"""
+    while offset < end:
+        tag, value_type = buffer[offset:offset + 2], buffer[offset + 2:offset + 3]
+        offset += 3
+
+        if value_type in BAM_TAG_SIZES:
+            offset += BAM_TAG_SIZES[value_type]
+
+        elif value_type in (b'Z', b'H'):
+            offset = buffer.index(b'\x00', offset) + 1
+
+        elif value_type == b'B':
+            subtype = buffer[offset:offset + 1]
+            count, = unpack_from("<i", buffer, offset + 1)
+            offset += 5
+            if tag == b"CG" and subtype == b'I':
+                return np.frombuffer(buffer, dtype="<u4", count=count, offset=offset)
+            offset += count * BAM_TAG_SIZES[subtype]
+
+        else:
+            raise ValueError("BAM: Unknown tag type {}".format(value_type))
+
+    return None
+
+
+def _bamCigar(buffer, record_start, record_end):
+    """
+    Returns the CIGAR of a BAM alignment record as an array of uint32 (length << 4 | op).
+    The "kSmN" placeholder is replaced with the CG tag. Without the tag the placeholder is the real CIGAR
+    """
+    l_read_name, = unpack_from("<B", buffer, record_start + 8)
+    n_cigar_op, = unpack_from("<H", buffer, record_start + 12)
+    l_seq, = unpack_from("<i", buffer, record_start + 16)
+
+    cigar_offset = record_start + 32 + l_read_name
+    cigar = np.frombuffer(buffer, dtype="<u4", count=n_cigar_op, offset=cigar_offset)
+
+    if n_cigar_op == 2 and cigar[0] == (l_seq << 4 | 4) and cigar[1] & 0xF == 3:
+        tags_offset = cigar_offset + 4 * n_cigar_op + (l_seq + 1) // 2 + l_seq
+        tag_cigar = _bamTagsCigar(buffer, tags_offset, record_end)
+        if tag_cigar is not None:
+            return tag_cigar
+
+    return cigar
+
+
+def parseBAMRecords(buffer, offset, min_rid_size=0, read_indexes=None):
+    """
+    Parses all complete BAM alignment records in buffer starting from offset.
+    read_indexes - {read name: ref_contig} shared by all chunks of one file (query_contig is refID).
+    Returns (segments, offset of the first incomplete record)
+    """
+    read_indexes = {} if read_indexes is None else read_indexes
+    positions, flags, cigars, query_contigs, ref_contigs = [], [], [], [], []
+
+    while offset + 4 <= len(buffer):
+        block_size, = unpack_from("<i", buffer, offset)
+        if offset + 4 + block_size > len(buffer):
+            break
+
+        record_start, record_end = offset + 4, offset + 4 + block_size
+        offset = record_end
+
+        # refID pos l_read_name mapq bin n_cigar_op flag l_seq
+        ref_id, pos, l_read_name, _, _, n_cigar_op, flag, l_seq = unpack_from("<iiBBHHHi", buffer, record_start)
+
+        name = bytes(buffer[record_start + 32:record_start + 32 + l_read_name - 1]).decode("utf-8")
+        ref_contig = read_indexes.setdefault(name, len(read_indexes))
+
+        if ref_id < 0 or flag & FLAG_UNMAPPED or n_cigar_op == 0 or l_seq <= min_rid_size:
+            continue
+
+        positions.append(pos + 1)
+        flags.append(flag)
+        cigars.append(_bamCigar(buffer, record_start, record_end))
+        query_contigs.append(ref_id)
+        ref_contigs.append(ref_contig)
+
+    if not cigars:
+        return emptySegments(), offset
+
+    cigar = np.concatenate(cigars)
+    op_counts = np.array([len(record_cigar) for record_cigar in cigars], dtype=np.int64)
+    return cigarSegments(
+        positions, flags, op_counts, (cigar >> 4).astype(np.int64), (cigar & 0xF).astype(np.int8), query_contigs, ref_contigs
+    ), offset
+
+
+def _bamHeader(buffer):
+    """
+    Parses the BAM header (magic, l_text, text, n_ref, references).
+    Returns (references [(name, length)], header size) or None if buffer is too short
+    """
+    if len(buffer) < 12:
+        return None
+    if buffer[:4] != BAM_MAGIC:
+        raise ValueError("BAM: Invalid magic string")
+
+    l_text, = unpack_from("<i", buffer, 4)
+    header_size = 8 + l_text + 4
+    if len(buffer) < header_size:
+        return None
+
+    references = []
+    n_ref, = unpack_from("<i", buffer, header_size - 4)
+    for _ in range(n_ref):
+        if len(buffer) < header_size + 4:
+            return None
+        l_name, = unpack_from("<i", buffer, header_size)
+        if len(buffer) < header_size + 4 + l_name + 4:
+            return None
+        name = bytes(buffer[header_size + 4:header_size + 4 + l_name - 1]).decode("utf-8")
+        length, = unpack_from("<i", buffer, header_size + 4 + l_name)
+        references.append((name, length))
+        header_size += 4 + l_name + 4
+
+    return references, header_size
+
+
+def readBAM(bam_file_path, min_rid_size=0, threads=None, contigs=None):
+    """Reads matched blocks from a BAM file"""
+    query_indexes, read_indexes = newContigs() if contigs is None else contigs
+    chunks = []
+
+    tail = b""
+    header_size = None
+    for data in readChunks(bam_file_path, threads):
+        data = tail + data
+
+        offset = 0
+        if header_size is None:
+            header = _bamHeader(data)
+            if header is None:
+                tail = data
+                continue
+            references, header_size = header
+            offset = header_size
+            for index, (name, _) in enumerate(references):
+                query_indexes.setdefault(name, index)
+
+        segments, offset = parseBAMRecords(data, offset, min_rid_size, read_indexes)
+        chunks.append(segments)
+        tail = data[offset:]
+
+    return np.concatenate(chunks) if chunks else emptySegments()
+
+
+def readSegments(path, min_rid_size=0, threads=None, contigs=None):
+    """
+    Reads matched blocks from a SAM, bgzipped SAM or BAM file (detected by content).
+    threads - number of threads used for BGZF decompression (default: number of CPUs).
+    contigs - newContigs() to get names of query_contig and ref_contig indexes
+    """
+    if not isGzip(path):
+        return readSAM(path, min_rid_size, contigs=contigs)
+
+    if peek(path, len(BAM_MAGIC)) == BAM_MAGIC:
+        return readBAM(path, min_rid_size, threads, contigs)
+    return readBgzipSAM(path, min_rid_size, threads, contigs)
+
+
+# --------------------------------------------------------------------------------> Header
+
+
+def _samLines(path, threads=None):
+    """Yields lines (bytes) of a plain-text or bgzipped SAM file"""
+    if not isGzip(path):
+        with open(path, 'rb') as sam_file:
+            yield from sam_file
+        return
+
+    tail = b""
+    for data in readChunks(path, threads):
+        lines = (tail + data).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def _bamRecords(path, threads=None):
+    """Yields (references, data, record_start, record_end) for every alignment of a BAM file"""
+    tail = b""
+    references = None
+    for data in readChunks(path, threads):
+        data = tail + data
+
+        offset = 0
+        if references is None:
+            header = _bamHeader(data)
+            if header is None:
+                tail = data
+                continue
+            references, offset = header
+
+        while offset + 4 <= len(data):
+            block_size, = unpack_from("<i", data, offset)
+            if offset + 4 + block_size > len(data):
+                break
+            yield references, data, offset + 4, offset + 4 + block_size
+            offset += 4 + block_size
+
+        tail = data[offset:]
+
+
+def _isBAM(path):
+    return isGzip(path) and peek(path, len(BAM_MAGIC)) == BAM_MAGIC
+
+
+def readReferences(path, threads=None):
+    """Returns [(name, length)] of reference sequences from the header (@SQ SN, LN) - query genomes in our terms"""
+    if _isBAM(path):
+        with closing(_bamRecords(path, threads)) as records:
+            for references, *_ in records:
+                return references
+        return []
+
+    references = []
+    for line in _samLines(path, threads):
+        if not line.startswith(b'@'):
+            break
+        if line.startswith(b"@SQ"):
+            tags = dict(field.split(b':', 1) for field in line.rstrip().split(b'\t')[1:])
+            references.append((tags[b"SN"].decode("utf-8"), int(tags[b"LN"])))
+
+    return references
+
+
+def readReads(path, limit=None, threads=None):
+    """
+    Returns [(QNAME, length)] of aligned reads - ref genomes in our terms - in order of first appearance.
+    The length is counted from CIGAR including clipped bases (S, H), so it is the length of the whole read
+    """
+    reads = {}
+
+    if _isBAM(path):
+        for _, data, record_start, record_end in _bamRecords(path, threads):
+            l_read_name, = unpack_from("<B", data, record_start + 8)
+            l_seq, = unpack_from("<i", data, record_start + 16)
+            name = data[record_start + 32:record_start + 32 + l_read_name - 1].decode("utf-8")
+            if name in reads:
+                continue
+
+            cigar = _bamCigar(data, record_start, record_end)
+            reads[name] = int((cigar >> 4)[CIGAR_CONSUMES_REF[cigar & 0xF]].sum()) if len(cigar) else l_seq
+            if limit is not None and len(reads) >= limit:
+                break
+
+    else:
+        for line in _samLines(path, threads):
+            if line.startswith(b'@') or not line.strip():
+                continue
+
+            fields = line.split(b'\t', 10)
+            name = fields[0].decode("utf-8")
+            if name in reads:
+                continue
+
+            if fields[5] == b'*':
+                reads[name] = len(fields[9].rstrip())
+            else:
+                _, op_lengths, op_codes = parseCigars([fields[5]])
+                reads[name] = int(op_lengths[CIGAR_CONSUMES_REF[op_codes]].sum())
+
+            if limit is not None and len(reads) >= limit:
+                break
+
+    return list(reads.items())
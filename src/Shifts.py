@@ -0,0 +1,78 @@
+from typing import List, Tuple
+from multiprocessing import Pool
+from os import cpu_count
+
+from Line import Line, shiftLines
+from Rotations import countBestRotations
+
+
+SERIAL_MAX_LINES = 32  # Start lines of fewer lines are counted without a process pool (about 0.1 s for 32 lines)
+
+
+def countShift(lines, start_line, query_genome_length, apply_changes=False, verbose=True) -> tuple:
+    """
+    Moves lines[start_line] to the beginning of the query (lines before it go to the end) and counts best rotations.
+    Returns (metric_value * number of rotations, number of evaluated rotations) (counted on copies of coordinates, lines are not changed)
+    or, if apply_changes, (shifted lines, rotated lines, rotation actions, number of evaluated rotations) - only then dots are shifted and copied
+    """
+    d_x = lines[start_line].start_x
+
+    shifted_lines = lines if apply_changes else [line.copyCoords() for line in lines]
+
+    for line_index in range(start_line, len(lines)):
+        shifted_lines[line_index].shift(dx=-d_x)
+
+    for line_index in range(0, start_line):
+        shifted_lines[line_index].shift(dx=query_genome_length - d_x)
+
+    shifted_lines = shiftLines(shifted_lines, start_line)
+    rotated_lines = [line.copy() for line in shifted_lines] if apply_changes else shifted_lines
+
+    metric_value, rotated_lines, rotation_actions, candidates = countBestRotations(rotated_lines, verbose)
+
+    if verbose:
+        print("metric_value = {} or {}".format(metric_value, metric_value * len(rotation_actions)))
+
+    if apply_changes:
+        return shifted_lines, rotated_lines, rotation_actions, candidates
+
+    return metric_value * len(rotation_actions), candidates
+
+
+# --- Worker state: coordinates of lines are sent to every process once (in the initializer)
+_worker_lines: List[Line] = None
+_worker_query_genome_length: int = None
+
+
+def _initWorker(coords, query_genome_length):
+    global _worker_lines, _worker_query_genome_length
+    _worker_lines = [Line(*line_coords) for line_coords in coords]
+    _worker_query_genome_length = query_genome_length
+
+
+def _countShiftWorker(start_line):
+    return countShift(_worker_lines, start_line, _worker_query_genome_length, verbose=False)
+
+
+def countBestShift(lines, query_genome_length, settings) -> Tuple[int, int]:
+    """
+    Counts countShift for every start_line (on a process pool of settings["processes"] if it is not 1, None - all CPUs).
+    Fewer than SERIAL_MAX_LINES lines are counted in this process: it is faster than starting a pool.
+    Only coordinates of lines are used.
+    Returns the best start_line (the first one on equal metrics) and the number of rotations evaluated for all start lines
+    """
+    processes = min(settings["processes"] or cpu_count(), len(lines))
+
+    if processes > 1 and len(lines) >= SERIAL_MAX_LINES:
+        coords = [line.coords for line in lines]
+        with Pool(processes, initializer=_initWorker, initargs=(coords, query_genome_length)) as pool:
+            results = pool.map(_countShiftWorker, range(len(lines)))
+    else:
+        results = [countShift(lines, start_line, query_genome_length, verbose=False) for start_line in range(len(lines))]
+
+    metric_values = [metric_value for metric_value, _ in results]
+    for start_line, metric_value in enumerate(metric_values):
+        print("-| start_line = {}: {}".format(start_line, metric_value))
+
+    best_start_line = min(range(len(lines)), key=lambda start_line: (metric_values[start_line], start_line), default=0)
+    return best_start_line, sum(candidates for _, candidates in results)
@@ -0,0 +1,225 @@
+from json import dump as json_dump, load as json_load
+import numpy as np
+
+
+# Synthetic test: random genome1 (query), genome2 (ref) = genome1 with planted structural variants,
+# SAM file with exact alignments of genome2 pieces (as "bwa mem" would make without errors) and the list of planted events.
+# !!! X - query (genome1), Y - ref (genome2) !!!
+
+EVENT_TYPES = ("insertion", "deletion", "inversion", "duplication", "translocation")
+
+NUCLEOTIDES = np.frombuffer(b"ACGT", dtype=np.uint8)
+COMPLEMENT = bytes.maketrans(b"ACGT", b"TGCA")
+
+FASTA_LINE_WIDTH = 60
+MIN_ALIGNMENT = 20  # Pieces of genome2 shorter than that are not aligned
+
+FLAG_REVERSE = 0x10
+FLAG_SUPPLEMENTARY = 0x800
+
+
+def randomGenome(length, rng):
+    return NUCLEOTIDES[rng.integers(0, len(NUCLEOTIDES), length)].tobytes()
+
+
+def reverseComplement(sequence):
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def plantEvents(genome_length, event_counts, min_size, max_size, rng, max_tries=1000):
+    """
+    Chooses random non-overlapping regions of genome1 for events.
+    event_counts - {event type: count}, sizes are uniform in [min_size, max_size].
+    Returns events sorted by start: {"type", "start", "length"} (+ "target" - position the translocated region is moved to).
+    Between any two events there are at least max_size bases of unchanged genome
+    """
+    taken = []  # (start, end) of regions with events, translocation targets are regions of zero length
+
+    def isFree(start, end):
+        return all(end + max_size <= other_start or other_end + max_size <= start for other_start, other_end in taken)
+
+    def randomRegion(length):
+        for _ in range(max_tries):
+            start = int(rng.integers(max_size, genome_length - length - max_size))
+            if isFree(start, start + length):
+                return start
+        raise ValueError("Can not plant {} events of size up to {} into {} bases".format(sum(event_counts.values()), max_size, genome_length))
+
+    events = []
+    for event_type in EVENT_TYPES:
+        for _ in range(event_counts.get(event_type, 0)):
+            length = int(rng.integers(min_size, max_size + 1))
+            start = randomRegion(length)
+            taken.append((start, start + length))
+            event = {"type": event_type, "start": start, "length": length}
+
+            if event_type == "translocation":
+                event["target"] = randomRegion(0)
+                taken.append((event["target"], event["target"]))
+
+            events.append(event)
+
+    events.sort(key=lambda event: event["start"])
+    return events
+
+
+def buildPieces(genome_length, events, rng):
+    """
+    Returns genome2 as a list of pieces: (query_start, query_end, reverse) for parts of genome1
+    and (None, None, sequence) for inserted sequences
+    """
+    # Every event is a change at one position of genome1: what replaces genome1[start:end]
+    changes = []
+    for event in events:
+        start, end = event["start"], event["start"] + event["length"]
+
+        if event["type"] == "insertion":
+            changes.append((start, start, [(None, None, randomGenome(event["length"], rng))]))
+        elif event["type"] == "deletion":
+            changes.append((start, end, []))
+        elif event["type"] == "inversion":
+            changes.append((start, end, [(start, end, True)]))
+        elif event["type"] == "duplication":
+            changes.append((start, end, [(start, end, False), (start, end, False)]))
+        elif event["type"] == "translocation":
+            changes.append((start, end, []))
+            changes.append((event["target"], event["target"], [(start, end, False)]))
+        else:
+            raise ValueError("Unknown event type: {}".format(event["type"]))
+
+    pieces = []
+    position = 0
+    for start, end, replacement in sorted(changes, key=lambda change: change[0]):
+        if position < start:
+            pieces.append((position, start, False))
+        pieces += replacement
+        position = end
+
+    if position < genome_length:
+        pieces.append((position, genome_length, False))
+
+    return pieces
+
+
+def rotatePieces(pieces, rotation, genome_length):
+    """Pieces on genome1 rotated to start from rotation (circular genome): pieces across its origin are split in two"""
+    rotated = []
+    for query_start, query_end, extra in pieces:
+        if query_start is None:
+            rotated.append((query_start, query_end, extra))
+            continue
+
+        query_start, query_end = (query_start - rotation) % genome_length, (query_end - rotation - 1) % genome_length + 1
+        if query_start < query_end:
+            rotated.append((query_start, query_end, extra))
+        else:
+            # Parts are in the order of genome2 (the reverse piece goes from its end)
+            parts = [(query_start, genome_length, extra), (0, query_end, extra)]
+            rotated += parts[::-1] if extra else parts
+
+    return rotated
+
+
+def piecesSequence(genome, pieces):
+    sequences = []
+    for query_start, query_end, extra in pieces:
+        if query_start is None:
+            sequences.append(extra)
+        elif extra:
+            sequences.append(reverseComplement(genome[query_start:query_end]))
+        else:
+            sequences.append(genome[query_start:query_end])
+    return b"".join(sequences)
+
+
+def writeFasta(path, name, sequence, line_width=FASTA_LINE_WIDTH):
+    with open(path, 'wb') as fasta_file:
+        fasta_file.write(">{}\n".format(name).encode("utf-8"))
+        for start in range(0, len(sequence), line_width):
+            fasta_file.write(sequence[start:start + line_width])
+            fasta_file.write(b'\n')
+
+
+def writeSam(path, query_name, query_length, ref_name, ref_sequence, pieces):
+    """
+    Writes alignments of genome2 pieces to genome1: the longest piece is the primary alignment (soft clipped, full SEQ),
+    others are supplementary (hard clipped). Reverse pieces are aligned as the reverse complement of genome2
+    """
+    ref_length = len(ref_sequence)
+    ref_reversed = None
+
+    alignments = []
+    offset = 0
+    for query_start, query_end, extra in pieces:
+        length = len(extra) if query_start is None else query_end - query_start
+        if query_start is not None and length >= MIN_ALIGNMENT:
+            # Offset of the piece in the read as it is aligned (reverse complement for reverse pieces)
+            read_offset = ref_length - offset - length if extra else offset
+            alignments.append((query_start, length, extra, read_offset))
+        offset += length
+
+    primary = max(range(len(alignments)), key=lambda index: alignments[index][1], default=None)
+
+    with open(path, 'wb') as sam_file:
+        sam_file.write("@SQ\tSN:{}\tLN:{}\n".format(query_name, query_length).encode("utf-8"))
+        sam_file.write(b"@PG\tID:synthetic\tPN:Synthetic\n")
+
+        for index, (query_start, length, reverse, read_offset) in enumerate(alignments):
+            flag = FLAG_REVERSE if reverse else 0
+            clip = "S" if index == primary else "H"
+            cigar = "{}{}M{}".format(
+                "{}{}".format(read_offset, clip) if read_offset else "",
+                length,
+                "{}{}".format(ref_length - read_offset - length, clip) if read_offset + length < ref_length else ""
+            )
+
+            if reverse and ref_reversed is None:
+                ref_reversed = reverseComplement(ref_sequence)
+            read = ref_reversed if reverse else ref_sequence
+
+            if index == primary:
+                sequence = read
+            else:
+                flag |= FLAG_SUPPLEMENTARY
+                sequence = read[read_offset:read_offset + length]
+
+            sam_file.write("{}\t{}\t{}\t{}\t60\t{}\t*\t0\t0\t".format(ref_name, flag, query_name, query_start + 1, cigar).encode("utf-8"))
+            sam_file.write(sequence)
+            sam_file.write(b"\t*\n")
+
+
+def generate(query_genome_path, ref_genome_path, sam_file_path, truth_path, genome_length, event_counts, min_size, max_size, seed=None,
+             rotation=0):
+    """
+    Makes a synthetic test: two FASTA files, SAM file and the list of planted events (JSON).
+    rotation - genome1 (circular) starts from this position of the genome events are planted in, positions of events are moved with it
+    """
+    rng = np.random.default_rng(seed)
+
+    genome = randomGenome(genome_length, rng)
+    events = plantEvents(genome_length, event_counts, min_size, max_size, rng)
+    pieces = buildPieces(genome_length, events, rng)
+    ref_sequence = piecesSequence(genome, pieces)
+
+    if rotation:
+        genome = genome[rotation:] + genome[:rotation]
+        pieces = rotatePieces(pieces, rotation, genome_length)
+        for event in events:
+            for key in ("start", "target"):
+                if key in event:
+                    event[key] = (event[key] - rotation) % genome_length
+        events.sort(key=lambda event: event["start"])
+
+    writeFasta(query_genome_path, "genome1", genome)
+    writeFasta(ref_genome_path, "genome2", ref_sequence)
+    writeSam(sam_file_path, "genome1", genome_length, "genome2", ref_sequence, pieces)
+
+    with open(truth_path, 'w', encoding="utf-8") as truth_file:
+        json_dump(events, truth_file, indent=4)
+
+    return events
+
+
+def readTruth(truth_path):
+    with open(truth_path, 'r', encoding="utf-8") as truth_file:
+        return json_load(truth_file)
@@ -0,0 +1,88 @@
+from bisect import bisect_right
+from math import ceil, floor
+import numpy as np
+
+
+# Dots are never changed during the history: every event changes only the transform of their original X coordinates.
+# Pieces [starts[i], starts[i + 1]) of original X are moved by (dx[i], dy[i]) and can be dropped for all or some lines.
+# Conditions of events are on the current X, inside one piece it is original X + dx[i], so a condition splits a piece at most once
+
+MIN_X = -(1 << 62)
+
+
+class PiecewiseTransform:
+    __slots__ = ("starts", "dx", "dy", "drop_all", "drop_lines")
+
+    def __init__(self):
+        self.starts = [MIN_X]
+        self.dx = [0]
+        self.dy = [0]
+        self.drop_all = [False]
+        self.drop_lines = [frozenset()]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return "PiecewiseTransform(pieces={})".format(len(self))
+
+    def _split(self, x):
+        """Makes a piece start at original X x"""
+        index = bisect_right(self.starts, x)
+        if self.starts[index - 1] == x:
+            return
+
+        self.starts.insert(index, x)
+        for values in (self.dx, self.dy, self.drop_all, self.drop_lines):
+            values.insert(index, values[index - 1])
+
+    def _pieces(self, low, high=None):
+        """Returns indexes of pieces with low <= current X (<= high), pieces are split where the condition changes"""
+        cuts = []
+        for index, (start, dx) in enumerate(zip(self.starts, self.dx)):
+            end = self.starts[index + 1] if index + 1 < len(self) else None
+            for cut in (ceil(low - dx), None if high is None else floor(high - dx) + 1):
+                if cut is not None and start < cut and (end is None or cut < end):
+                    cuts.append(cut)
+
+        for cut in cuts:
+            self._split(cut)
+
+        # Now the condition is the same for all dots of a piece
+        return [
+            index for index, (start, dx) in enumerate(zip(self.starts, self.dx))
+            if low <= start + dx and (high is None or start + dx <= high)
+        ]
+
+    def move(self, from_x, dx=0, dy=0):
+        """Moves dots with current X >= from_x"""
+        for index in self._pieces(from_x):
+            self.dx[index] += dx
+            self.dy[index] += dy
+
+    def drop(self, low, high, line_index=None):
+        """Drops dots with low <= current X <= high (only of line line_index if it is not None)"""
+        for index in self._pieces(low, high):
+            if line_index is None:
+                self.drop_all[index] = True
+            else:
+                self.drop_lines[index] = self.drop_lines[index] | {line_index}
+
+    def shiftY(self, dy):
+        """Moves all dots"""
+        self.dy = [value + dy for value in self.dy]
+
+    def apply(self, dots, line_index=None):
+        """Returns current dots of the line, dots are (N, 2) int64 array of original coordinates"""
+        piece = np.searchsorted(np.array(self.starts, dtype=np.int64), dots[:, 0], side="right") - 1
+
+        dropped = np.array([
+            drop_all or line_index in drop_lines for drop_all, drop_lines in zip(self.drop_all, self.drop_lines)
+        ], dtype=bool)
+        keep = ~dropped[piece]
+        piece = piece[keep]
+
+        result = dots[keep]
+        result[:, 0] += np.array(self.dx, dtype=np.int64)[piece]
+        result[:, 1] += np.array(self.dy, dtype=np.int64)[piece]
+        return result
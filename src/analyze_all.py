@@ -1,18 +1,154 @@
-import os
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+from collections import Counter
+from time import time
 from sys import path as sys_path
+import traceback
+import signal
+import sys
+import os
 
-os.chdir("../")
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-sys_path.append(".")
+sys_path.append(ROOT)
 
 import sam_analyze
-from utils import removePythonCache
+from utils import removePythonCache, writeTable
+from EventWriter import aggregateEvents
+from Report import peakRSS
+
+
+PROCESSES = None         # Tests running at the same time (None - all CPUs)
+TIMEOUT = 60 * 60        # Seconds per test
+SUMMARY_PATH = "tests/summary.txt"
+EVENTS_PATH = "tests/events"  # Events of all tests: .jsonl, .bed, .vcf
+RENDER = True            # False - only events (history.txt, events.*, report.json), without plots and matplotlib
 
 
 def mkpath(*paths):
     return os.path.normpath(os.path.join(*paths))
 
 
+def runTest(connection, test):
+    """Runs one test in its own process: output goes to <output_folder>/log.txt, result is sent to connection"""
+    # The test and the pools it starts (settings["processes"] != 1) form one process group, killed as a whole on timeout
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    os.chdir(ROOT)
+    os.makedirs(test["output_folder"], exist_ok=True)
+
+    with open(mkpath(test["output_folder"], "log.txt"), 'w', encoding="utf-8") as log_file:
+        sys.stdout = sys.stderr = log_file
+
+        try:
+            events = sam_analyze.analyze(**test, render=RENDER)
+            result = ("ok", dict(Counter(event.type for event in events)))
+        except Exception:
+            traceback.print_exc()
+            result = ("error", {})
+
+        log_file.flush()
+
+    # Peak of the test process or of the largest of its workers (RSS of different processes is not added up)
+    self_rss, children_rss = peakRSS()
+    connection.send(result + (None if self_rss is None else max(self_rss, children_rss),))
+    connection.close()
+
+
+def killTest(process):
+    """Kills the test process with its process group (see runTest), so that workers of its pools are not left running"""
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except ProcessLookupError:  # The test has not created its group yet
+            pass
+    process.kill()
+
+
+def runTests(tests, processes=None, timeout=TIMEOUT):
+    """
+    Runs tests (list of analyze arguments) in separate processes, at most processes at the same time.
+    Returns {output_folder: (status, wall time, peak RSS, event counts)}
+    """
+    processes = processes or os.cpu_count()
+    pending = list(reversed(tests))
+    running = {}  # sentinel -> (test, process, connection, start time)
+    results = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                test = pending.pop()
+                receiver, sender = Pipe(duplex=False)
+                process = Process(target=runTest, args=(sender, test))
+                process.start()
+                sender.close()
+                running[process.sentinel] = (test, process, receiver, time())
+                print("Started {}".format(test["output_folder"]))
+
+            finished = wait(list(running), timeout=1)
+
+            for sentinel in list(running):
+                test, process, receiver, start_time = running[sentinel]
+                wall_time = time() - start_time
+
+                if sentinel in finished:
+                    if receiver.poll():
+                        status, event_counts, peak_rss = receiver.recv()
+                    else:
+                        status, event_counts, peak_rss = "crashed", {}, None
+
+                elif wall_time > timeout:
+                    killTest(process)
+                    status, event_counts, peak_rss = "timeout", {}, None
+
+                else:
+                    continue
+
+                process.join()
+                receiver.close()
+                del running[sentinel]
+
+                results[test["output_folder"]] = (status, wall_time, peak_rss, event_counts)
+                print("Finished {}: {} ({:.1f} s)".format(test["output_folder"], status, wall_time))
+    finally:
+        # Tests are in their own process groups and do not get Ctrl+C from the terminal
+        for _, process, receiver, _ in running.values():
+            killTest(process)
+            process.join()
+            receiver.close()
+
+    return results
+
+
+def skipTests(tests):
+    """Tests of datasets without a SAM file (BWA was not run for them): they are not started, returns their results"""
+    results = {}
+    for test in tests:
+        if not os.path.isfile(mkpath(ROOT, test["sam_file_path"])):
+            print("Skipped {}: no {}".format(test["output_folder"], test["sam_file_path"]))
+            results[test["output_folder"]] = ("skipped", None, None, {})
+
+    return results
+
+
+def writeSummary(tests, results, summary_path):
+    rows = [("Test", "Status", "Time, s", "Peak RSS, MB", "Events")]
+    for test in tests:
+        status, wall_time, peak_rss, event_counts = results[test["output_folder"]]
+        rows.append((
+            test["output_folder"],
+            status,
+            "-" if wall_time is None else "{:.1f}".format(wall_time),
+            "-" if peak_rss is None else "{:.0f}".format(peak_rss),
+            ", ".join("{} {}".format(count, event_type) for event_type, count in sorted(event_counts.items())) or "-"
+        ))
+
+    writeTable(rows, summary_path)
+
+
 def main():
     # Small
     SETTINGS = {
@@ -25,19 +161,29 @@ def main():
 
         "min_event_size": 3,
         "lines_join_size": 5,
-        "line_min_size": 10
+        "line_min_size": 10,
+        "lines_method": "dots",
+        "processes": None,
+        "plot_method": "scatter",
+        "history_png": True,
+        "history_gif": True,
+        "cache": True,
+        "profile": False,
+        "trace_memory": False
     }
 
-    for foldername in os.listdir(mkpath("tests", "small")):
+    tests = []
+
+    for foldername in sorted(os.listdir(mkpath(ROOT, "BWA", "small"))):
         # break
-        sam_analyze.analyze(
-            query_genome_path="samples/small/source.fasta",
-            ref_genome_path="samples/small/{}.fasta".format(foldername),
-            sam_file_path="BWA/small/{}/bwa_output.sam".format(foldername),
-            show_plot=False,
-            output_folder="tests/small/{}".format(foldername),
-            settings=SETTINGS.copy()
-        )
+        tests.append({
+            "query_genome_path": "samples/small/source.fasta",
+            "ref_genome_path": "samples/small/{}.fasta".format(foldername),
+            "sam_file_path": "BWA/small/{}/bwa_output.sam".format(foldername),
+            "show_plot": False,
+            "output_folder": "tests/small/{}".format(foldername),
+            "settings": SETTINGS.copy()
+        })
 
     # Large
     SETTINGS = {
@@ -50,27 +196,52 @@ def main():
 
         "min_event_size": int(5e3),
         "lines_join_size": "$min_event_size + 3",
-        "line_min_size": "$min_event_size"
+        "line_min_size": "$min_event_size",
+        "lines_method": "dots",
+        "processes": None,
+        "plot_method": "scatter",
+        "history_png": True,
+        "history_gif": True,
+        "cache": True,
+        "profile": False,
+        "trace_memory": False
     }
 
-    for foldername in os.listdir("tests"):
-        if not os.path.isdir(mkpath("tests", foldername)) or foldername.strip("/").strip("\\") == "small":
+    # Datasets are folders of BWA/ (tests/ also holds the summary and other output)
+    for foldername in sorted(os.listdir(mkpath(ROOT, "BWA"))):
+        if not os.path.isdir(mkpath(ROOT, "BWA", foldername)) or foldername == "small":
             continue
 
-        # if foldername.strip("/").strip("\\") != "large06":
+        # if foldername != "large06":
         #     continue
 
-        sam_analyze.analyze(
-            query_genome_path="samples/{}/large_genome1.fasta".format(foldername),
-            ref_genome_path="samples/{}/large_genome2.fasta".format(foldername),
-            sam_file_path="BWA/{}/bwa_output.sam".format(foldername),
-            show_plot=False,
-            output_folder="tests/{}".format(foldername),
-            settings=SETTINGS.copy()
-        )
+        tests.append({
+            "query_genome_path": "samples/{}/large_genome1.fasta".format(foldername),
+            "ref_genome_path": "samples/{}/large_genome2.fasta".format(foldername),
+            "sam_file_path": "BWA/{}/bwa_output.sam".format(foldername),
+            "show_plot": False,
+            "output_folder": "tests/{}".format(foldername),
+            "settings": SETTINGS.copy()
+        })
+
+    # Tests already run in parallel, so every test uses one process
+    processes = PROCESSES or os.cpu_count()
+    if processes > 1:
+        for test in tests:
+            test["settings"]["processes"] = 1
+
+    results = skipTests(tests)
+    results.update(runTests([test for test in tests if test["output_folder"] not in results], processes))
+    writeSummary(tests, results, mkpath(ROOT, SUMMARY_PATH))
+
+    events_count = aggregateEvents(
+        [mkpath(ROOT, test["output_folder"], "events.jsonl") for test in tests if results[test["output_folder"]][0] == "ok"],
+        mkpath(ROOT, EVENTS_PATH)
+    )
+    print("\n{} events saved to {}.*".format(events_count, EVENTS_PATH))
 
 
 if __name__ == "__main__":
-    removePythonCache("./")
+    removePythonCache(ROOT)
     main()
-    removePythonCache("./")
+    removePythonCache(ROOT)
@@ -0,0 +1,143 @@
+from contextlib import redirect_stdout
+from json import load as json_load
+from time import time
+from sys import path as sys_path
+import sys
+import os
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+sys_path.append(ROOT)
+
+import sam_analyze
+from utils import mkpath, prtNum, removePythonCache, writeTable
+from Synthetic import generate, readTruth, EVENT_TYPES
+from EventWriter import readEvents
+
+
+# Synthetic tests of different genome lengths: every stage of analyze is timed, found events (events.jsonl) are scored against planted ones.
+# Tests are made in BENCHMARK_FOLDER/<length>/ (once, with SEED)
+
+BENCHMARK_FOLDER = "benchmarks"
+SIZES = (int(1e5), int(1e6), int(1e7))
+EVENT_COUNTS = {event_type: 2 for event_type in EVENT_TYPES}
+SEED = 0
+
+# Stages of analyze as they are named in report.json
+STAGES = ("genomes", "sam", "dots", "lines", "shift", "events", "main_plot", "history")
+
+# Event types of analyze -> planted event types
+FOUND_TYPES = {"Rotation": "inversion", "Insertion": "insertion", "Deletion": "deletion", "Duplication": "duplication", "Translocation": "translocation"}
+
+
+def benchmarkSettings(genome_length):
+    """Settings of analyze scaled to the genome length (events are planted with sizes from genome_length / 200)"""
+    return {
+        "grid_size": genome_length // 10,
+        "min_rid_size": min(int(1e3), genome_length // 1000),
+        "dot_skip_rate": max(1, genome_length // int(1e5)),
+        "dotsize": 0.1,
+        "fontsize": 8,
+        "figsize": (10, 7),
+
+        "min_event_size": genome_length // 1000,
+        "lines_join_size": "$min_event_size + 3",
+        "line_min_size": "$min_event_size",
+        "lines_method": "chain",
+        "processes": None,
+        "plot_method": "density",
+        "history_png": False,
+        "history_gif": False,
+        "cache": False,
+        "profile": False,
+        "trace_memory": False
+    }
+
+
+def readFound(events_path):
+    """Returns found events (events.jsonl) as (event type, query position, size)"""
+    return [(FOUND_TYPES[record["type"]], record["query_start"], record["size"]) for record in readEvents(events_path)]
+
+
+def truthPositions(event):
+    """Query positions at which a planted event can be found"""
+    if event["type"] == "translocation":
+        return (event["start"], event["start"] + event["length"], event["target"])
+    return (event["start"],)
+
+
+def score(truth, found, tolerance):
+    """
+    Matches every planted event with the nearest unmatched found event of the same type (not further than tolerance).
+    Returns (true positives, false negatives, false positives)
+    """
+    unmatched = list(found)
+    true_positives = 0
+
+    for event in truth:
+        candidates = [
+            (min(abs(position - x) for position in truthPositions(event)), index)
+            for index, (event_type, x, _) in enumerate(unmatched) if event_type == event["type"]
+        ]
+        distance, index = min(candidates, default=(None, None))
+        if distance is not None and distance <= tolerance:
+            true_positives += 1
+            del unmatched[index]
+
+    return true_positives, len(truth) - true_positives, len(unmatched)
+
+
+def runBenchmark(genome_length, event_counts=EVENT_COUNTS, seed=SEED):
+    folder = mkpath(ROOT, BENCHMARK_FOLDER, str(genome_length))
+    paths = {
+        "query_genome_path": mkpath(folder, "genome1.fasta"),
+        "ref_genome_path": mkpath(folder, "genome2.fasta"),
+        "sam_file_path": mkpath(folder, "simulated.sam"),
+        "truth_path": mkpath(folder, "truth.json")
+    }
+
+    if not all(os.path.exists(path) for path in paths.values()):
+        print("Generating {} bases...".format(prtNum(genome_length)))
+        os.makedirs(folder, exist_ok=True)
+        generate(**paths, genome_length=genome_length, event_counts=event_counts,
+                 min_size=genome_length // 200, max_size=genome_length // 100, seed=seed)
+
+    settings = benchmarkSettings(genome_length)
+
+    print("Analyzing {} bases...".format(prtNum(genome_length)))
+    with open(mkpath(folder, "log.txt"), 'w', encoding="utf-8") as log_file:
+        start_time = time()
+        with redirect_stdout(log_file):
+            sam_analyze.analyze(
+                paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"],
+                show_plot=False, output_folder=folder, settings=settings
+            )
+        total_time = time() - start_time
+
+    # Time of every stage is taken from the report of analyze
+    with open(mkpath(folder, "report.json"), 'r', encoding="utf-8") as report_file:
+        stage_times = {stage["stage"]: stage["wall_time"] for stage in json_load(report_file)["stages"]}
+
+    counts = score(readTruth(paths["truth_path"]), readFound(mkpath(folder, "events.jsonl")), settings["min_event_size"])
+    return stage_times, total_time, counts
+
+
+def main(sizes=SIZES):
+    rows = [("Length", *STAGES, "Total, s", "Found", "Missed", "Extra")]
+
+    for genome_length in sizes:
+        stage_times, total_time, (true_positives, false_negatives, false_positives) = runBenchmark(genome_length)
+        rows.append((
+            prtNum(genome_length),
+            *("{:.2f}".format(stage_times[stage]) if stage in stage_times else "-" for stage in STAGES),
+            "{:.2f}".format(total_time),
+            str(true_positives), str(false_negatives), str(false_positives)
+        ))
+
+    writeTable(rows, mkpath(ROOT, BENCHMARK_FOLDER, "summary.txt"))
+
+
+if __name__ == "__main__":
+    removePythonCache(ROOT)
+    main([int(float(size)) for size in sys.argv[1:]] or SIZES)
+    removePythonCache(ROOT)
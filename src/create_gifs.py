@@ -1,45 +1,43 @@
-from subprocess import Popen, PIPE
+from PIL import Image
 import os
 
+from utils import mkpath
+from Frames import saveGif, GIF_SCALE, GIF_DURATION
 
-def createGif(path_in, path_out, delay=50, resize=0.3):
-    s = Popen(
-        "convert -delay {} -loop 0 {} -resize {}% {}".format(delay, path_in, resize * 100, path_out),
-        shell=True, stdin=PIPE, stdout=PIPE, stderr=PIPE).communicate()
 
-    print(s[0])
-    print(s[1])
+# Makes history.gif of every test from its PNG frames (sam_analyze.py makes it itself with "history_gif" setting)
 
 
-def main():
-    if not os.path.isdir("history"):
-        os.mkdir("history")
+def createGif(path_in, path_out, duration=GIF_DURATION, resize=GIF_SCALE):
+    def frames():
+        for filename in sorted(os.listdir(path_in)):
+            if filename.endswith(".png"):
+                with Image.open(mkpath(path_in, filename)) as image:
+                    yield image.resize((round(image.width * resize), round(image.height * resize)), Image.Resampling.LANCZOS)
 
-    os.chdir("history")
+    saveGif(path_out, frames(), duration)
 
-    print("Processing {}".format(os.getcwd()))
 
-    createGif("*.png", "../history.gif")
+def main(test_folder):
+    print("Processing {}".format(test_folder))
 
-    print("-" * 30 + "\n")
-
-    os.chdir("../")
+    if not os.path.isdir(mkpath(test_folder, "history")):
+        os.mkdir(mkpath(test_folder, "history"))
 
+    createGif(mkpath(test_folder, "history"), mkpath(test_folder, "history.gif"))
 
-os.chdir("../tests/")
+    print("-" * 30 + "\n")
 
-for foldername in os.listdir():
-    if not os.path.isdir(foldername):
-        continue
 
-    os.chdir(foldername)
+if __name__ == "__main__":
+    tests_folder = mkpath(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
 
-    if foldername.strip("/").strip("\\") == "small":
-        for foldername2 in os.listdir():
-            os.chdir(foldername2)
-            main()
-            os.chdir("../")
-    else:
-        main()
+    for foldername in os.listdir(tests_folder):
+        if not os.path.isdir(mkpath(tests_folder, foldername)):
+            continue
 
-    os.chdir("../")
+        if foldername == "small":
+            for foldername2 in os.listdir(mkpath(tests_folder, foldername)):
+                main(mkpath(tests_folder, foldername, foldername2))
+        else:
+            main(mkpath(tests_folder, foldername))
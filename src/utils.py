@@ -2,6 +2,7 @@ from os.path import normpath as os_normpath, join as os_join, exists as os_exist
 from json import load as json_load
 from os import walk as os_walk
 from shutil import rmtree
+import numpy as np
 # from threading import Thread, Lock
 # from functools import wraps
 
@@ -21,6 +22,17 @@ def prtNum(num):
     return "{:,}".format(num).replace(',', "'")
 
 
+def writeTable(rows, path):
+    '''Writes rows (tuples of strings, the first one is the header) as a text table to path and prints it'''
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    table = "\n".join(" | ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+    with open(path, 'w', encoding="utf-8") as table_file:
+        print(table, file=table_file)
+
+    print("\n" + table)
+
+
 def equalE(value1, value2, E):
     '''Epsilon comparison'''
     return value1 - E < value2 < value1 + E
@@ -30,24 +42,34 @@ def distance2(x1, y1, x2, y2):
     return (x1 - x2) ** 2 + (y1 - y2) ** 2
 
 
-def linearApproxDots(dots):
-    n, sumx, sumy, sumx2, sumxy = len(dots), 0, 0, 0, 0
-    for x, y in dots:
-        sumx += x
-        sumy += y
-        sumx2 += x ** 2
-        sumxy += x * y
+def sumProducts(a, b):
+    '''Exact sum(a * b) of int64 arrays (coordinates < 2^31): products are split into 16-bit halves to avoid overflow'''
+    a_high, a_low = np.divmod(a, 1 << 16)
+    b_high, b_low = np.divmod(b, 1 << 16)
+    return (int(np.dot(a_high, b_high)) << 32) + \
+        ((int(np.dot(a_high, b_low)) + int(np.dot(a_low, b_high))) << 16) + \
+        int(np.dot(a_low, b_low))
+
 
+def dotsStats(dots):
+    '''Sufficient statistics for least squares: (n, sum x, sum y, sum x^2, sum xy)'''
+    dots = np.asarray(dots, dtype=np.int64).reshape(-1, 2)
+    x, y = dots[:, 0], dots[:, 1]
+    return len(dots), int(x.sum()), int(y.sum()), sumProducts(x, x), sumProducts(x, y)
+
+
+def linearApproxStats(n, sumx, sumy, sumx2, sumxy):
     k = (n * sumxy - (sumx * sumy)) / (n * sumx2 - sumx * sumx)
     b = (sumy - k * sumx) / n
     return k, b
 
 
+def linearApproxDots(dots):
+    return linearApproxStats(*dotsStats(dots))
+
+
 def linearApproxLines(lines):
-    dots = []
-    for line in lines:
-        dots += line.dots
-    return linearApproxDots(dots)
+    return linearApproxStats(*(sum(values) for values in zip(*(line.stats for line in lines))))
 
 
 def YCoordOnLine(x1, y1, x2, y2, target_x):
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Modules of the project are imported the same way as in sam_analyze.py (from src/)
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from Synthetic import generate  # noqa: E402
+
+
+TESTS = ("deletion", "duplication", "insertion", "inversion", "inversion2", "translocation")  # samples/small
+
+
+@pytest.fixture
+def synthetic_sample(tmp_path):
+    """Function generating a synthetic sample in tmp_path: synthetic_sample(**generate kwargs) -> paths of its files"""
+    def generateSample(**kwargs):
+        paths = {
+            "query_genome_path": str(tmp_path / "genome1.fasta"),
+            "ref_genome_path": str(tmp_path / "genome2.fasta"),
+            "sam_file_path": str(tmp_path / "simulated.sam"),
+            "truth_path": str(tmp_path / "truth.json")
+        }
+        generate(**paths, **kwargs)
+        return paths
+
+    return generateSample
@@ -0,0 +1,80 @@
+import os
+import time
+from multiprocessing import Pool
+
+import pytest
+
+import analyze_all
+import sam_analyze
+from Events import Rotation
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+def fakeAnalyze(output_folder, sam_file_path, **_):
+    """Test processes are forked with the patched sam_analyze.analyze, the SAM file path tells them what to do"""
+    if sam_file_path == "sleep":
+        # A stuck test with a pool: pids of workers are saved to check that they are killed with the test
+        pool = Pool(2)
+        with open(os.path.join(output_folder, "pids.txt"), 'w', encoding="utf-8") as pids_file:
+            pids_file.write(" ".join(str(worker.pid) for worker in pool._pool))
+        pool.map(sleep, (1000, 1000))
+    elif sam_file_path == "error":
+        raise ValueError("Broken test")
+    return [Rotation(1, 2), Rotation(3, 4)]
+
+
+def alive(pid):
+    """The process exists and is not a zombie"""
+    try:
+        with open("/proc/{}/stat".format(pid), encoding="utf-8") as stat_file:
+            return stat_file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc") or not hasattr(os, "killpg"), reason="process groups and /proc are needed")
+def test_run_tests(tmp_path, monkeypatch):
+    monkeypatch.setattr(sam_analyze, "analyze", fakeAnalyze)
+    monkeypatch.setattr(analyze_all, "RENDER", False)
+    tests = [{"output_folder": str(tmp_path / name), "sam_file_path": name} for name in ("sleep", "error", "ok")]
+
+    start_time = time.time()
+    results = analyze_all.runTests(tests, processes=3, timeout=3)
+    assert time.time() - start_time < 30
+
+    assert {folder: result[0] for folder, result in results.items()} == {
+        str(tmp_path / "sleep"): "timeout", str(tmp_path / "error"): "error", str(tmp_path / "ok"): "ok"
+    }
+    assert results[str(tmp_path / "ok")][3] == {"Rotation": 2}
+    assert "ValueError: Broken test" in (tmp_path / "error" / "log.txt").read_text(encoding="utf-8")
+
+    # Workers of the stuck test are killed with it
+    pids = (tmp_path / "sleep" / "pids.txt").read_text(encoding="utf-8").split()
+    assert len(pids) == 2
+    for _ in range(50):
+        if not any(alive(pid) for pid in pids):
+            break
+        time.sleep(0.1)
+    assert not any(alive(pid) for pid in pids)
+
+
+def test_skip_tests(tmp_path, capsys):
+    (tmp_path / "present.sam").write_text("", encoding="utf-8")
+    tests = [
+        {"output_folder": "tests/present", "sam_file_path": str(tmp_path / "present.sam")},
+        {"output_folder": "tests/missing", "sam_file_path": str(tmp_path / "missing.sam")},
+    ]
+
+    results = analyze_all.skipTests(tests)
+    assert results == {"tests/missing": ("skipped", None, None, {})}
+
+    results["tests/present"] = ("ok", 1.5, 100.0, {"Rotation": 2})
+    analyze_all.writeSummary(tests, results, str(tmp_path / "summary.txt"))
+    assert (tmp_path / "summary.txt").read_text(encoding="utf-8").splitlines() == [
+        "Test          | Status  | Time, s | Peak RSS, MB | Events",
+        "tests/present | ok      | 1.5     | 100          | 2 Rotation",
+        "tests/missing | skipped | -       | -            | -",
+    ]
@@ -0,0 +1,98 @@
+from functools import cmp_to_key
+import random
+import os
+
+import pytest
+
+from BWT.BWT import bwt, ibwt, ibwtBlocks, suffixArray
+from conftest import ROOT
+
+
+def readText(filename):
+    with open(os.path.join(ROOT, "src", "BWT", filename), 'r', encoding="utf-8") as file:
+        return file.read().strip().replace("\n", ' ')
+
+
+def randomText(seed, alphabet, length):
+    rng = random.Random(seed)
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+TEXTS = [
+    "", "a", "banana", "mississippi", "aaaaaaaaaa", "abababababab", "abcabcabcab", "héllo wörld ✓",
+    readText("BWT_test_small.txt"), readText("BWT_test.txt")[:300],
+    *(randomText(seed, "ACGT", 200) for seed in range(5)),
+    *(randomText(seed, "ab", 64) for seed in range(5)),
+    randomText(0, "".join(chr(code) for code in range(0x4E00, 0x4E00 + 300)), 1000)  # More than 256 distinct characters
+]
+
+
+def naiveBwt(s):
+    """Rotations of s + "$" sorted by comparing characters one by one (as BWT.py did)"""
+    s = s + "$"
+    n = len(s)
+    s_int = [ord(char) for char in s]
+
+    def comp(x, y):
+        for i in range(n):
+            res = s_int[(x + i) % n] - s_int[(y + i) % n]
+            if res:
+                return -1 if res < 0 else 1
+        return 0
+
+    starts = sorted(range(n), key=cmp_to_key(comp))
+    return "".join(s[(start + n - 1) % n] for start in starts)
+
+
+def naiveIbwt(s):
+    """Follows the stable sort of the last column from "$" (as BWT.py did)"""
+    permutation = sorted((char, index) for index, char in enumerate(s))
+    k = s.find('$')
+    text = []
+    for _ in range(len(s) - 1):
+        char, k = permutation[k]
+        text.append(char)
+    return "".join(text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_bwt(text):
+    assert bwt(text) == naiveBwt(text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_suffix_array(text):
+    assert suffixArray(text).tolist() == sorted(range(len(text)), key=lambda start: text[start:])
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_ibwt(text):
+    encoded = bwt(text)
+    assert ibwt(encoded) == naiveIbwt(encoded) == text
+
+
+@pytest.mark.parametrize("block_size", (1, 7, 1 << 20))
+def test_ibwt_blocks(block_size):
+    text = readText("BWT_test.txt")
+    encoded = bwt(text)
+
+    blocks = list(ibwtBlocks(encoded, block_size))
+    assert "".join(blocks) == ibwt(encoded, block_size) == text
+    assert all(len(block) == block_size for block in blocks[:-1])
+
+
+def test_ibwt_without_sentinel():
+    with pytest.raises(ValueError):
+        ibwt("abc")
+
+
+def test_bytes():
+    text = randomText(0, "ACGT", 200)
+    assert bwt(text.encode("ascii")) == naiveBwt(text).encode("ascii")
+    assert bwt(bytearray(b"banana")) == b"annb$aa"
+    assert ibwt(bwt(text.encode("ascii"))) == text.encode("ascii")
+
+
+def test_sentinel_in_text():
+    with pytest.raises(ValueError):
+        bwt("a$b")
@@ -0,0 +1,117 @@
+from contextlib import redirect_stdout
+from json import load as json_load
+import io
+import os
+
+import numpy as np
+
+import Cache
+import sam_analyze
+from SAM import readSegments
+from FASTA import readIndex
+from Pipeline import Genomes, countLines, countShiftAndRotations
+from test_events import SETTINGS
+
+
+LINES_SETTINGS = {"lines_method": "chain", "lines_join_size": 103, "dot_skip_rate": 10, "line_min_size": 100, "processes": 1}
+
+
+def syntheticShift(synthetic_sample):
+    paths = synthetic_sample(genome_length=20000, event_counts={"deletion": 1, "inversion": 1}, min_size=500, max_size=500, seed=3, rotation=7000)
+    genomes = Genomes("query", readIndex(paths["query_genome_path"])[0].length, "ref", readIndex(paths["ref_genome_path"])[0].length)
+
+    with redirect_stdout(io.StringIO()):
+        lines = countLines(readSegments(paths["sam_file_path"], 1), None, genomes, LINES_SETTINGS)
+        shift, _, _ = countShiftAndRotations([line.copy() for line in lines], genomes, LINES_SETTINGS)
+    return lines, shift
+
+
+def linesState(lines):
+    return [(line.coords, line.dots.tolist(), line.stats) for line in lines]
+
+
+def saveAndLoad(tmp_path, arrays):
+    """Arrays after a round trip through a cache file"""
+    Cache.save("key", str(tmp_path / "cache"), **arrays)
+    return Cache.load("key", str(tmp_path / "cache"))
+
+
+def test_lines_round_trip(synthetic_sample, tmp_path):
+    lines, _ = syntheticShift(synthetic_sample)
+    assert lines
+
+    assert linesState(Cache.arraysToLines(saveAndLoad(tmp_path, Cache.linesToArrays(lines)))) == linesState(lines)
+    assert Cache.arraysToLines(saveAndLoad(tmp_path, Cache.linesToArrays([]))) == []
+
+
+def test_shift_round_trip(synthetic_sample, tmp_path):
+    _, shift = syntheticShift(synthetic_sample)
+    assert shift.rotation_actions and shift.d_x != 1
+
+    lines, rotated_lines, rotation_actions, d_x = Cache.arraysToShift(saveAndLoad(tmp_path, Cache.shiftToArrays(*shift)))
+
+    assert linesState(lines) == linesState(shift.lines)
+    assert linesState(rotated_lines) == linesState(shift.rotated_lines)
+    assert [(action.start_line, action.end_line, action.rotation_center) for action in rotation_actions] == \
+        [(action.start_line, action.end_line, action.rotation_center) for action in shift.rotation_actions]
+    assert d_x == shift.d_x
+
+
+def test_evict_least_recently_used(tmp_path):
+    folder = str(tmp_path)
+    for index in range(4):
+        Cache.save(str(index), folder, cache_size=1 << 30, data=np.zeros(1000, dtype=np.int64))
+        os.utime(os.path.join(folder, "{}.npz".format(index)), (1000 + index, 1000 + index))
+    file_size = os.path.getsize(os.path.join(folder, "0.npz"))
+
+    # A hit makes the file the most recently used one
+    assert Cache.load("0", folder) is not None
+
+    Cache.evict(folder, cache_size=2 * file_size)
+    assert sorted(os.listdir(folder)) == ["0.npz", "3.npz"]
+
+    Cache.evict(folder, cache_size=0)
+    assert os.listdir(folder) == []
+
+
+def test_truncated_file_is_miss(tmp_path):
+    folder = str(tmp_path)
+    Cache.save("key", folder, data=np.arange(10000))
+    path = os.path.join(folder, "key.npz")
+
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) // 2)
+
+    assert Cache.load("key", folder) is None
+    assert Cache.load("missing", folder) is None
+
+
+def stageCounts(folder):
+    with open(os.path.join(folder, "report.json"), 'r', encoding="utf-8") as report_file:
+        return {stage["stage"]: stage["counts"] for stage in json_load(report_file)["stages"]}
+
+
+def test_stage_keys(synthetic_sample, tmp_path, monkeypatch):
+    paths = synthetic_sample(genome_length=20000, event_counts={"deletion": 1}, min_size=500, max_size=500, seed=4)
+    del paths["truth_path"]
+    monkeypatch.chdir(tmp_path)  # cache/ is created in the working directory
+
+    def run(name, **settings):
+        folder = str(tmp_path / name)
+        os.makedirs(folder)
+        with redirect_stdout(io.StringIO()):
+            sam_analyze.analyze(**paths, show_plot=False, output_folder=folder, settings=dict(SETTINGS, cache=True, **settings), render=False)
+        with open(os.path.join(folder, "history.txt"), 'r', encoding="utf-8") as history_file:
+            return stageCounts(folder), history_file.read()
+
+    counts, history = run("first")
+    assert not counts["sam"]["cached"] and not counts["lines"]["cached"] and not counts["shift"]["cached"]
+
+    # Settings not used by cached stages: the shift stage is loaded, earlier stages are skipped
+    counts, cached_history = run("second", grid_size=10)
+    assert counts["shift"]["cached"] and "sam" not in counts and "lines" not in counts
+    assert cached_history == history
+
+    # A setting of the lines stage changes the keys of lines and shift, segments are still cached
+    counts, _ = run("third", line_min_size=150)
+    assert counts["sam"]["cached"] and not counts["lines"]["cached"] and not counts["shift"]["cached"]
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from SAM import readSegments
+from Dots import segmentDots
+from FASTA import readIndex
+from Line import buildLines
+from Chaining import chainSegments
+from utils import distance2, linearApproxDots
+from conftest import ROOT, TESTS
+
+
+class NaiveLine:
+    def __init__(self, dot):
+        self.dots = [dot]
+
+    @property
+    def coords(self):
+        return self.start_x, self.start_y, self.end_x, self.end_y
+
+
+def naiveLines(dots, lines_join_size):
+    """Dots joined into lines one by one, every dot is checked against all lines (as sam_analyze.py did)"""
+    lines = []
+    for x, y in dots:
+        for line in lines:
+            if distance2(x, y, *line.dots[-1]) <= lines_join_size ** 2 and \
+                    (len(line.dots) == 1 or distance2(x, y, *line.dots[-2]) <= lines_join_size ** 2):
+                line.dots.append([x, y])
+                break
+        else:
+            lines.append(NaiveLine([x, y]))
+
+    for line in lines:
+        line.dots.sort()
+        line.start_x, line.start_y = line.dots[0]
+        line.end_x, line.end_y = line.dots[-1]
+
+        if len(line.dots) >= 2:
+            k, b = linearApproxDots(line.dots)
+            line.start_y = int(k * line.start_x + b)
+            line.end_y = int(k * line.end_x + b)
+
+    return lines
+
+
+def linesCoords(lines, line_min_size):
+    """Coordinates of lines not shorter than line_min_size, sorted by start (as in Pipeline.countLines)"""
+    coords = [
+        tuple(int(value) for value in line.coords) for line in lines
+        if distance2(line.start_x, line.start_y, line.end_x, line.end_y) >= line_min_size ** 2
+    ]
+    return np.array(sorted(coords), dtype=np.int64).reshape(-1, 4)
+
+
+def chainedAndJoined(segments, ref_genome_length, lines_join_size, line_min_size, dot_skip_rate):
+    chained = chainSegments(segments, ref_genome_length, lines_join_size, dot_skip_rate)
+    joined = buildLines(segmentDots(segments, ref_genome_length, dot_skip_rate).tolist(), lines_join_size)
+    return linesCoords(chained, line_min_size), linesCoords(joined, line_min_size)
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_small_samples(test):
+    segments = readSegments(os.path.join(ROOT, "BWA", "small", test, "bwa_output.sam"), 1)
+    ref_genome_length = readIndex(os.path.join(ROOT, "samples", "small", "{}.fasta".format(test)))[0].length
+
+    chained, joined = chainedAndJoined(segments, ref_genome_length, 5, 10, 1)
+    naive = linesCoords(naiveLines(segmentDots(segments, ref_genome_length).tolist(), 5), 10)
+    assert len(naive)
+    np.testing.assert_array_equal(chained, naive)
+    np.testing.assert_array_equal(joined, naive)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("dot_skip_rate", (1, 10))
+def test_synthetic(seed, dot_skip_rate, synthetic_sample):
+    event_counts = {"deletion": 1, "insertion": 1, "inversion": 1, "duplication": 1, "translocation": 1}
+    paths = synthetic_sample(genome_length=20000, event_counts=event_counts, min_size=500, max_size=800, seed=seed)
+
+    segments = readSegments(paths["sam_file_path"], 1)
+    ref_genome_length = readIndex(paths["ref_genome_path"])[0].length
+
+    # Chained lines end at exact ends of segments, joined ones at the last sampled dots
+    chained, joined = chainedAndJoined(segments, ref_genome_length, 103, 100, dot_skip_rate)
+    assert chained.shape == joined.shape
+    assert np.abs(chained - joined).max() < dot_skip_rate
@@ -0,0 +1,99 @@
+from contextlib import redirect_stdout
+from json import load as json_load
+import io
+import os
+
+import numpy as np
+
+import sam_analyze
+from SAM import readSegments
+from Synthetic import generate
+from EventWriter import readEvents
+from Pipeline import readContigs, parseSegments, splitPairs
+from test_events import SETTINGS
+
+
+# Two samples with their own events are joined into genomes of two contigs: query "chr1", "chr2", ref (reads) "read1", "read2"
+CONTIGS = (("chr1", "read1", {"deletion": 1}, 1), ("chr2", "read2", {"inversion": 1}, 2))
+
+
+def renameFasta(path, name):
+    with open(path, 'r', encoding="utf-8") as fasta_file:
+        return ">{}\n".format(name) + "".join(line for line in fasta_file if not line.startswith(">"))
+
+
+def twoContigSample(folder):
+    """Writes genome1.fasta, genome2.fasta and simulated.sam of two contigs to folder. Returns (paths, planted events by query contig)"""
+    sq_lines, alignment_lines, query_fasta, ref_fasta, events = [], [], [], [], {}
+
+    for query_name, ref_name, event_counts, seed in CONTIGS:
+        paths = {
+            "query_genome_path": os.path.join(folder, query_name + ".fasta"),
+            "ref_genome_path": os.path.join(folder, ref_name + ".fasta"),
+            "sam_file_path": os.path.join(folder, query_name + ".sam"),
+            "truth_path": os.path.join(folder, query_name + ".json")
+        }
+        events[query_name] = generate(**paths, genome_length=20000, event_counts=event_counts, min_size=500, max_size=500, seed=seed)
+
+        query_fasta.append(renameFasta(paths["query_genome_path"], query_name))
+        ref_fasta.append(renameFasta(paths["ref_genome_path"], ref_name))
+
+        with open(paths["sam_file_path"], 'r', encoding="utf-8") as sam_file:
+            for line in sam_file:
+                fields = line.split("\t")
+                if line.startswith("@SQ"):
+                    sq_lines.append("@SQ\tSN:{}\t{}".format(query_name, fields[2]))
+                elif not line.startswith("@"):
+                    alignment_lines.append("\t".join([ref_name, fields[1], query_name] + fields[3:]))
+
+    paths = {
+        "query_genome_path": os.path.join(folder, "genome1.fasta"),
+        "ref_genome_path": os.path.join(folder, "genome2.fasta"),
+        "sam_file_path": os.path.join(folder, "simulated.sam")
+    }
+    for path, lines in ((paths["query_genome_path"], query_fasta), (paths["ref_genome_path"], ref_fasta), (paths["sam_file_path"], sq_lines + alignment_lines)):
+        with open(path, 'w', encoding="utf-8") as file:
+            file.write("".join(lines))
+
+    return paths, events
+
+
+def test_split_pairs(tmp_path):
+    paths, _ = twoContigSample(str(tmp_path))
+    query_contigs, ref_contigs = readContigs(paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"])
+    assert [contig.name for contig in query_contigs] == ["chr1", "chr2"] and [contig.name for contig in ref_contigs] == ["read1", "read2"]
+
+    settings = {"min_rid_size": 1, "line_min_size": 100}
+    segments, query_names, ref_names = parseSegments(paths["sam_file_path"], settings)
+    pairs = splitPairs(segments, query_names, ref_names, query_contigs, ref_contigs, settings)
+
+    # Every pair has exactly the segments of its own sample
+    assert [(pair.query, pair.ref) for pair in pairs] == [(0, 0), (1, 1)]
+    for pair, (query_name, _, _, _) in zip(pairs, CONTIGS):
+        own = readSegments(str(tmp_path / (query_name + ".sam")), settings["min_rid_size"])
+        np.testing.assert_array_equal(pair.segments[["query_pos", "ref_pos", "length", "reverse"]], own[["query_pos", "ref_pos", "length", "reverse"]])
+
+
+def test_two_contigs(tmp_path):
+    paths, events = twoContigSample(str(tmp_path))
+    folder = str(tmp_path / "output")
+
+    with redirect_stdout(io.StringIO()):
+        sam_analyze.analyze(**paths, show_plot=False, output_folder=folder, settings=dict(SETTINGS, processes=2), render=False)
+
+    with open(os.path.join(folder, "report.json"), 'r', encoding="utf-8") as report_file:
+        report = json_load(report_file)
+    assert [(pair["query"], pair["ref"], pair["folder"]) for pair in report["pairs"]] == [("chr1", "read1", "chr1_read1"), ("chr2", "read2", "chr2_read2")]
+
+    # Events of every pair are found on its own contig at the planted positions (1-based closed intervals)
+    records = list(readEvents(os.path.join(folder, "events.jsonl")))
+    found = {(record["query"], record["ref"], record["type"], record["query_start"], record["query_end"]) for record in records}
+    for (query_name, ref_name, _, _), (event_type, record_type) in zip(CONTIGS, (("deletion", "Deletion"), ("inversion", "Rotation"))):
+        event = next(event for event in events[query_name] if event["type"] == event_type)
+        assert (query_name, ref_name, record_type, event["start"] + 1, event["start"] + event["length"]) in found
+
+    # Combined events are the events of pair folders, BED rows are on their query contigs
+    pair_records = [record for pair in report["pairs"] for record in readEvents(os.path.join(folder, pair["folder"], "events.jsonl"))]
+    assert sorted(map(str, records)) == sorted(map(str, pair_records))
+    with open(os.path.join(folder, "events.bed"), 'r', encoding="utf-8") as bed_file:
+        assert [line.split("\t")[0] for line in bed_file] == [record["query"] for record in records]
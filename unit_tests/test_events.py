@@ -0,0 +1,120 @@
+from contextlib import redirect_stdout
+from json import load as json_load
+import io
+import os
+
+import sam_analyze
+from Synthetic import readTruth
+from EventWriter import EventWriter, readEvents
+from Events import Rotation, Deletion
+from Line import Line
+from Pipeline import Genomes, eventRecords
+
+
+SETTINGS = {
+    "grid_size": 1000,
+    "min_rid_size": 1,
+    "dot_skip_rate": 1,
+    "dotsize": 0.1,
+    "fontsize": 8,
+    "figsize": (10, 7),
+
+    "min_event_size": 100,
+    "lines_join_size": "$min_event_size + 3",
+    "line_min_size": "$min_event_size",
+    "lines_method": "chain",
+    "processes": 1,
+    "plot_method": "scatter",
+    "history_png": False,
+    "history_gif": False,
+    "cache": False,
+    "profile": False,
+    "trace_memory": False
+}
+
+
+def analyzeSynthetic(synthetic_sample, rotation):
+    """Planted deletion and inversion, genome1 starts from rotation. Returns (planted events by type, found records by type, report)"""
+    paths = synthetic_sample(genome_length=20000, event_counts={"deletion": 1, "inversion": 1}, min_size=500, max_size=500, seed=1, rotation=rotation)
+    folder = os.path.dirname(paths["truth_path"])
+
+    with redirect_stdout(io.StringIO()):
+        sam_analyze.analyze(
+            paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"],
+            show_plot=False, output_folder=folder, settings=dict(SETTINGS), render=False
+        )
+
+    with open(os.path.join(folder, "report.json"), 'r', encoding="utf-8") as report_file:
+        report = json_load(report_file)
+
+    events = {event["type"]: event for event in readTruth(paths["truth_path"])}
+    records = {}
+    for record in readEvents(os.path.join(folder, "events.jsonl")):
+        records.setdefault(record["type"], []).append(record)
+
+    return events, records, report
+
+
+def checkPositions(events, records):
+    # 1-based closed intervals of the planted bases (truth is 0-based half-open)
+    for event_type, record_type in (("deletion", "Deletion"), ("inversion", "Rotation")):
+        event = events[event_type]
+        assert [(record["query_start"], record["query_end"], record["size"]) for record in records[record_type]] == [
+            (event["start"] + 1, event["start"] + event["length"], event["length"])
+        ]
+
+
+def test_event_positions_on_shifted_query(synthetic_sample):
+    # The ref starts in the middle of genome1: lines are shifted (start_line is not 0), records are moved back
+    events, records, report = analyzeSynthetic(synthetic_sample, rotation=7000)
+
+    shift_counts = next(stage["counts"] for stage in report["stages"] if stage["stage"] == "shift")
+    assert shift_counts["start_line"] != 0
+    assert shift_counts["d_x"] == 20000 - 7000 + 1
+
+    checkPositions(events, records)
+
+
+def test_event_positions_without_rotation(synthetic_sample):
+    events, records, _ = analyzeSynthetic(synthetic_sample, rotation=0)
+
+    checkPositions(events, records)
+
+
+def test_event_records_across_query_end():
+    # Query of 1000 bases shifted by d_x 901: X 0 is base 901, X 99 is base 1000, X 100 is base 1
+    genomes = Genomes("q", 1000, "r", 1000)
+    lines = [Line(0, 0, 49, 49), Line(50, 149, 149, 50), Line(150, 150, 999, 999)]
+    history = [Rotation(1, 1), Deletion(start_x=80, start_y=80, length=41)]
+
+    records = list(eventRecords(lines, history, genomes, d_x=901))
+
+    assert [(record["index"], record["query_start"], record["query_end"], record["size"]) for record in records] == [
+        (0, 951, 1000, 50), (0, 1, 50, 50),
+        (1, 982, 1000, 19), (1, 1, 21, 21)
+    ]
+    for record in records:
+        assert record["size"] == record["query_end"] - record["query_start"] + 1
+
+    # A rotation longer than the query (X 50..1149) covers it once: 951..1000 and 1..950
+    lines[1] = Line(50, 1149, 1149, 50)
+    assert [(record["query_start"], record["query_end"], record["size"]) for record in eventRecords(lines, history[:1], genomes, d_x=901)] == [
+        (951, 1000, 50), (1, 950, 950)
+    ]
+
+
+def test_event_writer_coordinates(tmp_path):
+    records = [
+        {"index": 0, "type": "Deletion", "query": "q", "ref": "r", "query_start": 101, "query_end": 200, "ref_start": 100, "ref_end": 100, "size": 100},
+        {"index": 1, "type": "Insertion", "query": "q", "ref": "r", "query_start": 300, "query_end": 300, "ref_start": 201, "ref_end": 250, "size": 50},
+        {"index": 2, "type": "Rotation", "query": "q", "ref": "r", "query_start": 1, "query_end": 10, "ref_start": None, "ref_end": None, "size": 10}
+    ]
+    with EventWriter(str(tmp_path / "events"), ("bed", "vcf")) as writer:
+        writer.writeAll(records)
+
+    with open(tmp_path / "events.bed", 'r', encoding="utf-8") as bed_file:
+        assert [line.split("\t")[1:3] for line in bed_file] == [["100", "200"], ["300", "300"], ["0", "10"]]
+
+    with open(tmp_path / "events.vcf", 'r', encoding="utf-8") as vcf_file:
+        rows = [line.split("\t") for line in vcf_file if not line.startswith("#")]
+    assert [(row[1], row[7].split(";")[1]) for row in rows] == [("100", "END=200"), ("300", "END=300"), ("1", "END=10")]
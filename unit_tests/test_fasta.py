@@ -0,0 +1,100 @@
+import random
+import os
+
+import pytest
+
+from FASTA import FastaRecord, buildIndex, readIndex, readTitle, fetch, indexPath
+from Pipeline import readContigs
+from conftest import ROOT, TESTS
+
+
+def fastaText(records, line_width):
+    """FASTA text of [(title, sequence)] with lines of line_width bases (the last line of a record is shorter)"""
+    return "".join(
+        ">{}\n".format(title) + "".join(sequence[start:start + line_width] + "\n" for start in range(0, len(sequence), line_width))
+        for title, sequence in records
+    )
+
+
+def randomSequence(rng, length):
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+@pytest.fixture
+def regularFasta(tmp_path):
+    rng = random.Random(0)
+    records = [("chr1 first contig", randomSequence(rng, 1003)), ("chr2", randomSequence(rng, 60)), ("chr3", randomSequence(rng, 7))]
+    path = str(tmp_path / "genome.fasta")
+    with open(path, 'w', encoding="utf-8") as fasta_file:
+        fasta_file.write(fastaText(records, 60))
+    return path, records
+
+
+def test_index(regularFasta):
+    path, records = regularFasta
+
+    # name, length, offset of the first base, bases and bytes per line (as samtools faidx)
+    offset_2 = len(">chr1 first contig\n") + 1003 + 17 + len(">chr2\n")
+    offset_3 = offset_2 + 61 + len(">chr3\n")
+    assert buildIndex(path) == [
+        FastaRecord("chr1", 1003, len(">chr1 first contig\n"), 60, 61), FastaRecord("chr2", 60, offset_2, 60, 61), FastaRecord("chr3", 7, offset_3, 7, 8)
+    ]
+    assert [readTitle(path, record) for record in buildIndex(path)] == [title for title, _ in records]
+
+
+def test_fetch(regularFasta):
+    path, records = regularFasta
+    rng = random.Random(1)
+
+    for record, (_, sequence) in zip(readIndex(path), records):
+        assert fetch(path, record) == sequence
+        for _ in range(50):
+            start, end = sorted(rng.randrange(len(sequence) + 5) for _ in range(2))
+            assert fetch(path, record, start, end) == sequence[start:end]
+
+
+def test_index_file_reused_by_mtime(regularFasta):
+    path, _ = regularFasta
+    records = readIndex(path)
+    assert os.path.exists(indexPath(path))
+
+    # An index not older than the FASTA file is read as it is
+    fake = [record._replace(length=record.length + 1) for record in records]
+    with open(indexPath(path), 'w', encoding="utf-8") as index_file:
+        index_file.write("".join("\t".join(map(str, record)) + "\n" for record in fake))
+    os.utime(indexPath(path), (os.path.getmtime(path) + 10,) * 2)
+    assert readIndex(path) == fake
+
+    # An older index is built again
+    os.utime(path, (os.path.getmtime(indexPath(path)) + 10,) * 2)
+    assert readIndex(path) == records
+
+
+def test_irregular_lines(tmp_path):
+    sequences = ["ACGTACGTAC" + "GGG" + "TTTTTTTTTT", "ACGT" * 5]
+    path = str(tmp_path / "irregular.fasta")
+    with open(path, 'w', encoding="utf-8") as fasta_file:
+        fasta_file.write(">irregular\nACGTACGTAC\nGGG\nTTTTTTTTTT\n>regular\n" + "ACGT" * 5 + "\n")
+
+    records = readIndex(path)
+    assert [(record.name, record.length, record.line_bases, record.line_width) for record in records] == [("irregular", 23, 0, 0), ("regular", 20, 20, 21)]
+
+    # Such index would not be valid for other tools, it is not saved
+    assert not os.path.exists(indexPath(path))
+
+    for record, sequence in zip(records, sequences):
+        assert fetch(path, record, 5, 15) == sequence[5:15]
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_contigs_from_sam(test):
+    """Without FASTA files lengths are taken from @SQ LN of the query and from CIGAR of the reads"""
+    query_genome_path = os.path.join(ROOT, "samples", "small", "source.fasta")
+    ref_genome_path = os.path.join(ROOT, "samples", "small", "{}.fasta".format(test))
+    sam_file_path = os.path.join(ROOT, "BWA", "small", test, "bwa_output.sam")
+
+    query_contigs, ref_contigs = readContigs(None, None, sam_file_path)
+    fasta_query_contigs, fasta_ref_contigs = readContigs(query_genome_path, ref_genome_path, sam_file_path)
+
+    assert [(contig.name, contig.length) for contig in query_contigs] == [(contig.name, contig.length) for contig in fasta_query_contigs]
+    assert [contig.length for contig in ref_contigs] == [contig.length for contig in fasta_ref_contigs]
@@ -0,0 +1,168 @@
+from contextlib import redirect_stdout
+from copy import deepcopy
+import random
+import io
+import os
+
+import numpy as np
+import pytest
+
+from SAM import readSegments
+from FASTA import readIndex
+from Events import Rotation, Insertion, Deletion, Translocation, Duplication, Pass
+from Pipeline import Genomes, countLines, countShiftAndRotations, findEvents, historyActions, historyFrames
+from EventTable import EventTable
+from conftest import ROOT, TESTS
+
+
+SMALL_SETTINGS = {"lines_method": "chain", "lines_join_size": 5, "dot_skip_rate": 1, "line_min_size": 10, "min_event_size": 3, "processes": 1}
+SYNTHETIC_SETTINGS = {"lines_method": "chain", "lines_join_size": 103, "dot_skip_rate": 1, "line_min_size": 100, "min_event_size": 100, "processes": 1}
+
+
+def historyInputs(query_genome_path, ref_genome_path, sam_file_path, settings):
+    """Lines, rotated lines and history as sam_analyze.py makes them"""
+    genomes = Genomes("query", readIndex(query_genome_path)[0].length, "ref", readIndex(ref_genome_path)[0].length)
+    segments = readSegments(sam_file_path, 1)
+
+    with redirect_stdout(io.StringIO()):
+        lines = countLines(segments, None, genomes, settings)
+        shift, _, _ = countShiftAndRotations(lines, genomes, settings)
+
+    events = findEvents(shift.rotated_lines, settings)
+    return shift.lines, shift.rotated_lines, historyActions(shift, events)
+
+
+def naiveHistoryFrames(lines, rotated_lines, history):
+    """Dots of lines and coordinates of all later events are changed by every action (as sam_analyze.py did)"""
+    for action_index, action in enumerate(history):
+        later = history[action_index + 1:]
+
+        if isinstance(action, Rotation):
+            for line_index in range(action.start_line, action.end_line + 1):
+                lines[line_index].rotateY(action.rotation_center, line=False, dots=True)
+
+        elif isinstance(action, Insertion):
+            for line in rotated_lines:
+                line.dots[line.dots[:, 0] > action.start_x, 1] -= round(action.height)
+                line.dots = line.dots[line.dots[:, 0] != action.start_x]
+
+            for event in later:
+                if event.start_x >= action.start_x:
+                    event.start_y -= action.height
+
+        elif isinstance(action, Deletion):
+            for line in rotated_lines:
+                line.dots[line.dots[:, 0] >= action.start_x + action.length, 0] -= round(action.length)
+
+            for event in later:
+                if event.start_x >= action.start_x + action.length:
+                    event.start_x -= action.length
+
+        elif isinstance(action, Duplication):
+            duplicated_dots = rotated_lines[action.line_index].dots
+            rotated_lines[action.line_index].dots = duplicated_dots[
+                (duplicated_dots[:, 0] < action.start_x) | (duplicated_dots[:, 0] > action.start_x + action.length)
+            ]
+
+            for line in rotated_lines:
+                line.dots[line.dots[:, 0] >= action.start_x, 1] -= round(action.height)
+
+            for event in later:
+                if event.start_x >= action.start_x:
+                    event.start_y -= action.height
+
+        elif isinstance(action, Translocation):
+            for line in rotated_lines:
+                line.dots[line.dots[:, 0] > action.start_x, 1] += round(action.height)
+                line.dots = line.dots[line.dots[:, 0] != action.start_x]
+
+            for event in later:
+                if event.start_x >= action.start_x:
+                    event.start_y += action.height
+
+        if isinstance(action, (Pass, Rotation)):
+            yield [line.dots.copy() for line in lines]
+        else:
+            bottom = min((int(line.dots[:, 1].min()) for line in rotated_lines if len(line.dots)), default=0)
+
+            for line in rotated_lines:
+                line.shift(dy=-bottom)
+
+            for event in later:
+                if hasattr(event, "start_x") and hasattr(event, "start_y") and event.start_x >= action.start_x:
+                    event.start_y += bottom
+
+            yield [line.dots.copy() for line in rotated_lines]
+
+
+def checkReplay(lines, rotated_lines, history):
+    naive_lines, naive_rotated_lines, naive_history = deepcopy((lines, rotated_lines, history))
+
+    frames = list(historyFrames(lines, rotated_lines, history))
+    naive_frames = list(naiveHistoryFrames(naive_lines, naive_rotated_lines, naive_history))
+
+    assert len(frames) == len(naive_frames) == len(history)
+    for frame_dots, naive_frame_dots in zip(frames, naive_frames):
+        assert len(frame_dots) == len(naive_frame_dots)
+        for dots, naive_dots in zip(frame_dots, naive_frame_dots):
+            np.testing.assert_array_equal(dots, naive_dots)
+
+    # Coordinates of every event at its turn
+    assert [(action.start_x, action.start_y) for action in history if hasattr(action, "start_x")] == \
+        [(action.start_x, action.start_y) for action in naive_history if hasattr(action, "start_x")]
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_small_samples(test):
+    checkReplay(*historyInputs(
+        os.path.join(ROOT, "samples", "small", "source.fasta"),
+        os.path.join(ROOT, "samples", "small", "{}.fasta".format(test)),
+        os.path.join(ROOT, "BWA", "small", test, "bwa_output.sam"),
+        SMALL_SETTINGS
+    ))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_synthetic(seed, synthetic_sample):
+    event_counts = {"deletion": 2, "insertion": 2, "inversion": 1, "duplication": 1, "translocation": 1}
+    paths = synthetic_sample(genome_length=30000, event_counts=event_counts, min_size=300, max_size=800, seed=seed)
+
+    lines, rotated_lines, history = historyInputs(
+        paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"], SYNTHETIC_SETTINGS
+    )
+    assert len(history) > 3
+    checkReplay(lines, rotated_lines, history)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_event_table(seed):
+    # Every move is applied to all events with X >= from_x one by one
+    rng = random.Random(seed)
+    events = [Pass(), Rotation(0, 0)]
+    for _ in range(rng.randint(1, 30)):
+        start_x, start_y, size = rng.randint(0, 1000), rng.randint(0, 1000), rng.randint(1, 100)
+        events.append(rng.choice((
+            Insertion(start_x, start_y, size),
+            Deletion(start_x, start_y, size),
+            Translocation(start_x, start_y, size),
+            Duplication(start_x, start_y, size, size, 0)
+        )))
+
+    table = EventTable(events)
+    coords = {index: [event.start_x, event.start_y] for index, event in enumerate(events) if hasattr(event, "start_x")}
+
+    for _ in range(50):
+        from_x, offset, axis = rng.randint(-10, 1010), rng.randint(-200, 200), rng.randint(0, 1)
+        if axis == 0:
+            table.moveX(from_x, offset)
+        else:
+            table.moveY(from_x, offset)
+
+        for event_coords in coords.values():
+            if event_coords[0] >= from_x:
+                event_coords[axis] += offset
+
+        assert {index: list(table.coords(index)) for index in coords} == coords
+        # Events stay sorted by X, so the next from_x finds them by binary search
+        xs = [table.coords(index)[0] for index in table.indexes]
+        assert xs == sorted(xs)
@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+import pytest
+
+from Line import Line, buildLines
+from Chaining import chainSegments
+from SAM import readSegments
+from FASTA import readIndex
+from utils import dotsStats, linearApproxDots, linearApproxLines
+import Cache
+import Events
+
+
+def randomLine(rng, scale):
+    start_x, start_y, direction = rng.randrange(scale), rng.randrange(scale), rng.choice((-1, 1))
+    dots = [[start_x + i, start_y + i * direction + rng.randrange(-3, 4)] for i in range(rng.randrange(2, 50))]
+    return Line(dots[0][0], dots[0][1], dots[-1][0], dots[-1][1], dots=dots)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("scale", (100, 10 ** 9))
+def test_stats_after_shift_and_rotation(seed, scale):
+    rng = random.Random(seed)
+    line = randomLine(rng, scale)
+
+    for _ in range(20):
+        if rng.random() < 0.5:
+            line.shift(dx=rng.randrange(-scale, scale), dy=rng.randrange(-scale, scale))
+        else:
+            line.rotateY(rng.randrange(scale), line=rng.random() < 0.5, dots=True)
+        assert line.stats == dotsStats(line.dots)
+
+    copy = line.copy()
+    copy.shift(dx=1)
+    assert line.stats == dotsStats(line.dots) and copy.stats == dotsStats(copy.dots)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fit_and_lines_approximation(seed):
+    rng = random.Random(seed)
+    lines = [randomLine(rng, 1000) for _ in range(5)]
+    for line in lines:
+        line.shift(dx=rng.randrange(1000))
+
+    assert linearApproxLines(lines) == pytest.approx(linearApproxDots(np.concatenate([line.dots for line in lines])))
+
+    dots = sorted(map(tuple, lines[0].dots.tolist()))
+    line, = buildLines(dots, 20)
+    k, b = linearApproxDots(dots)
+    assert (line.start_y, line.end_y) == (int(k * line.start_x + b), int(k * line.end_x + b))
+
+
+def test_cached_stats_of_chained_lines(synthetic_sample):
+    # Stats of chained lines are counted on all dots of their segments, the cache keeps them instead of recounting sampled dots
+    paths = synthetic_sample(genome_length=20000, event_counts={"inversion": 1}, min_size=500, max_size=500, seed=0)
+    lines = chainSegments(readSegments(paths["sam_file_path"], 1), readIndex(paths["ref_genome_path"])[0].length, 103, dot_skip_rate=10)
+    assert any(line.stats != dotsStats(line.dots) for line in lines)
+
+    assert [line.stats for line in Cache.arraysToLines(Cache.linesToArrays(lines))] == [line.stats for line in lines]
+
+
+def naiveLines(dots, lines_join_size):
+    """Dots of lines joined by the rule of buildLines, every dot is checked against all lines"""
+    lines = []
+    for x, y in dots:
+        for line_dots in lines:
+            if all((x - dot_x) ** 2 + (y - dot_y) ** 2 <= lines_join_size ** 2 for dot_x, dot_y in line_dots[-2:]):
+                line_dots.append([x, y])
+                break
+        else:
+            lines.append([[x, y]])
+    return [sorted(line_dots) for line_dots in lines]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("lines_join_size", (0, 3, 20))
+def test_build_lines(seed, lines_join_size):
+    rng = random.Random(seed)
+    dots = np.concatenate([randomLine(rng, 300).dots for _ in range(20)] + [np.array([[rng.randrange(300), rng.randrange(300)] for _ in range(100)])])
+    dots = sorted(dict(dots.tolist()).items())  # One dot per X: lines of dots with one X can not be approximated
+
+    lines = buildLines(dots, lines_join_size)
+    assert [line.dots.tolist() for line in lines] == naiveLines(dots, lines_join_size)
+    assert all(line.stats == dotsStats(line.dots) for line in lines)
+
+
+def test_arrays_and_slots():
+    line = Line(0, 0, 2, 2, dots=[[0, 0], [1, 1], [2, 2]])
+    assert line.dots.dtype == np.int64 and line.dots.shape == (3, 2)
+    assert Line().dots.shape == (0, 2)
+
+    events = [Events.Rotation(0, 1), Events.Deletion(1, 2, 3), Events.Insertion(1, 2, 3), Events.Translocation(1, 2, 3),
+              Events.Duplication(1, 2, 3, 4, 0), Events.Pass()]
+    for item in [line] + events:
+        assert not hasattr(item, "__dict__")
+        with pytest.raises(AttributeError):
+            item.misspelled = 1
@@ -0,0 +1,64 @@
+from contextlib import redirect_stdout
+import subprocess
+import sys
+import io
+import os
+
+import sam_analyze
+from Pipeline import Genomes, ShiftResult, FoundEvents, readContigs, parseSegments, splitPairs, pairGenomes, countLines, \
+    countShiftAndRotations, findEvents, historyActions, historyText
+from Events import Pass
+from test_events import SETTINGS
+from conftest import ROOT
+
+
+def test_stages(synthetic_sample, tmp_path):
+    """Stages called one after another give the history of analyze"""
+    paths = synthetic_sample(genome_length=20000, event_counts={"deletion": 1, "inversion": 1}, min_size=500, max_size=500, seed=5, rotation=3000)
+    settings = dict(SETTINGS, lines_join_size=103, line_min_size=100)
+
+    with redirect_stdout(io.StringIO()):
+        query_contigs, ref_contigs = readContigs(paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"])
+        segments, query_names, ref_names = parseSegments(paths["sam_file_path"], settings)
+        pair, = splitPairs(segments, query_names, ref_names, query_contigs, ref_contigs, settings)
+        genomes = pairGenomes(query_contigs[pair.query], ref_contigs[pair.ref])
+
+        lines = countLines(pair.segments, None, genomes, settings)
+        shift, _, _ = countShiftAndRotations(lines, genomes, settings)
+        events = findEvents(shift.rotated_lines, settings)
+        history = historyActions(shift, events)
+
+        sam_analyze.analyze(
+            paths["query_genome_path"], paths["ref_genome_path"], paths["sam_file_path"],
+            show_plot=False, output_folder=str(tmp_path), settings=dict(SETTINGS), render=False
+        )
+
+    assert genomes == Genomes("genome1", 20000, "genome2", genomes.ref_length) and genomes.ref_length < 20000
+    assert isinstance(shift, ShiftResult) and isinstance(events, FoundEvents)
+    assert isinstance(history[0], Pass) and len(shift.rotation_actions) == 1
+
+    with open(str(tmp_path / "history.txt"), 'r', encoding="utf-8") as history_file:
+        assert history_file.read().split("\n\n")[:-1] == list(historyText(shift.lines, history))
+
+
+def test_headless_analyze(tmp_path):
+    """Without rendering only text and JSON files are written, matplotlib and PIL are not imported"""
+    script = """
+import sys
+sys.path[:0] = [{root!r}, {src!r}]
+from contextlib import redirect_stdout
+import io
+import sam_analyze
+with redirect_stdout(io.StringIO()):
+    sam_analyze.analyze({query!r}, {ref!r}, {sam!r}, False, {folder!r}, {settings!r}, render=False)
+print(sorted(module for module in ("matplotlib", "PIL") if module in sys.modules))
+""".format(
+        root=ROOT, src=os.path.join(ROOT, "src"), folder=str(tmp_path), settings=dict(SETTINGS, min_event_size=10),
+        query=os.path.join(ROOT, "samples", "small", "source.fasta"), ref=os.path.join(ROOT, "samples", "small", "deletion.fasta"),
+        sam=os.path.join(ROOT, "BWA", "small", "deletion", "bwa_output.sam")
+    )
+
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=str(tmp_path)).stdout
+    assert output.strip() == "[]"
+    assert not [filename for filename in os.listdir(str(tmp_path)) if filename.endswith((".png", ".gif"))]
+    assert {"history.txt", "events.jsonl", "report.json"} <= set(os.listdir(str(tmp_path)))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from Plot import Plot, DPI, DENSITY_MIN_ALPHA
+from Frames import renderFrames, GIF_SCALE
+
+
+@pytest.mark.parametrize("processes", (1, 2))
+@pytest.mark.parametrize("density", (False, True))
+def test_render_frames(tmp_path, processes, density):
+    """Two frames of a headless plot saved as PNG files and as one GIF"""
+    frames = [
+        (str(tmp_path / "000.png"), [np.array([[0, 0], [100, 100]]), np.array([[100, 0], [200, 50]])], np.array([[0, 0], [300, 300]])),
+        (str(tmp_path / "001.png"), [np.array([[0, 100], [100, 0]])], None),
+    ]
+    gif_path = str(tmp_path / "history.gif")
+
+    renderFrames(iter(frames), ("Main plot", 8, None, (2, 1.5), "query", "ref", density), 1, processes, gif_path=gif_path)
+
+    for path, _, _ in frames:
+        with Image.open(path) as png:
+            assert png.size == (2 * DPI, 1.5 * DPI)
+
+    with Image.open(gif_path) as gif:
+        assert gif.n_frames == len(frames)
+        assert gif.size == (int(2 * DPI * GIF_SCALE), int(1.5 * DPI * GIF_SCALE))
+
+
+def densityPlot(dots_by_color, limits):
+    plot = Plot("Density", 8, figsize=(4, 3), density=True, headless=True)
+    for dots, color in dots_by_color:
+        plot.scatter(dots, color=color)
+    plot.ax.set_xlim(*limits[0])
+    plot.ax.set_ylim(*limits[1])
+    plot.drawDensity()
+    return plot
+
+
+def test_density_bins():
+    # 10 x 10 pixels over [0, 100] x [0, 100]: the pixel of a dot is (y // 10) * 10 + x // 10
+    blue = np.array([[5, 5], [6, 7], [9, 9], [15, 5], [95, 95], [95, 99], [150, 5], [-1, 5]])
+    red = np.array([[55, 55]])
+    plot = densityPlot([(blue, "#00f"), (red, "#f00")], ((0, 100), (0, 100)))
+
+    (blue_pixels, blue_counts, blue_color), (red_pixels, red_counts, red_color) = plot.density_image.bins(10, 10)
+    assert (blue_pixels.tolist(), blue_counts.tolist(), blue_color) == ([0, 1, 99], [3, 1, 2], "#00f")  # Dots outside are dropped
+    assert (red_pixels.tolist(), red_counts.tolist(), red_color) == ([55], [1], "#f00")
+
+    # Image of half resolution is merged from the counted bins
+    (blue_pixels, blue_counts, _), _ = plot.density_image.bins(5, 5)
+    assert (blue_pixels.tolist(), blue_counts.tolist()) == ([0, 24], [4, 2])
+
+
+def test_density_merge_equals_binning():
+    rng = np.random.default_rng(0)
+    dots = rng.integers(0, 1000, (5000, 2))
+
+    fine = densityPlot([(dots, "#00f")], ((0, 1000), (0, 1000)))
+    fine.density_image.bins(64, 48)
+    merged = fine.density_image.bins(32, 24)
+
+    direct = densityPlot([(dots, "#00f")], ((0, 1000), (0, 1000))).density_image.bins(32, 24)
+    for (merged_pixels, merged_counts, _), (pixels, counts, _) in zip(merged, direct):
+        assert merged_pixels.tolist() == pixels.tolist() and merged_counts.tolist() == counts.tolist()
+    assert merged[0][1].sum() == len(dots)
+
+
+def test_density_image_alpha():
+    dots = np.array([[5, 5]] * 9 + [[15, 5]])
+    image = densityPlot([(dots, "#00f")], ((0, 100), (0, 100))).density_image.image(10, 10)
+
+    # The densest pixel is opaque, a pixel with one dot has DENSITY_MIN_ALPHA, empty pixels are transparent
+    assert image[0, 0].tolist() == [0, 0, 255, 255]
+    assert image[0, 1].tolist() == [0, 0, 255, round(DENSITY_MIN_ALPHA * 255)]
+    assert image[5, 5, 3] == 0
@@ -0,0 +1,59 @@
+from contextlib import redirect_stdout
+from json import load as json_load
+import io
+
+import sam_analyze
+from Report import Report
+from test_events import SETTINGS
+
+
+STAGE_KEYS = {"stage", "counts", "wall_time", "cpu_time", "cumulative_peak_rss", "cumulative_peak_rss_children", "peak_rss_increase"}
+
+
+def readReport(path):
+    with open(path, 'r', encoding="utf-8") as report_file:
+        return json_load(report_file)
+
+
+def test_stages(tmp_path):
+    report = Report(str(tmp_path / "report.json"))
+    report.stage("first")
+    report.count(items=3)
+    report.count(cached=False)
+    bytearray(50 * 1024 * 1024)
+    report.stage("second")
+    report.save(pairs=1)
+
+    data = readReport(str(tmp_path / "report.json"))
+    assert [stage["stage"] for stage in data["stages"]] == ["first", "second"]
+    assert data["stages"][0]["counts"] == {"items": 3, "cached": False} and data["stages"][1]["counts"] == {}
+    assert data["pairs"] == 1 and data["units"] == {"time": "s", "memory": "MB"}
+
+    for stage in data["stages"]:
+        assert set(stage) == STAGE_KEYS
+        assert stage["wall_time"] >= 0 and stage["cpu_time"] >= 0 and stage["peak_rss_increase"] >= 0
+    assert data["stages"][1]["cumulative_peak_rss"] >= 50
+    assert data["wall_time"] == round(sum(stage["wall_time"] for stage in data["stages"]), 6)
+
+
+def test_analyze_report(synthetic_sample, tmp_path):
+    paths = synthetic_sample(
+        genome_length=20000, event_counts={"deletion": 1, "inversion": 1}, min_size=500, max_size=500, seed=3, rotation=7000
+    )
+    del paths["truth_path"]
+
+    with redirect_stdout(io.StringIO()):
+        sam_analyze.analyze(**paths, show_plot=False, output_folder=str(tmp_path), settings=SETTINGS, render=False)
+
+    stages = {stage["stage"]: stage for stage in readReport(str(tmp_path / "report.json"))["stages"]}
+    assert list(stages) == ["genomes", "sam", "lines", "shift", "events", "history"]
+    for stage in stages.values():
+        assert set(stage) == STAGE_KEYS
+
+    assert stages["genomes"]["counts"]["query_genome_length"] == 20000
+    assert stages["sam"]["counts"]["segments"] > 0 and stages["lines"]["counts"]["lines"] > 0
+    shift = stages["shift"]["counts"]
+    assert shift["shift_candidates"] == stages["lines"]["counts"]["lines"] and shift["rotation_candidates"] > 0
+    assert stages["events"]["counts"]["events"] > 0
+    # Frames: the start, rotations and large events
+    assert stages["history"]["counts"] == {"frames": shift["rotations"] + stages["events"]["counts"]["large_events"] + 1, "rendered": False}
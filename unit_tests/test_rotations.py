@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from Line import Line
+from Events import Rotation
+from Rotations import bestRotation, countBestRotations, countMetric, countMetricWithRotation
+
+
+def randomLines(seed, scale=1000):
+    """Lines one after another along X, some of them inverted (Y goes down) and moved along Y"""
+    rng = random.Random(seed)
+    lines = []
+    x = y = 0
+    for _ in range(rng.randint(1, 8)):
+        length = rng.randint(1, 20) * scale
+        start_y, end_y = y + rng.randint(-5, 5) * scale, y + length
+        if rng.random() < 0.4:
+            start_y, end_y = end_y, start_y
+        lines.append(Line(x, start_y, x + length, end_y, dots=[[x, start_y], [x + length, end_y]]))
+        x += length + rng.randint(0, 3) * scale
+        y += length + rng.randint(-3, 3) * scale
+    return lines
+
+
+def naiveBestRotation(lines):
+    """Every rotation is applied to lines and the metric is counted again (as sam_analyze.py did)"""
+    best = None
+    for start_line in range(len(lines)):
+        for end_line in range(start_line, len(lines)):
+            rotation = Rotation(start_line, end_line)
+
+            # WORKAROUND #1
+            min_line_center = min(lines[index].center_y for index in range(start_line, end_line + 1))
+            max_line_center = max(lines[index].center_y for index in range(start_line, end_line + 1))
+            if any(
+                not (start_line <= index <= end_line) and min_line_center < line.center_y < max_line_center
+                for index, line in enumerate(lines)
+            ):
+                continue
+
+            # WORKAROUND #2
+            if lines[start_line].isTiltedCorrectly() or lines[end_line].isTiltedCorrectly():
+                continue
+
+            metric = countMetricWithRotation(lines, rotation)
+            if best is None or metric < best[0]:
+                best = (metric, start_line, end_line)
+
+    return best
+
+
+def naiveBestRotations(lines):
+    cur_metric_value = countMetric(lines)
+    rotations = []
+    while True:
+        best_rotation = naiveBestRotation(lines)
+        if best_rotation is None or best_rotation[0] >= cur_metric_value:
+            break
+        rotation = Rotation(*best_rotation[1:])
+        cur_metric_value = countMetricWithRotation(lines, rotation, apply_rotation=True)
+        rotations.append((rotation.start_line, rotation.end_line, rotation.rotation_center))
+    return cur_metric_value, rotations
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("scale", (1, 1000, 10 ** 8))
+def test_best_rotation(seed, scale):
+    lines = randomLines(seed, scale)
+    coords = [line.coords for line in lines]
+
+    best, candidates = bestRotation(lines)
+    assert best == naiveBestRotation(lines)
+    assert candidates == len(lines) * (len(lines) + 1) // 2
+    assert [line.coords for line in lines] == coords
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_best_rotations(seed):
+    lines, naive_lines = randomLines(seed), randomLines(seed)
+
+    metric, lines, rotation_actions, candidates = countBestRotations(lines, verbose=False)
+
+    assert (metric, [(rotation.start_line, rotation.end_line, rotation.rotation_center) for rotation in rotation_actions]) == \
+        naiveBestRotations(naive_lines)
+    assert [line.coords for line in lines] == [line.coords for line in naive_lines]
+    # All rotations are evaluated for every applied rotation and once more for the last (not decreasing) one
+    assert candidates == (len(rotation_actions) + 1) * len(lines) * (len(lines) + 1) // 2
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from SAM import CIGAR_OPS, newContigs, parseCigars, parseSAMLines, readSAM, readSegments
+from test_segments import samplePaths, segmentRows
+from conftest import TESTS
+
+
+def naiveCigar(cigar):
+    """[(length, op code)] of a CIGAR string"""
+    operations, buff = [], ""
+    for char in cigar:
+        if char.isdigit():
+            buff += char
+        else:
+            operations.append((int(buff), CIGAR_OPS.index(char.encode())))
+            buff = ""
+    return operations
+
+
+def test_parse_cigars():
+    rng = random.Random(0)
+    cigars = [
+        "".join("{}{}".format(rng.choice((1, 9, 10, 99, 12345, 1000000)), rng.choice("MIDNSHP=X")) for _ in range(rng.randint(1, 6)))
+        for _ in range(200)
+    ]
+
+    op_counts, op_lengths, op_codes = parseCigars([cigar.encode() for cigar in cigars])
+    assert op_counts.tolist() == [len(naiveCigar(cigar)) for cigar in cigars]
+    assert list(zip(op_lengths.tolist(), op_codes.tolist())) == [operation for cigar in cigars for operation in naiveCigar(cigar)]
+
+
+SAM_TEXT = b"""@HD\tVN:1.6
+@SQ\tSN:chr1\tLN:1000
+@SQ\tSN:chr2\tLN:500
+read1\t0\tchr2\t11\t60\t2S5M1I3=2X4N6M\t*\t0\t0\tAAAAAAAAAAAAAAAAAAA\t*
+read2\t16\tchr1\t1\t60\t4M2D4M\t*\t0\t0\tAAAAAAAA\t*
+read3\t4\t*\t0\t0\t*\t*\t0\t0\tAAAAAAAAAAAA\t*
+read4\t0\tchr1\t100\t60\t*\t*\t0\t0\tAAAAAAAAAAAA\t*
+read5\t0\tchr1\t5\t60\t3M\t*\t0\t0\tAAA\t*
+read2\t2048\tchr3\t7\t60\t5H3M\t*\t0\t0\tAAAAAAAAAAAAA\t*
+
+"""
+
+
+def test_parse_sam_lines():
+    contigs = newContigs()
+    segments = parseSAMLines(SAM_TEXT.splitlines(keepends=True), 3, contigs)
+
+    # M, = and X are matches; I and S move the read, D and N move the reference (query); unmapped reads,
+    # reads without CIGAR and reads of at most min_rid_size bases are skipped but numbered
+    assert [row + [int(segment["query_contig"]), int(segment["ref_contig"])] for row, segment in zip(segmentRows(segments), segments)] == [
+        [11, 2, 5, False, 1, 0], [16, 8, 3, False, 1, 0], [19, 11, 2, False, 1, 0], [25, 13, 6, False, 1, 0],
+        [1, 0, 4, True, 0, 1], [7, 4, 4, True, 0, 1],
+        [7, 5, 3, False, 2, 1]
+    ]
+    assert contigs == ({"chr1": 0, "chr2": 1, "chr3": 2}, {"read1": 0, "read2": 1, "read3": 2, "read4": 3, "read5": 4})
+
+
+@pytest.mark.parametrize("chunk_size", (1, 100, 1000))
+def test_chunks(tmp_path, chunk_size):
+    """Header lines, contig numbers and reads are shared by all chunks of one file"""
+    path = str(tmp_path / "sample.sam")
+    with open(path, 'wb') as sam_file:
+        sam_file.write(SAM_TEXT)
+
+    contigs = newContigs()
+    segments = readSAM(path, 3, chunk_size, contigs)
+    assert segments.tolist() == parseSAMLines(SAM_TEXT.splitlines(keepends=True), 3).tolist()
+    assert contigs[1]["read5"] == 4
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_sample_chunks(test):
+    sam_file_path = samplePaths(test)[2]
+    assert readSAM(sam_file_path, 1, 200).tolist() == readSegments(sam_file_path, 1).tolist()
@@ -0,0 +1,192 @@
+from string import ascii_uppercase
+from struct import pack
+import zlib
+import os
+
+import numpy as np
+import pytest
+
+from SAM import BAM_MAGIC, CIGAR_OPS, readReads, readReferences, readSegments
+from Dots import segmentDots
+from FASTA import readIndex
+from conftest import ROOT, TESTS
+
+
+def samplePaths(test):
+    return (
+        os.path.join(ROOT, "samples", "small", "source.fasta"),
+        os.path.join(ROOT, "samples", "small", "{}.fasta".format(test)),
+        os.path.join(ROOT, "BWA", "small", test, "bwa_output.sam")
+    )
+
+
+def naiveSegments(sam_file_path, min_rid_size):
+    """Matched blocks [query_pos, ref_pos, length, reverse] as sam_analyze.py read them line by line"""
+    segments = []
+    with open(sam_file_path, 'r', encoding="utf-8") as sam_file:
+        for line in (line.strip().split() for line in sam_file if not line.strip().startswith("@")):
+            reverse = bool(int(line[1]) & 0x10)
+            if len(line[9]) <= min_rid_size:
+                continue
+
+            actions = []
+            buff = ""
+            for char in line[5]:
+                if char in ascii_uppercase:
+                    actions.append([int(buff), char])
+                    buff = ""
+                else:
+                    buff += char
+
+            cur_query_pos, cur_ref_pos = int(line[3]), 0
+            for length, action_type in actions:
+                if action_type in ('S', 'H', 'I'):
+                    cur_ref_pos += length
+                elif action_type == 'M':
+                    segments.append([cur_query_pos, cur_ref_pos, length, reverse])
+                    cur_query_pos += length
+                    cur_ref_pos += length
+                elif action_type == 'D':
+                    cur_query_pos += length
+
+    return segments
+
+
+def naiveDots(segments, query_genome_length, ref_genome_length, skip_rate):
+    """Dots of the per-base graph (one list of Y for every X) at skip_rate"""
+    graph = [[] for _ in range(query_genome_length + 1)]
+    for cur_query_pos, cur_ref_pos, length, rotated in segments:
+        if rotated:
+            cur_ref_pos = ref_genome_length - cur_ref_pos
+        for _ in range(length):
+            graph[cur_query_pos].append(cur_ref_pos)
+            cur_query_pos += 1
+            cur_ref_pos += (-1 if rotated else 1)
+
+    return [[x, y] for x in range(0, len(graph), skip_rate) for y in graph[x]]
+
+
+def segmentRows(segments):
+    return [[int(row["query_pos"]), int(row["ref_pos"]), int(row["length"]), bool(row["reverse"])] for row in segments]
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_sam_segments(test):
+    sam_file_path = samplePaths(test)[2]
+    segments = naiveSegments(sam_file_path, 1)
+    assert segments
+    assert segmentRows(readSegments(sam_file_path, 1)) == segments
+
+
+def bgzfBlock(data):
+    """One BGZF block: gzip member with the "BC" extra subfield holding the block size - 1"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + pack("<HBBHH", 6, 66, 67, 2, 18 + len(deflated) + 8 - 1)
+    return header + deflated + pack("<II", zlib.crc32(data), len(data))
+
+
+def bgzfCompress(data, block_size=1000):
+    """BGZF file of data split into small blocks (so that records cross block borders) with the EOF block"""
+    return b"".join(bgzfBlock(data[start:start + block_size]) for start in range(0, len(data), block_size)) + bgzfBlock(b"")
+
+
+def bamCigar(cigar):
+    """CIGAR string -> [length << 4 | op]"""
+    values, buff = [], ""
+    for char in cigar:
+        if char.isdigit():
+            buff += char
+        else:
+            values.append(int(buff) << 4 | CIGAR_OPS.index(char.encode()))
+            buff = ""
+    return values
+
+
+def bamRecord(ref_id, pos, name, flag, cigar, seq, tags=b""):
+    """BAM alignment record (without quality scores), cigar - [length << 4 | op]"""
+    seq_codes = ["=ACMGRSVTWYHKDBN".index(char) for char in seq.upper() + "="[:len(seq) % 2]]
+    record = (
+        pack("<iiBBHHHiiii", ref_id, pos - 1, len(name) + 1, 60, 0, len(cigar), flag, len(seq), -1, -1, 0)
+        + name.encode() + b"\x00"
+        + pack("<{}I".format(len(cigar)), *cigar)
+        + bytes(high << 4 | low for high, low in zip(seq_codes[::2], seq_codes[1::2]))
+        + b"\xff" * len(seq)
+        + tags
+    )
+    return pack("<i", len(record)) + record
+
+
+def samToBam(sam_file_path, placeholder_cigar=False, cg_tag=True):
+    """
+    BAM file (not compressed) of a SAM file.
+    placeholder_cigar - store CIGARs as "kSmN" as for alignments with more than 65535 operations, cg_tag - add the CG tag
+    """
+    with open(sam_file_path, 'r', encoding="utf-8") as sam_file:
+        lines = [line.rstrip("\n").split("\t") for line in sam_file if line.strip()]
+
+    text = "".join("\t".join(line) + "\n" for line in lines if line[0].startswith("@"))
+    references = [
+        dict(field.split(":", 1) for field in line[1:]) for line in lines if line[0] == "@SQ"
+    ]
+    reference_ids = {reference["SN"]: index for index, reference in enumerate(references)}
+
+    bam = BAM_MAGIC + pack("<i", len(text)) + text.encode() + pack("<i", len(references))
+    for reference in references:
+        bam += pack("<i", len(reference["SN"]) + 1) + reference["SN"].encode() + b"\x00" + pack("<i", int(reference["LN"]))
+
+    for line in lines:
+        if line[0].startswith("@"):
+            continue
+        seq = "" if line[9] == "*" else line[9]
+        cigar = [] if line[5] == "*" else bamCigar(line[5])
+        tags = b""
+        if placeholder_cigar and cigar:
+            if cg_tag:
+                tags = b"CGBI" + pack("<i{}I".format(len(cigar)), len(cigar), *cigar)
+            reference_length = sum(value >> 4 for value in cigar if CIGAR_OPS[value & 0xF] in b"MDN=X")
+            cigar = [len(seq) << 4 | 4, reference_length << 4 | 3]
+        bam += bamRecord(reference_ids.get(line[2], -1), int(line[3]), line[0], int(line[1]), cigar, seq, tags)
+
+    return bam
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_bgzip_and_bam_segments(test, tmp_path):
+    sam_file_path = samplePaths(test)[2]
+    with open(sam_file_path, 'rb') as sam_file:
+        sam = sam_file.read()
+
+    files = {
+        "bwa_output.sam.gz": bgzfCompress(sam),
+        "bwa_output.bam": bgzfCompress(samToBam(sam_file_path)),
+        "bwa_output.cg.bam": bgzfCompress(samToBam(sam_file_path, placeholder_cigar=True))
+    }
+
+    segments = readSegments(sam_file_path, 1)
+    assert len(segments)
+    for filename, data in files.items():
+        (tmp_path / filename).write_bytes(data)
+        path = str(tmp_path / filename)
+        np.testing.assert_array_equal(readSegments(path, 1, threads=2), segments)
+        assert readReferences(path) == readReferences(sam_file_path)
+        assert readReads(path) == readReads(sam_file_path)
+
+
+@pytest.mark.parametrize("test", TESTS)
+def test_bam_placeholder_cigar_without_cg_tag(test, tmp_path):
+    """Without the CG tag "kSmN" is the real CIGAR: soft clip and skipped region, no matched blocks"""
+    bam_path = tmp_path / "bwa_output.bam"
+    bam_path.write_bytes(bgzfCompress(samToBam(samplePaths(test)[2], placeholder_cigar=True, cg_tag=False)))
+
+    assert len(readSegments(str(bam_path), 1, threads=2)) == 0
+
+
+@pytest.mark.parametrize("test", TESTS)
+@pytest.mark.parametrize("skip_rate", (1, 3))
+def test_segment_dots(test, skip_rate):
+    query_genome_path, ref_genome_path, sam_file_path = samplePaths(test)
+    query_genome_length, ref_genome_length = readIndex(query_genome_path)[0].length, readIndex(ref_genome_path)[0].length
+
+    dots = segmentDots(readSegments(sam_file_path, 1), ref_genome_length, skip_rate)
+    assert dots.tolist() == naiveDots(naiveSegments(sam_file_path, 1), query_genome_length, ref_genome_length, skip_rate)
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from Line import Line
+from Shifts import SERIAL_MAX_LINES, countBestShift, countShift
+
+
+def shuffledLines(seed, count, scale=1000):
+    """Pieces of a genome in a random order along the query, some of them inverted"""
+    rng = random.Random(seed)
+    lengths = [rng.randint(1, 20) * scale for _ in range(count)]
+    starts_y = [sum(lengths[:i]) for i in range(count)]
+    lines = []
+    x = 0
+    for i in rng.sample(range(count), count):
+        start_y, end_y = starts_y[i], starts_y[i] + lengths[i]
+        if rng.random() < 0.3:
+            start_y, end_y = end_y, start_y
+        lines.append(Line(x, start_y, x + lengths[i], end_y))
+        x += lengths[i]
+    return lines, x
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pool_equals_serial(seed):
+    lines, query_genome_length = shuffledLines(seed, SERIAL_MAX_LINES + 8)
+
+    serial = countBestShift(lines, query_genome_length, {"processes": 1})
+    pooled = countBestShift(lines, query_genome_length, {"processes": 2})
+    assert pooled == serial
+
+    metrics = [countShift(lines, start_line, query_genome_length, verbose=False)[0] for start_line in range(len(lines))]
+    assert metrics[serial[0]] == min(metrics)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_trials_do_not_change_lines(seed):
+    lines, query_genome_length = shuffledLines(seed, 10)
+    for line in lines:
+        line.dots = [[line.start_x, line.start_y], [line.end_x, line.end_y]]
+    state = [(line.coords, line.dots.tolist(), line.stats) for line in lines]
+
+    for start_line in range(len(lines)):
+        _, candidates = countShift(lines, start_line, query_genome_length, verbose=False)
+        assert [(line.coords, line.dots.tolist(), line.stats) for line in lines] == state
+
+        # Applied shift moves dots with coordinates
+        shifted_lines, rotated_lines, _, applied_candidates = countShift(
+            [line.copy() for line in lines], start_line, query_genome_length, apply_changes=True, verbose=False
+        )
+        assert applied_candidates == candidates
+        for line in shifted_lines + rotated_lines:
+            assert line.dots.tolist() == [[line.start_x, line.start_y], [line.end_x, line.end_y]]
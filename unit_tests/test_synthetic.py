@@ -0,0 +1,51 @@
+import pytest
+
+from SAM import readSegments
+from Synthetic import generate, reverseComplement
+
+
+GENOME_LENGTH = 20000
+
+
+def readSequence(fasta_path):
+    with open(fasta_path, 'rb') as fasta_file:
+        return b"".join(line.strip() for line in fasta_file if not line.startswith(b'>'))
+
+
+def generateSample(folder, rotation):
+    """Sample with events of every kind (insertion has no bases of genome1) in folder. Returns (genome1, genome2, events, SAM path)"""
+    folder.mkdir()
+    paths = {
+        "query_genome_path": str(folder / "genome1.fasta"),
+        "ref_genome_path": str(folder / "genome2.fasta"),
+        "sam_file_path": str(folder / "simulated.sam"),
+        "truth_path": str(folder / "truth.json")
+    }
+    events = generate(
+        **paths, genome_length=GENOME_LENGTH, event_counts={"deletion": 1, "inversion": 1, "duplication": 1, "translocation": 1},
+        min_size=500, max_size=500, seed=2, rotation=rotation
+    )
+    return readSequence(paths["query_genome_path"]), readSequence(paths["ref_genome_path"]), events, paths["sam_file_path"]
+
+
+@pytest.mark.parametrize("rotation", ("between events", "inside inversion"))
+def test_rotation(tmp_path, rotation):
+    genome1, genome2, events, _ = generateSample(tmp_path / "original", 0)
+
+    inversion = next(event for event in events if event["type"] == "inversion")
+    rotation = {"between events": 7, "inside inversion": inversion["start"] + inversion["length"] // 2}[rotation]
+
+    rotated_genome1, rotated_genome2, rotated_events, sam_file_path = generateSample(tmp_path / "rotated", rotation)
+
+    # genome1 starts from rotation, genome2 and events (moved with genome1) are the same
+    assert rotated_genome1 == genome1[rotation:] + genome1[:rotation]
+    assert rotated_genome2 == genome2
+    assert sorted((event["type"], (event["start"] + rotation) % GENOME_LENGTH) for event in rotated_events) == \
+        sorted((event["type"], event["start"]) for event in events)
+
+    # Every matched block has the same bases on genome1 and on the read (genome2 or its reverse complement for reverse pieces)
+    reads = {False: genome2, True: reverseComplement(genome2)}
+    segments = readSegments(sam_file_path)
+    assert segments["reverse"].any() and not segments["reverse"].all()
+    for query_pos, ref_pos, length, reverse in zip(*(segments[key].tolist() for key in ("query_pos", "ref_pos", "length", "reverse"))):
+        assert rotated_genome1[query_pos - 1:query_pos - 1 + length] == reads[reverse][ref_pos:ref_pos + length]